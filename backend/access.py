@@ -0,0 +1,114 @@
+"""Per-user company visibility.
+
+Admins see every company. Other users only see the companies granted to
+them in ``user_company_access``. List queries get the check as a SQL
+filter over the (user_id, company_id) index rather than a list of ids
+shipped by the app. For a user with few grants the query is driven from
+their grants (IN subquery); with many grants it walks the page in key
+order and probes the index per row (EXISTS), which stops once the page is
+full. ACL_SUBQUERY_MAX sets the switch-over. Single-company checks (get,
+history, indicators, search results, the feed) use a cached set of the
+user's allowed company ids, whose size also picks the list plan.
+
+The grant and revoke handlers drop the users' cached sets in their own
+worker. Other workers pick the change up when their entry is older than
+ACL_CACHE_TTL. Enforcement is opt-in: company and analysis reads stay
+public, as they always were, until COMPANY_ACL=1 is set, after which they
+need a token and non-admin users see only their grants.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+from models import UserCompanyAccess
+from principals import Principal
+
+ENABLED = os.environ.get("COMPANY_ACL", "0") == "1"
+CACHE_TTL_SECONDS = float(os.environ.get("ACL_CACHE_TTL", "60"))
+CACHE_SIZE = int(os.environ.get("ACL_CACHE_SIZE", "10000"))
+SUBQUERY_MAX = int(os.environ.get("ACL_SUBQUERY_MAX", "1000"))
+
+
+def unrestricted(principal: Optional[Principal]) -> bool:
+    return not ENABLED or principal is None or principal.role == "admin"
+
+
+def scope(principal: Optional[Principal]) -> tuple:
+    """Response cache dependency names: per user when the rows depend on their grants."""
+    return () if unrestricted(principal) else (f"acl:{principal.id}",)
+
+
+class AccessCache:
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[frozenset]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, company_ids: frozenset):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, company_ids)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+access_cache = AccessCache()
+
+
+def allowed_company_ids(db: Session, principal: Optional[Principal]) -> Optional[frozenset]:
+    """The company ids `principal` may see, or None when unrestricted."""
+    if unrestricted(principal):
+        return None
+    company_ids = access_cache.get(principal.id)
+    if company_ids is None:
+        company_ids = frozenset(db.execute(
+            select(UserCompanyAccess.company_id).where(UserCompanyAccess.user_id == principal.id)
+        ).scalars())
+        access_cache.put(principal.id, company_ids)
+    return company_ids
+
+
+def company_filter(db: Session, principal: Optional[Principal], company_id_column) -> tuple:
+    """Filters limiting a query to the companies `principal` may see."""
+    allowed = allowed_company_ids(db, principal)
+    if allowed is None:
+        return ()
+    # The cached set only picks the plan; the query reads the current grants
+    granted = UserCompanyAccess.user_id == principal.id
+    if len(allowed) <= SUBQUERY_MAX:
+        return (company_id_column.in_(select(UserCompanyAccess.company_id).where(granted)),)
+    return (exists().where(granted, UserCompanyAccess.company_id == company_id_column),)
+
+
+def require_company(db: Session, principal: Optional[Principal], company_id: int):
+    # 404 like a missing company, so ids of hidden companies are not confirmed
+    allowed = allowed_company_ids(db, principal)
+    if allowed is not None and company_id not in allowed:
+        raise HTTPException(status_code=404, detail="Company not found")
@@ -0,0 +1,334 @@
+"""Backtest stored signals and predictions against the bars that follow them.
+
+A signal or prediction stored on bar t is scored against bar t+1. Companies
+are split into chunks and each chunk is loaded and scored in its own worker
+process; the parent only merges the per-company sums into sector totals.
+
+Bars that retention.py rolled into analyses_weekly/analyses_monthly were
+scored the same way when they were rolled; their bar counts, trades, hits
+and close prediction error sums are added to the raw bars' totals. Returns,
+drawdown, calibration and the open/high/low errors need every bar and
+cover the raw bars only.
+
+Chunks run on one process pool shared by every backtest in the process,
+BACKTEST_WORKERS processes (default: one per CPU) started on first use;
+`workers` only limits how many of a run's chunks are in flight at once.
+
+Run from the backend directory:
+
+    python backtest.py [--sector ID] [--workers N]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from sqlalchemy import Float, func, select, type_coerce
+from database import ReadSessionLocal
+from models import Analysis, AnalysisMonthly, AnalysisWeekly, Company
+
+SIGNAL_POSITION = {"STRONG_BUY": 1.0, "BUY": 1.0, "HOLD": 0.0, "SELL": -1.0, "STRONG_SELL": -1.0}
+PREDICTED_FIELDS = ("open", "high", "low", "close")
+CALIBRATION_BINS = 10
+DEFAULT_CHUNK_SIZE = 250
+POOL_WORKERS = int(os.environ.get("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+
+_PRICE_COLUMNS = [f"{f}_price" for f in PREDICTED_FIELDS] + [f"predicted_{f}" for f in PREDICTED_FIELDS]
+# Sums the retention tiers keep for the bars they replaced
+ROLLED_SUMS = ("bars", "trades", "hits", "prediction_count", "prediction_abs_error", "prediction_sq_error")
+
+
+def _load_chunk(company_ids: list) -> dict:
+    query = (
+        select(
+            Analysis.company_id,
+            Analysis.signal,
+            type_coerce(Analysis.confidence_score, Float),
+            *[type_coerce(getattr(Analysis, name), Float) for name in _PRICE_COLUMNS],
+        )
+        .where(Analysis.company_id.in_(company_ids))
+        .order_by(Analysis.company_id, Analysis.date)
+    )
+    db = ReadSessionLocal()
+    try:
+        rows = db.execute(query).all()
+    finally:
+        db.close()
+    if not rows:
+        return {}
+
+    columns = list(zip(*rows))
+    ids = np.array(columns[0], dtype=np.int64)
+    positions = np.array([SIGNAL_POSITION.get(s, 0.0) for s in columns[1]])
+    confidence = np.array(columns[2], dtype=np.float64)
+    # Scores are stored either as 0-1 or as a 0-100 percentage
+    confidence = np.where(confidence > 1, confidence / 100, confidence)
+    prices = {name: np.array(col, dtype=np.float64) for name, col in zip(_PRICE_COLUMNS, columns[3:])}
+
+    bounds = np.flatnonzero(np.diff(ids)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(ids)]))
+    return {
+        int(ids[s]): {
+            "position": positions[s:e],
+            "confidence": confidence[s:e],
+            **{name: values[s:e] for name, values in prices.items()},
+        }
+        for s, e in zip(starts, ends)
+    }
+
+
+def _load_rolled(company_ids: list) -> dict:
+    # Per-company sums over both retention tiers
+    totals = {}
+    db = ReadSessionLocal()
+    try:
+        for model in (AnalysisWeekly, AnalysisMonthly):
+            query = (
+                select(
+                    model.company_id,
+                    *[func.sum(getattr(model, name)) for name in ROLLED_SUMS],
+                )
+                .where(model.company_id.in_(company_ids))
+                .group_by(model.company_id)
+            )
+            for company_id, *sums in db.execute(query):
+                current = totals.setdefault(company_id, dict.fromkeys(ROLLED_SUMS, 0))
+                for name, value in zip(ROLLED_SUMS, sums):
+                    current[name] += value or 0
+    finally:
+        db.close()
+    return totals
+
+
+def _add_rolled(score: dict, rolled: dict) -> dict:
+    if rolled:
+        score["bars"] += int(rolled["bars"])
+        score["trades"] += int(rolled["trades"])
+        score["hits"] += int(rolled["hits"])
+        count, abs_sum, sq_sum = score["prediction_sums"]["close"]
+        score["prediction_sums"]["close"] = (
+            count + int(rolled["prediction_count"]),
+            abs_sum + float(rolled["prediction_abs_error"]),
+            sq_sum + float(rolled["prediction_sq_error"]),
+        )
+    return score
+
+
+def _prediction_sums(bars: dict) -> dict:
+    sums = {}
+    for field in PREDICTED_FIELDS:
+        predicted = bars[f"predicted_{field}"][:-1]
+        actual = bars[f"{field}_price"][1:]
+        # 0.0 is the schema default for "no prediction"
+        mask = np.isfinite(predicted) & np.isfinite(actual) & (predicted != 0)
+        error = predicted[mask] - actual[mask]
+        sums[field] = (int(mask.sum()), float(np.abs(error).sum()), float((error ** 2).sum()))
+    return sums
+
+
+def _score_company(company_id: int, bars: dict, include_equity: bool) -> dict:
+    close = bars["close_price"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = close[1:] / close[:-1] - 1
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+    position = bars["position"][:-1]
+
+    strategy = position * returns
+    equity = np.cumprod(1 + strategy)
+    drawdown = 1 - equity / np.maximum.accumulate(equity) if len(equity) else np.zeros(0)
+
+    traded = position != 0
+    hit = (np.sign(returns) == position) & traded
+    confidence = np.nan_to_num(bars["confidence"][:-1][traded])
+    bins = np.clip((confidence * CALIBRATION_BINS).astype(np.int64), 0, CALIBRATION_BINS - 1)
+
+    return {
+        "company_id": company_id,
+        "bars": int(len(close)),
+        "trades": int(traded.sum()),
+        "hits": int(hit.sum()),
+        "total_return": float(equity[-1] - 1) if len(equity) else 0.0,
+        "max_drawdown": float(drawdown.max()) if len(drawdown) else 0.0,
+        "prediction_sums": _prediction_sums(bars),
+        "calibration_trades": np.bincount(bins, minlength=CALIBRATION_BINS).tolist(),
+        "calibration_hits": np.bincount(bins, weights=hit[traded].astype(np.float64), minlength=CALIBRATION_BINS).astype(int).tolist(),
+        "equity_curve": equity.tolist() if include_equity else None,
+    }
+
+
+def _run_chunk(company_ids: list, include_equity: bool = False) -> list:
+    chunk = _load_chunk(company_ids)
+    rolled = _load_rolled(list(chunk)) if chunk else {}
+    return [_add_rolled(_score_company(cid, bars, include_equity), rolled.get(cid)) for cid, bars in chunk.items()]
+
+
+def _errors(sums: dict) -> list:
+    result = []
+    for field in PREDICTED_FIELDS:
+        count, abs_sum, sq_sum = sums[field]
+        result.append({
+            "field": field,
+            "count": count,
+            "mae": abs_sum / count if count else None,
+            "rmse": (sq_sum / count) ** 0.5 if count else None,
+        })
+    return result
+
+
+def _calibration(trades: list, hits: list) -> list:
+    return [
+        {
+            "lower": i / CALIBRATION_BINS,
+            "upper": (i + 1) / CALIBRATION_BINS,
+            "trades": trades[i],
+            "hit_rate": hits[i] / trades[i] if trades[i] else None,
+        }
+        for i in range(CALIBRATION_BINS)
+    ]
+
+
+def _summarize_sector(sector_id, scores: list) -> dict:
+    sums = {f: [0, 0.0, 0.0] for f in PREDICTED_FIELDS}
+    for score in scores:
+        for field, values in score["prediction_sums"].items():
+            sums[field] = [a + b for a, b in zip(sums[field], values)]
+    trades = sum(s["trades"] for s in scores)
+    hits = sum(s["hits"] for s in scores)
+    return {
+        "sector_id": sector_id,
+        "companies": len(scores),
+        "trades": trades,
+        "hit_rate": hits / trades if trades else None,
+        "mean_return": float(np.mean([s["total_return"] for s in scores])),
+        "max_drawdown": max(s["max_drawdown"] for s in scores),
+        "prediction_errors": _errors(sums),
+        "calibration": _calibration(
+            np.sum([s["calibration_trades"] for s in scores], axis=0).tolist(),
+            np.sum([s["calibration_hits"] for s in scores], axis=0).tolist(),
+        ),
+    }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process is multi-threaded and owns open connections
+            context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=context)
+        return _pool
+
+
+def shutdown(pool: ProcessPoolExecutor = None):
+    """Stop the shared pool, or only `pool` if it is still the shared one (e.g. broken)."""
+    global _pool
+    with _pool_lock:
+        if pool is not None and pool is not _pool:
+            return
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_backtest(sector_id: int = None, workers: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 include_equity: bool = False, progress=None) -> dict:
+    """`progress(fraction, message)`, when given, is called after every scored chunk."""
+    started = time.perf_counter()
+    db = ReadSessionLocal()
+    try:
+        query = db.query(Company.id, Company.sector_id)
+        if sector_id is not None:
+            query = query.filter(Company.sector_id == sector_id)
+        sectors = dict(query.order_by(Company.id).all())
+    finally:
+        db.close()
+
+    company_ids = list(sectors)
+    chunks = [company_ids[i:i + chunk_size] for i in range(0, len(company_ids), chunk_size)]
+    workers = max(1, min(workers or POOL_WORKERS, POOL_WORKERS, len(chunks) or 1))
+
+    scored = 0
+
+    def report(chunk: list):
+        nonlocal scored
+        scored += len(chunk)
+        if progress is not None:
+            progress(scored / len(company_ids), f"{scored}/{len(company_ids)} companies")
+
+    if workers == 1:
+        results = []
+        for chunk in chunks:
+            results.append(_run_chunk(chunk, include_equity))
+            report(chunk)
+    else:
+        pool = _shared_pool()
+        results = [None] * len(chunks)
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.result()
+                report(chunks[index])
+
+        try:
+            for index, chunk in enumerate(chunks):
+                pending[pool.submit(_run_chunk, chunk, include_equity)] = index
+                if len(pending) >= workers:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        except BaseException as e:
+            # A cancelled job stops here; its chunks not started yet are dropped
+            for future in pending:
+                future.cancel()
+            if isinstance(e, BrokenProcessPool):
+                shutdown(pool)
+            raise
+
+    scores = [score for chunk in results for score in chunk]
+    by_sector = {}
+    for score in scores:
+        score["sector_id"] = sectors[score["company_id"]]
+        by_sector.setdefault(score["sector_id"], []).append(score)
+
+    companies = []
+    for score in scores:
+        companies.append({
+            "company_id": score["company_id"],
+            "sector_id": score["sector_id"],
+            "bars": score["bars"],
+            "trades": score["trades"],
+            "hit_rate": score["hits"] / score["trades"] if score["trades"] else None,
+            "total_return": score["total_return"],
+            "max_drawdown": score["max_drawdown"],
+            "prediction_errors": _errors(score["prediction_sums"]),
+            "calibration": _calibration(score["calibration_trades"], score["calibration_hits"]),
+            "equity_curve": score["equity_curve"],
+        })
+
+    return {
+        "workers": workers,
+        "elapsed_seconds": time.perf_counter() - started,
+        "companies": companies,
+        "sectors": [_summarize_sector(sid, group) for sid, group in by_sector.items()],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest stored signals and predictions")
+    parser.add_argument("--sector", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    result = run_backtest(args.sector, args.workers, args.chunk_size)
+    print(json.dumps({k: result[k] for k in ("workers", "elapsed_seconds", "sectors")}, indent=2))
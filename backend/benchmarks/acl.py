@@ -0,0 +1,143 @@
+"""Cost of the per-user company ACL on list and single-company reads.
+
+Builds a scratch SQLite database with --companies companies, --users
+member users and --grants random grants per user, then times
+`fetch_page` over companies for an admin (no filter) and for members
+with the filter `access.company_filter` picks: the first page, a deep
+page (cursor at 90% of the ids) and a sector filtered page. The same
+pages are also timed with each plan forced (EXISTS, IN subquery, and the
+granted ids shipped as an IN list) to check where ACL_SUBQUERY_MAX
+should sit. Also times `access.allowed_company_ids` from the cache and
+after a miss. Best of --repeats, microseconds per request.
+
+    python -m benchmarks.acl --companies 10000 --users 1000 --grants 200
+    python -m benchmarks.acl --grants 5000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import create_engine, exists, insert, select
+from sqlalchemy.orm import sessionmaker
+import access
+from database import SQLITE_PRAGMAS
+from models import Base, Company, Sector, User, UserCompanyAccess
+from pagination import encode_cursor, fetch_page
+from principals import Principal
+import schemas
+
+SECTORS = 20
+
+
+def _build(path: str, companies: int, users: int, grants: int, seed: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for name, value in SQLITE_PRAGMAS.items():
+            conn.exec_driver_sql(f"PRAGMA {name}={value}")
+        conn.execute(insert(Sector), [{"id": i, "name": f"Sector {i}"} for i in range(1, SECTORS + 1)])
+        conn.execute(insert(Company), [{
+            "id": i, "sector_id": rng.randint(1, SECTORS), "symbol": f"C{i}", "company_name": f"Company {i}",
+            "market_cap": rng.uniform(1e6, 1e12), "pe_ratio": rng.uniform(1, 60),
+        } for i in range(1, companies + 1)])
+        conn.execute(insert(User), [{
+            "id": i, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "-",
+            "role": "admin" if i == 1 else "member",
+        } for i in range(1, users + 2)])
+        conn.execute(insert(UserCompanyAccess), [
+            {"user_id": user_id, "company_id": company_id, "granted_by": 1, "granted_at": now}
+            for user_id in range(2, users + 2)
+            for company_id in rng.sample(range(1, companies + 1), min(grants, companies))
+        ])
+        conn.exec_driver_sql("ANALYZE")
+    return engine
+
+
+def _plans(member: Principal, allowed: frozenset) -> dict:
+    granted = UserCompanyAccess.user_id == member.id
+    return {
+        "exists": (exists().where(granted, UserCompanyAccess.company_id == Company.id),),
+        "in_subquery": (Company.id.in_(select(UserCompanyAccess.company_id).where(granted)),),
+        "in_list": (Company.id.in_(allowed),),
+    }
+
+
+def _best(fn, repeats: int) -> float:
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def run(companies: int, users: int, grants: int, limit: int, repeats: int, seed: int) -> dict:
+    directory = tempfile.mkdtemp(prefix="acl-bench-")
+    path = os.path.join(directory, "acl.db")
+    try:
+        engine = _build(path, companies, users, grants, seed)
+        Session = sessionmaker(bind=engine)
+        admin = Principal(id=1, username="user1", email="user1@example.com", role="admin", token_version=0)
+        members = [
+            Principal(id=i, username=f"user{i}", email=f"user{i}@example.com", role="member", token_version=0)
+            for i in random.Random(seed).sample(range(2, users + 2), min(users, 20))
+        ]
+        pages = {
+            "first_page": ({"cursor": None, "limit": limit, "fields": None}, ()),
+            "deep_page": ({"cursor": encode_cursor([int(companies * 0.9)]), "limit": limit, "fields": None}, ()),
+            "sector_page": ({"cursor": None, "limit": limit, "fields": None}, (Company.sector_id == 1,)),
+        }
+        report = {
+            "companies": companies, "users": users, "grants_per_user": grants, "limit": limit,
+            "member_plan": "in_subquery" if min(grants, companies) <= access.SUBQUERY_MAX else "exists",
+        }
+        with Session() as db:
+            for name, (page, filters) in pages.items():
+                admin_filters = (*access.company_filter(db, admin, Company.id), *filters)
+                timings = {"admin_us": _best(lambda: fetch_page(db, Company, schemas.Company, page, admin_filters), repeats)}
+                samples = {"member": [], "exists": [], "in_subquery": [], "in_list": []}
+                for member in members:
+                    plans = {"member": access.company_filter(db, member, Company.id)}
+                    plans.update(_plans(member, access.allowed_company_ids(db, member)))
+                    for plan, acl in plans.items():
+                        samples[plan].append(_best(lambda: fetch_page(
+                            db, Company, schemas.Company, page, (*acl, *filters)
+                        ), repeats))
+                for plan, values in samples.items():
+                    timings[f"{plan}_us"] = sum(values) / len(values)
+                timings["member_overhead_us"] = timings["member_us"] - timings["admin_us"]
+                report[name] = timings
+
+            member = members[0]
+            access.access_cache.invalidate(member.id)
+            access.allowed_company_ids(db, member)
+            report["allowed_ids_cached_us"] = _best(lambda: access.allowed_company_ids(db, member), repeats * 100)
+
+            def miss():
+                access.access_cache.invalidate(member.id)
+                access.allowed_company_ids(db, member)
+            report["allowed_ids_miss_us"] = _best(miss, repeats)
+        engine.dispose()
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--grants", type=int, default=200, help="Companies granted to each member")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(run(args.companies, args.users, args.grants, args.limit, args.repeats, args.seed), indent=2))
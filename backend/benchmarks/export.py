@@ -0,0 +1,64 @@
+"""Export throughput and server memory for GET /analyses/export.
+
+Streams the export once per format and reports rows/sec, bytes/sec and,
+when --server-pid is given (Linux only), the server's peak RSS during each
+download. The peak is reset before every format through
+/proc/<pid>/clear_refs, which needs permission to write to that file.
+
+    uvicorn main:app --port 8000 &
+    python -m benchmarks.export --url http://127.0.0.1:8000 --server-pid $!
+"""
+import argparse
+import json
+import time
+import httpx
+from benchmarks.stats import peak_rss_mb, reset_peak_rss
+
+
+def _count_rows(fmt: str, newlines: int):
+    if fmt == "ndjson":
+        return newlines
+    if fmt == "csv":
+        return newlines - 1  # header
+    return None
+
+
+def run(url: str, formats: list, query: str, pid: int = None) -> dict:
+    report = {}
+    with httpx.Client(base_url=url, timeout=None) as client:
+        for fmt in formats:
+            reset = pid is not None and reset_peak_rss(pid)
+            started = time.perf_counter()
+            first_byte = None
+            size = newlines = 0
+            with client.stream("GET", f"/analyses/export?format={fmt}&{query}") as response:
+                if response.status_code != 200:
+                    report[fmt] = {"status": response.status_code, "detail": response.read().decode()}
+                    continue
+                for chunk in response.iter_bytes():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    size += len(chunk)
+                    newlines += chunk.count(b"\n")
+            elapsed = time.perf_counter() - started
+            rows = _count_rows(fmt, newlines)
+            report[fmt] = {
+                "rows": rows,
+                "bytes": size,
+                "seconds": elapsed,
+                "time_to_first_byte_ms": (first_byte or 0.0) * 1000,
+                "rows_per_second": rows / elapsed if rows is not None and elapsed > 0 else None,
+                "mb_per_second": size / elapsed / 1e6 if elapsed > 0 else 0.0,
+                "server_peak_rss_mb": peak_rss_mb(pid) if reset else None,
+            }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--formats", default="ndjson,csv,parquet")
+    parser.add_argument("--query", default="", help="Extra filters, e.g. company_id=1&from=2024-01-01")
+    parser.add_argument("--server-pid", type=int, default=None)
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.formats.split(","), args.query, args.server_pid), indent=2))
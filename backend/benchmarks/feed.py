@@ -0,0 +1,280 @@
+"""Fan-out of the analysis feed to many concurrent subscribers on one worker.
+
+Starts `uvicorn main:app` with a single worker (or uses --url), opens
+--subscribers WebSocket or SSE connections, then creates --events analyses
+through `POST /analyses/` (or `/analyses/bulk` with --batch) at --rate
+per second. Reports how long it took to connect everyone, the delivery
+latency from the write being sent to each subscriber receiving the event,
+how many deliveries arrived, the server's feed counters and, when it
+started the server, its peak RSS. The analyses are written far in the
+future for --company-id, so use a scratch database.
+
+--slow subscribers connect with a tiny receive buffer and never read.
+Once the kernel's socket buffers (a few MB) are full their server-side
+queues overflow; the other subscribers' latency should not change and
+`dropped` counts what the slow ones lost. --queue-size sets
+FEED_QUEUE_SIZE for the started server. Subscribers authenticate as
+--username (an admin by default, so the company ACL lets every event through).
+
+    python -m benchmarks.feed --subscribers 5000 --events 100 --transport ws
+    python -m benchmarks.feed --subscribers 10 --slow 5 --events 20000 --batch 500 --rate 5000 --queue-size 1000 --transport sse
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+import httpx
+import websockets
+from benchmarks.stats import peak_rss_mb, percentile
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+async def _wait_ready(url: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get("/metrics")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+async def _connect(url: str, slow: bool) -> socket.socket:
+    parsed = urlparse(url)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if slow:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, (parsed.hostname, parsed.port or 80))
+    return sock
+
+
+class Tally:
+    def __init__(self, subscribers: int):
+        self.sent = {}          # analysis date -> time its write was sent
+        self.latencies = []
+        self.counts = [0] * subscribers
+
+    def deliver(self, text: str, index: int):
+        received = time.perf_counter()
+        message = json.loads(text)
+        if message.get("type") != "analysis":
+            return
+        started = self.sent.get(message["analysis"]["date"])
+        if started is not None:
+            self.latencies.append(received - started)
+            self.counts[index] += 1
+
+
+async def _ws_subscriber(url: str, query: str, index: int, slow: bool, connected: asyncio.Event,
+                         stop: asyncio.Event, tally: Tally):
+    sock = await _connect(url, slow)
+    async with websockets.connect(f"{url}/feed/ws?{query}", sock=sock, max_queue=1 if slow else None,
+                                  ping_interval=None) as ws:
+        connected.set()
+        if slow:
+            await stop.wait()
+            return
+        while not stop.is_set():
+            try:
+                text = await asyncio.wait_for(ws.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            tally.deliver(text, index)
+
+
+async def _sse_subscriber(url: str, query: str, index: int, slow: bool, connected: asyncio.Event,
+                          stop: asyncio.Event, tally: Tally):
+    parsed = urlparse(url)
+    reader, writer = await asyncio.open_connection(sock=await _connect(url, slow))
+    writer.write(f"GET /feed/sse?{query} HTTP/1.1\r\nHost: {parsed.netloc}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    try:
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        connected.set()
+        if slow:
+            await stop.wait()
+            return
+        while not stop.is_set():
+            try:
+                line = await asyncio.wait_for(reader.readline(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                break
+            # Chunked transfer encoding wraps the events; only data lines matter
+            if line.startswith(b"data: "):
+                tally.deliver(line[6:].decode(), index)
+    finally:
+        writer.close()
+
+
+async def _publish(url: str, company_id: int, events: int, rate: float, batch: int, tally: Tally):
+    base = datetime(2100, 1, 1) + timedelta(minutes=random.randrange(10**6) * 1000)
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        for first in range(0, events, batch):
+            rows = [{
+                "company_id": company_id, "date": (base + timedelta(minutes=i)).isoformat(),
+                "close_price": 100.0, "predicted_close": 101.0, "signal": "BUY", "confidence_score": 60.0,
+            } for i in range(first, min(first + batch, events))]
+            started = time.perf_counter()
+            for row in rows:
+                tally.sent[row["date"]] = started
+            if batch == 1:
+                response = await client.post("/analyses/", json=rows[0])
+            else:
+                body = "\n".join(json.dumps(row) for row in rows)
+                response = await client.post("/analyses/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+            response.raise_for_status()
+            await asyncio.sleep(len(rows) / rate)
+
+
+async def _feed_stats(url: str) -> dict:
+    async with httpx.AsyncClient(base_url=url) as client:
+        text = (await client.get("/metrics")).text
+    stats = {}
+    for line in text.splitlines():
+        if line.startswith("feed_"):
+            name, value = line.split()
+            stats[name[len("feed_"):]] = float(value)
+    return stats
+
+
+async def _login(url: str, username: str, password: str) -> str:
+    async with httpx.AsyncClient(base_url=url) as client:
+        response = await client.post("/auth/login", data={"username": username, "password": password})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+async def _sector_of(url: str, company_id: int, token: str) -> int:
+    async with httpx.AsyncClient(base_url=url) as client:
+        response = await client.get(f"/companies/{company_id}", headers={"Authorization": f"Bearer {token}"})
+        response.raise_for_status()
+        return response.json()["sector_id"]
+
+
+async def run(url: str, transport: str, subscribers: int, slow: int, events: int, rate: float, batch: int,
+              company_id: int, sector_id, connect_batch: int, settle: float, username: str, password: str) -> dict:
+    token = await _login(url, username, password)
+    if sector_id is None:
+        sector_id = await _sector_of(url, company_id, token)
+    subscriber = _ws_subscriber if transport == "ws" else _sse_subscriber
+    ws_url = url.replace("http", "ws", 1) if transport == "ws" else url
+    # Half the subscribers follow the company, half its sector: both topic paths get exercised
+    queries = [
+        (f"company_ids={company_id}" if i % 2 else f"sector_ids={sector_id}") + f"&access_token={token}"
+        for i in range(subscribers + slow)
+    ]
+    stop = asyncio.Event()
+    tally = Tally(subscribers + slow)
+    tasks = []
+
+    started = time.perf_counter()
+    for first in range(0, subscribers + slow, connect_batch):
+        waiting = []
+        for i in range(first, min(first + connect_batch, subscribers + slow)):
+            connected = asyncio.Event()
+            waiting.append(connected)
+            tasks.append(asyncio.create_task(subscriber(
+                ws_url, queries[i], i, i >= subscribers, connected, stop, tally
+            )))
+        await asyncio.wait_for(asyncio.gather(*(c.wait() for c in waiting)), 60)
+    connect_seconds = time.perf_counter() - started
+
+    publish_started = time.perf_counter()
+    await _publish(url, company_id, events, rate, batch, tally)
+    expected = events * subscribers
+    deadline = time.perf_counter() + settle
+    while sum(tally.counts[:subscribers]) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - publish_started
+    stats = await _feed_stats(url)
+
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    values = sorted(tally.latencies)
+    delivered = sum(tally.counts[:subscribers])
+    return {
+        "transport": transport,
+        "subscribers": subscribers,
+        "slow_subscribers": slow,
+        "events": events,
+        "batch": batch,
+        "connect_seconds": connect_seconds,
+        "expected_deliveries": expected,
+        "delivered": delivered,
+        "deliveries_per_second": delivered / elapsed if elapsed > 0 else 0.0,
+        "min_received": min(tally.counts[:subscribers], default=0),
+        "latency_p50_ms": percentile(values, 50) * 1000,
+        "latency_p95_ms": percentile(values, 95) * 1000,
+        "latency_p99_ms": percentile(values, 99) * 1000,
+        "latency_max_ms": (values[-1] if values else 0.0) * 1000,
+        "server_feed": stats,
+    }
+
+
+def main(args) -> dict:
+    _raise_fd_limit()
+    process = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        env = dict(os.environ, FEED_QUEUE_SIZE=str(args.queue_size)) if args.queue_size else None
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", "1",
+             "--log-level", "warning", "--backlog", "4096"],
+            env=env,
+        )
+    try:
+        asyncio.run(_wait_ready(url, 60))
+        report = asyncio.run(run(
+            url, args.transport, args.subscribers, args.slow, args.events, args.rate, args.batch,
+            args.company_id, args.sector_id, args.connect_batch, args.settle, args.username, args.password,
+        ))
+        if process is not None:
+            report["server_peak_rss_mb"] = peak_rss_mb(process.pid)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Use a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8798)
+    parser.add_argument("--transport", choices=["ws", "sse"], default="ws")
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--slow", type=int, default=0)
+    parser.add_argument("--queue-size", type=int, default=None, help="FEED_QUEUE_SIZE for the started server")
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=20.0, help="Analyses created per second")
+    parser.add_argument("--batch", type=int, default=1, help="Rows per write; above 1 goes through /analyses/bulk")
+    parser.add_argument("--company-id", type=int, default=1)
+    parser.add_argument("--sector-id", type=int, default=None, help="Defaults to the company's sector")
+    parser.add_argument("--connect-batch", type=int, default=500)
+    parser.add_argument("--username", default="kri")
+    parser.add_argument("--password", default="kri")
+    parser.add_argument("--settle", type=float, default=30.0, help="Seconds to wait for outstanding deliveries")
+    args = parser.parse_args()
+    print(json.dumps(main(args), indent=2))
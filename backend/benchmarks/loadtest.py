@@ -0,0 +1,61 @@
+"""Mixed slow/fast traffic against a running server.
+
+Some clients repeatedly call a slow endpoint while others call a cheap
+one; the report shows the latency the cheap requests see. When routes
+block the event loop, the fast p99 tracks the slow endpoint's latency.
+
+    uvicorn main:app --port 8000
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000
+
+Run it on two commits and compare the JSON output.
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from benchmarks.stats import summarize
+
+
+async def _client(client: httpx.AsyncClient, path: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(url: str, slow_path: str, fast_path: str, slow_clients: int, fast_clients: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=slow_clients + fast_clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        slow, fast, errors = [], [], []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[_client(client, slow_path, deadline, slow, errors) for _ in range(slow_clients)],
+            *[_client(client, fast_path, deadline, fast, errors) for _ in range(fast_clients)],
+        )
+        elapsed = time.perf_counter() - started
+
+    return {
+        "slow": {"path": slow_path, **summarize(slow, elapsed)},
+        "fast": {"path": fast_path, **summarize(fast, elapsed)},
+        "errors": len(errors),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--slow-path", default="/analyses/?limit=1000")
+    parser.add_argument("--fast-path", default="/sectors/1")
+    parser.add_argument("--slow-clients", type=int, default=8)
+    parser.add_argument("--fast-clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    report = asyncio.run(run(args.url, args.slow_path, args.fast_path, args.slow_clients, args.fast_clients, args.duration))
+    print(json.dumps(report, indent=2))
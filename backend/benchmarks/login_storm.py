@@ -0,0 +1,67 @@
+"""Login throughput and non-auth latency during a login storm.
+
+Many clients log in as fast as they can while others poll a cheap
+endpoint. The report shows logins/sec, how many were shed with 503, and
+the latency the non-auth clients saw.
+
+    uvicorn main:app --port 8000
+    python -m benchmarks.login_storm --url http://127.0.0.1:8000 --username kri --password kri
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from benchmarks.stats import summarize
+
+
+async def _login_client(client, form, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/auth/login", data=form)
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+
+
+async def _poll_client(client, path, deadline, latencies):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(url, username, password, login_clients, poll_clients, poll_path, duration):
+    form = {"username": username, "password": password}
+    limits = httpx.Limits(max_connections=login_clients + poll_clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        logins, polls, statuses = [], [], {}
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[_login_client(client, form, deadline, logins, statuses) for _ in range(login_clients)],
+            *[_poll_client(client, poll_path, deadline, polls) for _ in range(poll_clients)],
+        )
+        elapsed = time.perf_counter() - started
+
+    return {
+        "login": {**summarize(logins, elapsed), "statuses": statuses,
+                  "successful_per_second": statuses.get(200, 0) / elapsed},
+        "non_auth": {"path": poll_path, **summarize(polls, elapsed)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="kri")
+    parser.add_argument("--password", default="kri")
+    parser.add_argument("--login-clients", type=int, default=32)
+    parser.add_argument("--poll-clients", type=int, default=8)
+    parser.add_argument("--poll-path", default="/sectors/1")
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    report = asyncio.run(run(args.url, args.username, args.password, args.login_clients,
+                             args.poll_clients, args.poll_path, args.duration))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,80 @@
+"""Cost of the request metrics: middleware per request and SQL hooks per statement.
+
+Both are measured against an uninstrumented baseline (best of three runs),
+so the difference is what METRICS_ENABLED=1 adds to every request and
+every statement.
+
+    python -m benchmarks.metrics_overhead --requests 20000 --statements 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+from sqlalchemy import create_engine, text
+import metrics
+
+REPEATS = 3
+
+
+async def _app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _time_app(app, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/", "path_params": {}}
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for _ in range(requests):
+            await app(dict(scope), _receive, _send)
+        best = min(best, (time.perf_counter() - started) / requests)
+    return best
+
+
+def _time_engine(engine, statements: int) -> float:
+    best = float("inf")
+    with engine.connect() as conn:
+        query = text("SELECT 1")
+        conn.execute(query)
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            for _ in range(statements):
+                conn.execute(query)
+            best = min(best, (time.perf_counter() - started) / statements)
+    return best
+
+
+def run(requests: int, statements: int) -> dict:
+    bare = asyncio.run(_time_app(_app, requests))
+    wrapped = asyncio.run(_time_app(metrics.MetricsMiddleware(_app), requests))
+
+    plain = _time_engine(create_engine("sqlite://"), statements)
+    instrumented_engine = create_engine("sqlite://")
+    metrics.instrument_engine(instrumented_engine)
+    instrumented = _time_engine(instrumented_engine, statements)
+
+    return {
+        "request_us": bare * 1e6,
+        "request_with_middleware_us": wrapped * 1e6,
+        "middleware_overhead_us": (wrapped - bare) * 1e6,
+        "statement_us": plain * 1e6,
+        "statement_instrumented_us": instrumented * 1e6,
+        "statement_overhead_us": (instrumented - plain) * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--statements", type=int, default=50000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.statements), indent=2))
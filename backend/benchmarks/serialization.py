@@ -0,0 +1,79 @@
+"""Per-row cost of list responses: ORM + response model path vs fetch_page.
+
+The ORM path is what list endpoints did before: load entities, validate
+them into the response model with from_attributes, dump to JSON-able
+Python and encode with json.dumps (as FastAPI's JSONResponse does). Each
+stage is timed separately. fetch_page selects column tuples, lets the
+database cast DECIMAL to float and encodes with orjson. Both bodies are
+checked to be identical. Best of --repeats, each with a fresh session.
+
+    python -m benchmarks.serialization --limit 1000 --repeats 5
+"""
+import argparse
+import json
+import time
+from pydantic import TypeAdapter
+from database import ReadSessionLocal
+from models import Analysis, Company
+from pagination import fetch_page
+import schemas
+
+TARGETS = {"analyses": (Analysis, schemas.Analysis), "companies": (Company, schemas.Company)}
+
+
+def _orm_path(model, schema, limit: int) -> tuple:
+    adapter = TypeAdapter(list[schema])
+    with ReadSessionLocal() as db:
+        started = time.perf_counter()
+        rows = db.query(model).order_by(model.id).limit(limit).all()
+        loaded = time.perf_counter()
+        content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+        validated = time.perf_counter()
+        body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+        encoded = time.perf_counter()
+    return body, {"query": loaded - started, "validate": validated - loaded, "encode": encoded - validated}
+
+
+def _fast_path(model, schema, limit: int) -> tuple:
+    page = {"cursor": None, "limit": limit, "fields": None}
+    with ReadSessionLocal() as db:
+        started = time.perf_counter()
+        body = fetch_page(db, model, schema, page).body
+        finished = time.perf_counter()
+    return body, {"total": finished - started}
+
+
+def _best(fn, model, schema, limit: int, repeats: int) -> tuple:
+    body, best = None, None
+    for _ in range(repeats):
+        body, timings = fn(model, schema, limit)
+        if best is None or sum(timings.values()) < sum(best.values()):
+            best = timings
+    return body, best
+
+
+def run(limit: int, repeats: int) -> dict:
+    report = {}
+    for name, (model, schema) in TARGETS.items():
+        orm_body, orm = _best(_orm_path, model, schema, limit, repeats)
+        fast_body, fast = _best(_fast_path, model, schema, limit, repeats)
+        rows = len(json.loads(fast_body))
+        per_row = lambda seconds: seconds / rows * 1e6 if rows else 0.0
+        orm_total = sum(orm.values())
+        report[name] = {
+            "rows": rows,
+            "identical": orm_body == fast_body,
+            "orm_us_per_row": {stage: per_row(seconds) for stage, seconds in orm.items()},
+            "orm_total_us_per_row": per_row(orm_total),
+            "fast_total_us_per_row": per_row(fast["total"]),
+            "speedup": orm_total / fast["total"] if fast["total"] else None,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.limit, args.repeats), indent=2))
@@ -0,0 +1,76 @@
+"""Cold-start time: from launching uvicorn until every worker is ready.
+
+Launches `uvicorn main:app --workers N` --runs times against the current
+database and reports, per run, the time until the first request is
+answered and until all N workers have logged "Application startup
+complete". Run it from the backend directory after `python seed.py`.
+
+    python -m benchmarks.startup --workers 4 --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import httpx
+
+READY_LINE = "Application startup complete"
+
+
+def _first_response(url: str, started: float, timeout: float):
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            time.sleep(0.01)
+    return None
+
+
+def run_once(workers: int, port: int, timeout: float) -> dict:
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers)]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    ready = []
+
+    def watch():
+        for line in process.stderr:
+            if READY_LINE in line:
+                ready.append(time.perf_counter() - started)
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        first = _first_response(f"http://127.0.0.1:{port}/docs", started, timeout)
+        deadline = started + timeout
+        while len(ready) < workers and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "first_response_ms": first * 1000 if first is not None else None,
+        "all_workers_ready_ms": ready[workers - 1] * 1000 if len(ready) >= workers else None,
+    }
+
+
+def run(workers: int, runs: int, port: int, timeout: float) -> dict:
+    results = [run_once(workers, port, timeout) for _ in range(runs)]
+    report = {"workers": workers, "runs": results}
+    for key in ("first_response_ms", "all_workers_ready_ms"):
+        values = [r[key] for r in results if r[key] is not None]
+        report[f"median_{key}"] = statistics.median(values) if values else None
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.runs, args.port, args.timeout), indent=2))
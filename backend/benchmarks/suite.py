@@ -0,0 +1,310 @@
+"""Benchmark every endpoint of the auth, users, sectors, companies and analyses routers.
+
+Runs in-process through the ASGI app (default) or against a running
+server with --url. Each scenario exercises one endpoint. Rows created by a
+create scenario are removed again by the matching delete scenario; bars
+from the bulk scenario stay behind on a dedicated "Benchmark" company, so
+point the suite at a scratch database. The report is JSON: per scenario
+throughput, p50/p95/p99 latency, error count and peak RSS of the server.
+
+    python seed.py && python datagen.py --companies 1000 --bars 1000
+    python -m benchmarks.suite --output before.json
+    git checkout <other commit>
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Peak RSS is only reported when the server's /proc entry is readable: in
+process, or with --server-pid for a local uvicorn.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import subprocess
+import time
+from datetime import datetime, timedelta
+import httpx
+from benchmarks.stats import peak_rss_mb, reset_peak_rss, summarize
+
+ADMIN_USERNAME = os.environ.get("BENCH_ADMIN_USERNAME", "kri")
+ADMIN_PASSWORD = os.environ.get("BENCH_ADMIN_PASSWORD", "kri")
+# Password hashing is deliberately slow; auth scenarios run fewer requests
+AUTH_REQUESTS = 10
+# Each password change revokes the tokens other requests just obtained
+SERIAL = {"users: change password (with login)"}
+BENCH_SECTOR = "Benchmark"
+BENCH_SYMBOL = "BENCH"
+
+
+def _analysis(ctx):
+    # Every generated bar gets its own timestamp so (company_id, date) never collides
+    date = ctx["epoch"] + timedelta(microseconds=next(ctx["bars"]))
+    return {
+        "company_id": ctx["bench_company"], "date": date.isoformat(),
+        "open_price": 10.0, "high_price": 11.0, "low_price": 9.0, "close_price": 10.5, "volume": 1000,
+        "predicted_close": 10.7, "signal": "BUY", "confidence_score": 0.6,
+    }
+
+
+def _company(ctx, i, prefix="B"):
+    # Symbols are unique; updates use their own prefix so they never take a created one
+    return {
+        "sector_id": ctx["bench_sector"], "symbol": f"{prefix}{ctx['run'] % 10000:04d}{i % 100000:05d}",
+        "company_name": f"Bench {i}", "market_cap": 1e9, "pe_ratio": 15.0, "revenue": 1e8,
+    }
+
+
+def _bulk(ctx, rows: int) -> str:
+    return "\n".join(json.dumps(_analysis(ctx)) for _ in range(rows))
+
+
+async def _keep(ctx, key, request, field="id"):
+    # Remember created ids for the update and delete scenarios that follow
+    response = await request
+    if response.status_code < 300:
+        ctx.setdefault(key, []).append(response.json()[field])
+    return response
+
+
+async def _as_member(client, ctx, method: str, path: str, **kwargs):
+    # Changing the password revokes the member's tokens, so log in first
+    login = await client.post("/auth/login", data={"username": ctx["member"], "password": "pw"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    return await client.request(method, path, headers=headers, **kwargs)
+
+
+def _pick(ctx, key, i):
+    ids = ctx.get(key) or [0]
+    return ids[i % len(ids)]
+
+
+def _pop(ctx, key):
+    return ctx[key].pop() if ctx.get(key) else 0
+
+
+# (name, router, request cap, fn(client, ctx, i) -> awaitable response)
+SCENARIOS = [
+    ("auth: register", "auth", AUTH_REQUESTS, lambda c, ctx, i: _keep(ctx, "users", c.post(
+        "/auth/register", json={"username": f"bench{ctx['run']}_{i}", "email": f"bench{ctx['run']}_{i}@example.com", "password": "pw"}))),
+    ("auth: login", "auth", AUTH_REQUESTS, lambda c, ctx, i: c.post(
+        "/auth/login", data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})),
+    ("auth: refresh", "auth", None, lambda c, ctx, i: c.post("/auth/refresh", headers=ctx["admin"])),
+
+    ("users: list", "users", None, lambda c, ctx, i: c.get("/api/v1/users", headers=ctx["admin"])),
+    ("users: change role", "users", None, lambda c, ctx, i: c.patch(
+        f"/api/v1/users/{_pick(ctx, 'users', i)}/role", json={"role": "member"}, headers=ctx["admin"])),
+    ("users: change password (with login)", "users", AUTH_REQUESTS, lambda c, ctx, i: _as_member(
+        c, ctx, "PATCH", "/api/v1/users/me/password", json={"current_password": "pw", "new_password": "pw"})),
+    ("users: delete", "users", AUTH_REQUESTS, lambda c, ctx, i: c.delete(
+        f"/api/v1/users/{_pop(ctx, 'users')}", headers=ctx["admin"])),
+    ("users: delete me (with login)", "users", 1, lambda c, ctx, i: _as_member(c, ctx, "DELETE", "/api/v1/users/me")),
+
+    ("sectors: list", "sectors", None, lambda c, ctx, i: c.get("/sectors/")),
+    ("sectors: create", "sectors", None, lambda c, ctx, i: _keep(ctx, "sectors", c.post(
+        "/sectors/", json={"name": f"Bench {ctx['run']} {i}", "description": "benchmark"}, headers=ctx["admin"]))),
+    ("sectors: update", "sectors", None, lambda c, ctx, i: c.put(
+        f"/sectors/{_pick(ctx, 'sectors', i)}", json={"name": f"Bench {ctx['run']} {i}", "description": "updated"})),
+    ("sectors: delete", "sectors", None, lambda c, ctx, i: c.delete(f"/sectors/{_pop(ctx, 'sectors')}")),
+    ("sectors: all stats", "sectors", None, lambda c, ctx, i: c.get("/sectors/stats")),
+    ("sectors: get", "sectors", None, lambda c, ctx, i: c.get(f"/sectors/{ctx['sector_id']}")),
+    ("sectors: get include=companies", "sectors", None, lambda c, ctx, i: c.get(
+        f"/sectors/{ctx['sector_id']}?include=companies")),
+    ("sectors: get include=analyses", "sectors", None, lambda c, ctx, i: c.get(
+        f"/sectors/{ctx['sector_id']}?include=analyses&analyses_limit=5")),
+    ("sectors: stats", "sectors", None, lambda c, ctx, i: c.get(f"/sectors/{ctx['sector_id']}/stats")),
+    ("sectors: companies", "sectors", None, lambda c, ctx, i: c.get(f"/sectors/{ctx['sector_id']}/companies")),
+    ("sectors: company", "sectors", None, lambda c, ctx, i: c.get(
+        f"/sectors/{ctx['sector_id']}/companies/{ctx['company_id']}")),
+    ("sectors: company analyses", "sectors", None, lambda c, ctx, i: c.get(
+        f"/sectors/{ctx['sector_id']}/companies/{ctx['company_id']}/analyses")),
+
+    ("companies: list", "companies", None, lambda c, ctx, i: c.get("/companies/")),
+    ("companies: batch indicators", "companies", None, lambda c, ctx, i: c.get(
+        f"/companies/indicators?ids={ctx['company_ids']}&names=rsi14,ema20,macd&limit=50")),
+    ("companies: create", "companies", None, lambda c, ctx, i: _keep(ctx, "companies", c.post(
+        "/companies/", json=_company(ctx, i)))),
+    ("companies: get", "companies", None, lambda c, ctx, i: c.get(f"/companies/{ctx['company_id']}")),
+    ("companies: by symbol", "companies", None, lambda c, ctx, i: c.get(f"/companies/by-symbol/{ctx['symbol']}")),
+    ("companies: list by symbols", "companies", None, lambda c, ctx, i: c.get(f"/companies/?symbols={ctx['symbols']}")),
+    ("companies: search", "companies", None, lambda c, ctx, i: c.get(f"/companies/search?q={ctx['symbol'][:1 + i % 3]}")),
+    ("companies: batch fundamentals", "companies", None, lambda c, ctx, i: c.put(
+        "/companies/batch", json=[{"symbol": BENCH_SYMBOL, "pe_ratio": 10 + i % 7}])),
+    ("companies: update", "companies", None, lambda c, ctx, i: c.put(
+        f"/companies/{_pick(ctx, 'companies', i)}", json=_company(ctx, i, prefix="U"))),
+    ("companies: delete", "companies", None, lambda c, ctx, i: c.delete(f"/companies/{_pop(ctx, 'companies')}")),
+    ("companies: history", "companies", None, lambda c, ctx, i: c.get(f"/companies/{ctx['company_id']}/history")),
+    ("companies: history weekly binary", "companies", None, lambda c, ctx, i: c.get(
+        f"/companies/{ctx['company_id']}/history?interval=week&format=binary")),
+    ("companies: indicators", "companies", None, lambda c, ctx, i: c.get(
+        f"/companies/{ctx['company_id']}/indicators?names=sma50,rsi14,bb20,atr14")),
+
+    ("analyses: list", "analyses", None, lambda c, ctx, i: c.get("/analyses/")),
+    ("analyses: list by company", "analyses", None, lambda c, ctx, i: c.get(
+        f"/analyses/?company_id={ctx['company_id']}&order=company_date")),
+    ("analyses: export", "analyses", None, lambda c, ctx, i: c.get(f"/analyses/export?company_id={ctx['company_id']}")),
+    ("analyses: create", "analyses", None, lambda c, ctx, i: _keep(ctx, "analyses", c.post(
+        "/analyses/", json=_analysis(ctx)))),
+    ("analyses: get", "analyses", None, lambda c, ctx, i: c.get(f"/analyses/{_pick(ctx, 'analyses', i)}")),
+    ("analyses: update", "analyses", None, lambda c, ctx, i: c.put(
+        f"/analyses/{_pick(ctx, 'analyses', i)}", json=_analysis(ctx))),
+    ("analyses: delete", "analyses", None, lambda c, ctx, i: c.delete(f"/analyses/{_pop(ctx, 'analyses')}")),
+    ("analyses: bulk 100 rows", "analyses", None, lambda c, ctx, i: c.post(
+        "/analyses/bulk", content=_bulk(ctx, 100), headers={"content-type": "application/x-ndjson"})),
+
+    ("signals: latest", "signals", None, lambda c, ctx, i: c.get(f"/signals/latest?sector_id={ctx['sector_id']}")),
+    ("jobs: list queued", "jobs", None, lambda c, ctx, i: c.get("/jobs/?status=queued", headers=ctx["admin"])),
+    ("metrics", "metrics", None, lambda c, ctx, i: c.get("/metrics")),
+]
+
+
+async def _bench_ids(client: httpx.AsyncClient, ctx: dict):
+    # Writes go to a dedicated sector and company, reused across runs
+    sectors = (await client.get("/sectors/")).json()
+    sector = next((s for s in sectors if s["name"] == BENCH_SECTOR), None)
+    if sector is None:
+        sector = (await client.post("/sectors/", json={"name": BENCH_SECTOR, "description": "benchmark writes"},
+                                   headers=ctx["admin"])).json()
+    ctx["bench_sector"] = sector["id"]
+
+    companies = (await client.get(f"/sectors/{sector['id']}/companies")).json()
+    company = next((c for c in companies if c["symbol"] == BENCH_SYMBOL), None)
+    if company is None:
+        company = (await client.post("/companies/", json={**_company(ctx, 0), "symbol": BENCH_SYMBOL})).json()
+    ctx["bench_company"] = company["id"]
+
+
+async def _setup(client: httpx.AsyncClient) -> dict:
+    ctx = {
+        "run": int(time.time()),
+        "epoch": datetime(2100, 1, 1) + timedelta(seconds=int(time.time())),
+        "bars": itertools.count(),
+    }
+    login = await client.post("/auth/login", data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    login.raise_for_status()
+    ctx["admin"] = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    # Company and analysis reads need a user with the company ACL on; the admin sees every row
+    client.headers.update(ctx["admin"])
+
+    companies = (await client.get("/companies/?limit=20")).json()
+    if not companies:
+        raise SystemExit("No companies in the database; run seed.py and datagen.py first")
+    ctx["company_id"] = companies[0]["id"]
+    ctx["sector_id"] = companies[0]["sector_id"]
+    ctx["company_ids"] = ",".join(str(c["id"]) for c in companies)
+    ctx["symbol"] = companies[0]["symbol"]
+    ctx["symbols"] = ",".join(c["symbol"] for c in companies)
+    await _bench_ids(client, ctx)
+
+    # A throwaway member for the password and delete-me scenarios
+    ctx["member"] = f"bench{ctx['run']}_member"
+    await client.post("/auth/register", json={"username": ctx["member"], "email": f"{ctx['member']}@example.com", "password": "pw"})
+    return ctx
+
+
+async def _run_scenario(client, ctx, fn, requests: int, concurrency: int) -> tuple:
+    latencies, errors = [], []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await fn(client, ctx, i)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run(client: httpx.AsyncClient, requests: int, concurrency: int, routers: set, pid) -> dict:
+    ctx = await _setup(client)
+    report = {}
+    for name, router, override, fn in SCENARIOS:
+        if routers and router not in routers:
+            continue
+        count = min(requests, override) if override else requests
+        reset = pid is not None and reset_peak_rss(pid)
+        latencies, errors, elapsed = await _run_scenario(client, ctx, fn, count, 1 if name in SERIAL else concurrency)
+        report[name] = {
+            **summarize(latencies, elapsed),
+            "errors": len(errors),
+            "error_statuses": sorted(set(map(str, errors))),
+            "peak_rss_mb": peak_rss_mb(pid) if reset else None,
+        }
+        print(f"{name:40s} {report[name]['throughput_rps']:8.1f} req/s  p50 {report[name]['p50_ms']:8.2f} ms  "
+              f"p99 {report[name]['p99_ms']:8.2f} ms  errors {len(errors)}", file=sys.stderr)
+    return report
+
+
+async def run_in_process(requests: int, concurrency: int, routers: set) -> dict:
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return await run(client, requests, concurrency, routers, os.getpid())
+
+
+async def run_remote(url: str, requests: int, concurrency: int, routers: set, pid) -> dict:
+    async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+        return await run(client, requests, concurrency, routers, pid)
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(report: dict, baseline: dict):
+    print(f"\n{'scenario':40s} {'p50':>10s} {'p99':>10s} {'req/s':>10s}   vs {baseline.get('commit', 'baseline')}")
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        ratio = lambda key: f"{current[key] / before[key]:9.2f}x" if before[key] else "       n/a"
+        print(f"{name:40s} {ratio('p50_ms')} {ratio('p99_ms')} {ratio('throughput_rps')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of the app in process")
+    parser.add_argument("--server-pid", type=int, default=None, help="Server pid for peak RSS with --url")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routers", default="", help="Comma separated subset, e.g. sectors,companies")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON report to compare against")
+    args = parser.parse_args()
+
+    routers = {r.strip() for r in args.routers.split(",") if r.strip()}
+    if "users" in routers:
+        routers.add("auth")  # the user scenarios act on the accounts registered there
+    if args.url:
+        scenarios = asyncio.run(run_remote(args.url, args.requests, args.concurrency, routers, args.server_pid))
+    else:
+        scenarios = asyncio.run(run_in_process(args.requests, args.concurrency, routers))
+
+    report = {
+        "commit": _commit(),
+        "mode": args.url or "in-process",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -1,14 +1,155 @@
-from sqlalchemy import create_engine
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from functools import partial
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./test.db")
+# Optional replica for read-only traffic; defaults to the primary database
+SQLALCHEMY_READ_URL = os.environ.get("DATABASE_READ_URL", SQLALCHEMY_DATABASE_URL)
+
+# Storage profile, every value can be overridden from the environment
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", "20"))
+POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+WRITE_BATCH_SIZE = int(os.environ.get("DB_WRITE_BATCH_SIZE", "64"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record, read_only=False):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def _create_engine(url: str, pool_size: int, read_only: bool = False):
+    if make_url(url).get_backend_name() == "sqlite":
+        # Routes are sync and run in the threadpool, so a pooled SQLite
+        # connection may be used by a different thread than the one that opened it
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=pool_size,
+            max_overflow=MAX_OVERFLOW,
+        )
+        event.listen(engine, "connect", partial(_set_sqlite_pragmas, read_only=read_only))
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=POOL_RECYCLE_SECONDS,
+    )
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL, POOL_SIZE)
+read_engine = _create_engine(SQLALCHEMY_READ_URL, READ_POOL_SIZE, read_only=True)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Read-only session for GET routes; with WAL these never wait on writers
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class WriteQueue:
+    """Single writer thread that groups small write jobs into one transaction.
+
+    A job is a callable taking a Session; its return value is delivered
+    through the Future returned by submit(). Jobs waiting in the queue are
+    run back to back and committed together. If any job in a batch fails,
+    the batch is rolled back and each job is retried in its own transaction
+    so only the failing one reports the error.
+    """
+
+    def __init__(self, session_factory, max_batch: int = WRITE_BATCH_SIZE):
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, job) -> Future:
+        future = Future()
+        self._queue.put((job, future))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+        return future
+
+    def run(self, job):
+        return self.submit(job).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        session = self._session_factory(expire_on_commit=False)
+        try:
+            results = [job(session) for job, _ in batch]
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+            else:
+                for job, future in batch:
+                    self._run_alone(job, future)
+            return
+        finally:
+            session.close()
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run_alone(self, job, future):
+        session = self._session_factory(expire_on_commit=False)
+        try:
+            result = job(session)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            session.close()
+
+
+write_queue = WriteQueue(SessionLocal)
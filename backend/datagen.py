@@ -0,0 +1,210 @@
+"""Generate a synthetic market dataset directly into the database.
+
+Prices follow a geometric random walk per company with realistic daily
+volatility; predictions are the next close plus noise and the signal is
+derived from the predicted move. Rows are inserted with executemany in
+batches, so the API is not involved.
+
+Run from the backend directory, e.g. 20 sectors, 10k companies and
+5000 business days each (50M bars):
+
+    python datagen.py --sectors 20 --companies 10000 --bars 5000
+
+The defaults build a smaller dataset that loads in a few minutes.
+"""
+import argparse
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import func, insert, select
+from database import SessionLocal, engine
+from hashing import pwd_context
+from models import Analysis, Company, Sector, User
+import migrations
+import rollups
+
+SECTOR_NAMES = [
+    "Technology", "Healthcare", "Financials", "Energy", "Utilities", "Materials",
+    "Industrials", "Consumer Staples", "Consumer Discretionary", "Real Estate",
+    "Communication Services", "Semiconductors", "Biotechnology", "Banks", "Insurance",
+    "Transportation", "Media", "Retail", "Software", "Aerospace",
+]
+BATCH_SIZE = 50_000
+DEFAULT_PASSWORD = "password"
+
+
+def _symbols(count: int, taken: set) -> list[str]:
+    symbols = []
+    index = 0
+    while len(symbols) < count:
+        code, n = "", index
+        for _ in range(4):
+            n, r = divmod(n, 26)
+            code = chr(65 + r) + code
+        index += 1
+        if code not in taken:
+            symbols.append(code)
+    return symbols
+
+
+def _insert_batches(table, rows_iter, label: str) -> int:
+    total = 0
+    batch = []
+    started = time.perf_counter()
+    for row in rows_iter:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            with engine.begin() as conn:
+                conn.execute(insert(table), batch)
+            total += len(batch)
+            batch = []
+            print(f"  {label}: {total:,} rows ({total / (time.perf_counter() - started):,.0f} rows/s)", flush=True)
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(insert(table), batch)
+        total += len(batch)
+    return total
+
+
+def generate_sectors(count: int) -> list[int]:
+    rows = [
+        {
+            "name": SECTOR_NAMES[i % len(SECTOR_NAMES)] + ("" if i < len(SECTOR_NAMES) else f" {i // len(SECTOR_NAMES) + 1}"),
+            "description": "Synthetic sector",
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(count)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), rows)
+        return conn.execute(select(Sector.id).order_by(Sector.id.desc()).limit(count)).scalars().all()
+
+
+def generate_companies(sector_ids: list, count: int, rng) -> list[int]:
+    with engine.connect() as conn:
+        taken = set(conn.execute(select(Company.symbol)).scalars())
+    symbols = _symbols(count, taken)
+    market_caps = np.round(np.exp(rng.normal(22.5, 1.6, count)), 2)  # ~6B median, long right tail
+    pe = np.round(np.clip(rng.lognormal(2.9, 0.5, count), 3, 300), 2)
+    margin = np.round(np.clip(rng.normal(12, 9, count), -50, 60), 2)
+    rows = [
+        {
+            "sector_id": sector_ids[i % len(sector_ids)],
+            "symbol": symbols[i],
+            "company_name": f"{symbols[i].title()} Holdings",
+            "market_cap": float(market_caps[i]),
+            "pe_ratio": float(pe[i]),
+            "eps": round(float(rng.uniform(0.1, 15)), 2),
+            "revenue": round(float(market_caps[i] * rng.uniform(0.1, 1.5)), 2),
+            "profit_margin": float(margin[i]),
+            "debt_to_equity": round(float(rng.uniform(0, 3)), 2),
+            "dividend_yield": round(float(max(0.0, rng.normal(1.8, 1.5))), 2),
+            "last_updated": datetime.utcnow(),
+        }
+        for i in range(count)
+    ]
+    _insert_batches(Company.__table__, rows, "companies")
+    with engine.connect() as conn:
+        return conn.execute(select(Company.id).where(Company.symbol.in_(symbols))).scalars().all()
+
+
+def _bar_dates(bars: int, end: str) -> list[datetime]:
+    end_day = np.datetime64(end, "D")
+    days = np.busday_offset(end_day, -np.arange(bars)[::-1], roll="backward")
+    opening = np.timedelta64(9 * 60 + 30, "m")
+    return (days + opening).astype("datetime64[s]").astype(datetime).tolist()
+
+
+def _company_bars(company_id: int, dates: list, rng):
+    n = len(dates)
+    sigma = rng.uniform(0.01, 0.03)
+    close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0.0003, sigma, n)))
+    previous = np.concatenate(([close[0]], close[:-1]))
+    open_ = previous * (1 + rng.normal(0, sigma / 4, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, sigma / 2, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, sigma / 2, n)))
+    volume = rng.lognormal(14, 1, n).astype(np.int64)
+
+    predicted_close = close * (1 + rng.normal(0, sigma, n))
+    move = predicted_close / close - 1
+    signal = np.select(
+        [move > 0.02, move > 0.005, move < -0.02, move < -0.005],
+        ["STRONG_BUY", "BUY", "STRONG_SELL", "SELL"],
+        "HOLD",
+    )
+    confidence = np.round(np.clip(0.5 + np.abs(move) * 10 + rng.normal(0, 0.1, n), 0, 1), 2)
+    spread = np.abs(rng.normal(0, sigma, n))
+
+    columns = {
+        "open_price": open_, "close_price": close, "high_price": high, "low_price": low,
+        "predicted_open": predicted_close * (1 + rng.normal(0, sigma / 4, n)),
+        "predicted_high": predicted_close * (1 + spread),
+        "predicted_low": predicted_close * (1 - spread),
+        "predicted_close": predicted_close,
+    }
+    columns = {name: np.round(values, 2).tolist() for name, values in columns.items()}
+    volume, signal, confidence = volume.tolist(), signal.tolist(), confidence.tolist()
+    created_at = datetime.utcnow()
+    for i in range(n):
+        yield {
+            "company_id": company_id,
+            "date": dates[i],
+            **{name: values[i] for name, values in columns.items()},
+            "volume": volume[i],
+            "signal": signal[i],
+            "confidence_score": confidence[i],
+            "created_at": created_at,
+        }
+
+
+def generate_analyses(company_ids: list, bars: int, end: str, rng) -> int:
+    dates = _bar_dates(bars, end)
+    rows = (row for company_id in company_ids for row in _company_bars(company_id, dates, rng))
+    return _insert_batches(Analysis.__table__, rows, "analyses")
+
+
+def generate_users(count: int) -> int:
+    # One hash for everyone: hashing is deliberately slow
+    hashed = pwd_context.hash(DEFAULT_PASSWORD)
+    with engine.connect() as conn:
+        offset = conn.execute(select(func.count(User.id))).scalar()
+    rows = [
+        {
+            "username": f"user{offset + i}",
+            "email": f"user{offset + i}@example.com",
+            "hashed_password": hashed,
+            "role": "member",
+            "token_version": 0,
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(count)
+    ]
+    return _insert_batches(User.__table__, rows, "users")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sectors", type=int, default=20)
+    parser.add_argument("--companies", type=int, default=1000)
+    parser.add_argument("--bars", type=int, default=250, help="Daily bars per company")
+    parser.add_argument("--end", default="2025-12-31", help="Date of the last bar")
+    parser.add_argument("--users", type=int, default=100, help=f"Members with password '{DEFAULT_PASSWORD}'")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    rng = np.random.default_rng(args.seed)
+    started = time.perf_counter()
+    sector_ids = generate_sectors(args.sectors)
+    company_ids = generate_companies(sector_ids, args.companies, rng)
+    bars = generate_analyses(company_ids, args.bars, args.end, rng)
+    users = generate_users(args.users)
+
+    session = SessionLocal()
+    try:
+        rollups.rebuild(session)
+        session.commit()
+    finally:
+        session.close()
+    print(f"{len(sector_ids)} sectors, {len(company_ids)} companies, {bars:,} bars, {users} users "
+          f"in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,120 @@
+"""Streaming encoders for exporting the analyses table.
+
+Rows are read through a server-side cursor in batches of CHUNK_SIZE and
+each batch is encoded and yielded as one piece of the response body, so
+memory stays flat however many rows match. The generator opens its own
+read session because the request's dependencies are closed before a
+streaming body is sent.
+"""
+import csv
+import importlib.util
+import io
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import Float, Numeric, select, type_coerce
+from database import ReadSessionLocal
+from models import Analysis
+import schemas
+
+CHUNK_SIZE = 5000
+FIELDS = list(schemas.Analysis.model_fields)
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _column(name: str):
+    column = getattr(Analysis, name)
+    # DECIMAL columns come back as Decimal, which is slow to build and not JSON serializable
+    return type_coerce(column, Float) if isinstance(column.type, Numeric) else column
+
+
+def _batches(filters: tuple, chunk_size: int):
+    query = (
+        select(*[_column(name) for name in FIELDS])
+        .where(*filters)
+        .order_by(Analysis.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    db = ReadSessionLocal()
+    try:
+        for rows in db.execute(query).partitions():
+            yield rows
+    finally:
+        db.close()
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson(batches):
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(FIELDS, map(_iso, row)))) + "\n" for row in rows
+        ).encode()
+
+
+def _csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for rows in batches:
+        writer.writerows([_iso(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Sink(io.RawIOBase):
+    # Write-only file that hands written bytes back to the generator
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _parquet(batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        "id": pa.int64(),
+        "company_id": pa.int64(),
+        "date": pa.timestamp("us"),
+        "volume": pa.int64(),
+        "signal": pa.string(),
+        "created_at": pa.timestamp("us"),
+    }
+    schema = pa.schema([(name, types.get(name, pa.float64())) for name in FIELDS])
+    sink = _Sink()
+    # One row group per batch; the footer is written when the writer closes
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in batches:
+            writer.write_table(pa.table(dict(zip(FIELDS, zip(*rows))), schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+_ENCODERS = {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}
+
+
+def stream(fmt: str, filters: tuple, chunk_size: int = CHUNK_SIZE):
+    if fmt == "parquet":
+        if importlib.util.find_spec("pyarrow") is None:
+            raise HTTPException(status_code=501, detail="Parquet export requires the pyarrow package")
+    return _ENCODERS[fmt](_batches(filters, chunk_size))
@@ -0,0 +1,318 @@
+"""Push feed of committed analyses over WebSocket and Server-Sent Events.
+
+Clients subscribe to topics: ``company:<id>``, ``sector:<id>``,
+``signal:<name>`` or ``*`` for everything. An event reaches a subscriber
+when it matches any of its topics. Write handlers call ``publish()`` after
+their commit.
+
+Each event is encoded once, for both transports, and then looked up in a
+topic -> subscribers index, so the fan-out cost grows with the number of
+matching subscribers, not with the number of open connections. Every
+subscriber owns a queue of at most FEED_QUEUE_SIZE frames. When a slow
+consumer's queue is full its oldest frame is dropped, and the next read
+starts with a ``{"type": "dropped", "count": n}`` notice so the client
+knows to re-fetch.
+
+By default an event only reaches the subscribers of the worker that
+committed it. Set FEED_URL (defaults to RESPONSE_CACHE_URL) to a
+``redis://`` URL to relay events between workers over one pub/sub
+channel (needs the ``redis`` package).
+
+Subscribers that are not admins only receive events for the companies
+granted to them (see ``access``). Their allowed set is read when they
+connect; a grant or revoke closes their connections so they reconnect
+with the new set.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Iterable, Optional
+import schemas
+from database import ReadSessionLocal
+from symbolindex import symbol_index
+
+logger = logging.getLogger(__name__)
+
+FEED_URL = os.environ.get("FEED_URL", os.environ.get("RESPONSE_CACHE_URL", ""))
+FEED_QUEUE_SIZE = int(os.environ.get("FEED_QUEUE_SIZE", "256"))
+FEED_MAX_SUBSCRIBERS = int(os.environ.get("FEED_MAX_SUBSCRIBERS", "20000"))
+FEED_KEEPALIVE_SECONDS = float(os.environ.get("FEED_KEEPALIVE_SECONDS", "15"))
+MAX_TOPICS = 1000
+SIGNALS = ("BUY", "SELL", "HOLD", "STRONG_BUY", "STRONG_SELL")
+CHANNEL = "feed:analyses"
+
+
+def parse_topics(company_ids: Optional[str] = None, sector_ids: Optional[str] = None,
+                 signals: Optional[str] = None) -> set:
+    """Topics from comma separated lists; nothing selected means everything."""
+    topics = set()
+    for prefix, raw in (("company", company_ids), ("sector", sector_ids)):
+        for value in (raw or "").split(","):
+            value = value.strip()
+            if not value:
+                continue
+            if not value.isdigit():
+                raise ValueError(f"Invalid {prefix} id: {value!r}")
+            topics.add(f"{prefix}:{int(value)}")
+    for value in (signals or "").split(","):
+        value = value.strip().upper()
+        if not value:
+            continue
+        if value not in SIGNALS:
+            raise ValueError(f"Unknown signal: {value!r}")
+        topics.add(f"signal:{value}")
+    if len(topics) > MAX_TOPICS:
+        raise ValueError(f"At most {MAX_TOPICS} topics per subscription")
+    return topics or {"*"}
+
+
+class Frame:
+    __slots__ = ("topics", "text", "sse", "company_id")
+
+    def __init__(self, topics: tuple, text: str, event: str = "analysis", company_id: Optional[int] = None):
+        self.topics = topics
+        self.text = text
+        self.company_id = company_id
+        self.sse = f"event: {event}\ndata: {text}\n\n".encode()
+
+
+class Subscriber:
+    __slots__ = ("topics", "frames", "dropped", "ready", "closed", "user_id", "allowed")
+
+    def __init__(self, topics: set, maxsize: int, user_id: Optional[int] = None,
+                 allowed: Optional[frozenset] = None):
+        self.topics = topics
+        self.user_id = user_id
+        self.allowed = allowed      # company ids the subscriber may see, None for all
+        self.frames = deque(maxlen=maxsize)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def push(self, frame: Frame) -> bool:
+        # Runs on the event loop; a full deque discards its oldest frame
+        dropped = len(self.frames) == self.frames.maxlen
+        if dropped:
+            self.dropped += 1
+        self.frames.append(frame)
+        self.ready.set()
+        return dropped
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def next(self) -> Optional[list]:
+        """Pending frames, [] when woken for a keepalive, None once closed."""
+        if not self.frames and not self.closed:
+            # No per-wait timer: the hub's keepalive task wakes idle subscribers
+            self.ready.clear()
+            await self.ready.wait()
+        if self.closed:
+            return None
+        frames = list(self.frames)
+        self.frames.clear()
+        if self.dropped:
+            notice = json.dumps({"type": "dropped", "count": self.dropped})
+            frames.insert(0, Frame((), notice, event="dropped"))
+            self.dropped = 0
+        return frames
+
+
+class RedisRelay:
+    def __init__(self, url: str, deliver):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._deliver = deliver
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="feed-relay", daemon=True)
+            self._thread.start()
+
+    def publish(self, frames: list):
+        payload = json.dumps([[list(frame.topics), frame.text, frame.company_id] for frame in frames])
+        self._client.publish(CHANNEL, payload)
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        for message in pubsub.listen():
+            try:
+                frames = [
+                    Frame(tuple(topics), text, company_id=company_id)
+                    for topics, text, company_id in json.loads(message["data"])
+                ]
+            except (ValueError, TypeError):
+                logger.warning("feed: ignoring malformed relay message")
+                continue
+            self._deliver(frames)
+
+
+class FeedHub:
+    def __init__(self, queue_size: int = FEED_QUEUE_SIZE, max_subscribers: int = FEED_MAX_SUBSCRIBERS,
+                 url: str = FEED_URL):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._topics = {}        # topic -> set of Subscriber
+        self._subscribers = set()
+        self._loop = None
+        self._keepalive = None
+        self._relay = RedisRelay(url, self._deliver) if url else None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._keepalive = self._loop.create_task(self._wake_idle())
+        if self._relay is not None:
+            self._relay.start()
+
+    def close(self):
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+
+    async def _wake_idle(self):
+        while True:
+            await asyncio.sleep(FEED_KEEPALIVE_SECONDS)
+            for subscriber in self._subscribers:
+                if not subscriber.frames:
+                    subscriber.ready.set()
+
+    def wanted(self) -> bool:
+        """Whether publishing does anything; lets writers skip building events."""
+        return bool(self._subscribers) or self._relay is not None
+
+    # Subscriptions are only touched on the event loop
+
+    def subscribe(self, topics: set, user_id: Optional[int] = None,
+                  allowed: Optional[frozenset] = None) -> Subscriber:
+        if len(self._subscribers) >= self.max_subscribers:
+            raise OverflowError("Too many feed subscribers")
+        if self._loop is None:
+            self.start()
+        subscriber = Subscriber(set(), self.queue_size, user_id=user_id, allowed=allowed)
+        self._subscribers.add(subscriber)
+        self.update(subscriber, add=topics)
+        return subscriber
+
+    def update(self, subscriber: Subscriber, add: Iterable = (), remove: Iterable = ()):
+        for topic in remove:
+            subscriber.topics.discard(topic)
+            members = self._topics.get(topic)
+            if members is not None:
+                members.discard(subscriber)
+                if not members:
+                    del self._topics[topic]
+        for topic in add:
+            if topic in subscriber.topics:
+                continue
+            if len(subscriber.topics) >= MAX_TOPICS:
+                raise ValueError(f"At most {MAX_TOPICS} topics per subscription")
+            subscriber.topics.add(topic)
+            self._topics.setdefault(topic, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.update(subscriber, remove=list(subscriber.topics))
+        self._subscribers.discard(subscriber)
+        subscriber.close()
+
+    def _close_users(self, user_ids: set):
+        for subscriber in list(self._subscribers):
+            if subscriber.user_id in user_ids:
+                subscriber.close()
+
+    def drop_users(self, user_ids: Iterable):
+        """Close the users' connections, e.g. after their grants changed. Any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._subscribers:
+            return
+        loop.call_soon_threadsafe(self._close_users, set(user_ids))
+
+    # Publishing may happen on any thread
+
+    def publish(self, analyses: list, op: str = "created"):
+        """Send committed analyses (ORM rows or dicts with every Analysis field)."""
+        if not analyses or not self.wanted():
+            return
+        company_ids = {_field(a, "company_id") for a in analyses}
+        with ReadSessionLocal() as db:
+            symbol_index.ensure_loaded(db)
+            sectors = symbol_index.sector_ids(company_ids)
+            missing = company_ids.difference(sectors)
+            if missing:
+                symbol_index.refresh(db, missing)
+                sectors.update(symbol_index.sector_ids(missing))
+
+        frames = []
+        for analysis in analyses:
+            data = schemas.Analysis.model_validate(analysis).model_dump(mode="json")
+            sector_id = sectors.get(data["company_id"])
+            topics = ("*", f"company:{data['company_id']}", f"signal:{data['signal']}")
+            if sector_id is not None:
+                topics += (f"sector:{sector_id}",)
+            text = json.dumps({"type": "analysis", "op": op, "sector_id": sector_id, "analysis": data})
+            frames.append(Frame(topics, text, company_id=data["company_id"]))
+        self.published += len(frames)
+
+        if self._relay is not None:
+            try:
+                self._relay.publish(frames)
+                return
+            except Exception:
+                logger.exception("feed: relay publish failed, delivering locally only")
+        self._deliver(frames)
+
+    def _deliver(self, frames: list):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(frames)
+        else:
+            # One hop onto the loop per batch of events, not per subscriber
+            loop.call_soon_threadsafe(self._dispatch, frames)
+
+    def _dispatch(self, frames: list):
+        topics = self._topics
+        for frame in frames:
+            matched = set()
+            for topic in frame.topics:
+                members = topics.get(topic)
+                if members:
+                    matched.update(members)
+            for subscriber in matched:
+                if subscriber.allowed is not None and frame.company_id not in subscriber.allowed:
+                    continue
+                if subscriber.push(frame):
+                    self.dropped += 1
+                self.delivered += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+def _field(analysis, name: str):
+    return analysis[name] if isinstance(analysis, dict) else getattr(analysis, name)
+
+
+feed_hub = FeedHub()
@@ -0,0 +1,205 @@
+"""Apply a fundamentals snapshot to the companies table.
+
+Rows are keyed by symbol. Existing companies are loaded in chunks and
+compared column by column, at the precision the column stores; only the
+columns that actually changed are written, and last_updated is bumped
+for those rows only. Updates are grouped by the set of changed columns so
+each group is a single executemany UPDATE, and new symbols go in one
+executemany INSERT. If another writer adds one of those symbols first,
+the unique index rejects the INSERT; the transaction is rolled back and
+the snapshot diffed again, which turns those rows into updates. Sector
+rollups get the difference between the changed companies before and
+after the write, plus the inserted ones.
+
+Run from the backend directory with a CSV (header row), NDJSON or JSON
+array snapshot:
+
+    python fundamentals.py snapshot.csv
+    python fundamentals.py snapshot.ndjson --dry-run
+
+The same diff is served as PUT /companies/batch. Running servers keep
+cached company responses until the cache TTL expires after a CLI run.
+"""
+import argparse
+import csv
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+from pydantic import ValidationError
+from sqlalchemy import DECIMAL, bindparam, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Company, Sector
+import rollups
+import schemas
+
+FIELDS = [name for name in schemas.CompanyFundamentals.model_fields if name != "symbol"]
+REQUIRED_FOR_INSERT = ("sector_id", "company_name")
+# Stays well below SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+SECTOR_FIELDS = {"sector_id", "market_cap", "pe_ratio", "profit_margin", "dividend_yield"}
+# Re-diffs after a symbol was inserted concurrently, before those rows are rejected
+INSERT_RETRIES = 2
+
+
+def _normalize(name: str, value):
+    # Compare at the stored precision: 12.345 sent for a DECIMAL(10, 2) column is 12.35 either way
+    if value is None:
+        return None
+    column_type = Company.__table__.c[name].type
+    if isinstance(column_type, DECIMAL):
+        return Decimal(str(value)).quantize(Decimal(1).scaleb(-column_type.scale))
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _existing(db: Session, symbols: list) -> dict:
+    columns = [Company.id, Company.symbol, *[getattr(Company, name) for name in FIELDS]]
+    rows = {}
+    for start in range(0, len(symbols), LOOKUP_CHUNK):
+        chunk = symbols[start:start + LOOKUP_CHUNK]
+        for row in db.execute(select(*columns).where(Company.symbol.in_(chunk))):
+            rows[row.symbol] = row
+    return rows
+
+
+def _diff(db: Session, by_symbol: dict, now: datetime) -> tuple:
+    existing = _existing(db, list(by_symbol))
+    sector_ids = {row.sector_id for row in by_symbol.values() if row.sector_id is not None}
+    known_sectors = set(db.execute(select(Sector.id).where(Sector.id.in_(sector_ids))).scalars()) if sector_ids else set()
+
+    inserts, updates, errors = [], {}, []
+    changed_columns = {}
+    rollup_ids = []        # updated companies whose sector stats contribution changes
+    unchanged = 0
+    for symbol, row in by_symbol.items():
+        given = row.model_fields_set - {"symbol"}
+        if row.sector_id is not None and row.sector_id not in known_sectors:
+            errors.append(schemas.FundamentalsRowError(symbol=symbol, error=f"Unknown sector_id {row.sector_id}"))
+            continue
+
+        stored = existing.get(symbol)
+        if stored is None:
+            missing = [name for name in REQUIRED_FOR_INSERT if getattr(row, name) is None]
+            if missing:
+                errors.append(schemas.FundamentalsRowError(symbol=symbol, error=f"New symbol needs {', '.join(missing)}"))
+                continue
+            inserts.append({"symbol": symbol, **{name: getattr(row, name) for name in FIELDS}, "last_updated": now})
+            continue
+
+        changes = {
+            name: getattr(row, name) for name in FIELDS
+            if name in given and _normalize(name, getattr(row, name)) != _normalize(name, getattr(stored, name))
+        }
+        if not changes:
+            unchanged += 1
+            continue
+        for name in changes:
+            changed_columns[name] = changed_columns.get(name, 0) + 1
+        updates.setdefault(tuple(sorted(changes)), []).append({"b_id": stored.id, **changes, "last_updated": now})
+        if SECTOR_FIELDS & changes.keys():
+            rollup_ids.append(stored.id)
+    return inserts, updates, errors, changed_columns, rollup_ids, unchanged
+
+
+def apply_snapshot(db: Session, snapshot: list, dry_run: bool = False, retries: int = INSERT_RETRIES) -> tuple:
+    """Diff `snapshot` (CompanyFundamentals) against the stored rows and write the changes.
+
+    Returns (FundamentalsBatchResult, ids of the updated and inserted
+    companies). The caller commits; with dry_run nothing is written. A
+    symbol conflict rolls the session back, so this must be the first
+    write of the caller's transaction.
+    """
+    started = time.perf_counter()
+    now = datetime.now()
+    # Later rows for the same symbol replace earlier ones
+    by_symbol = {row.symbol: row for row in snapshot}
+    table = Company.__table__
+    while True:
+        inserts, updates, errors, changed_columns, rollup_ids, unchanged = _diff(db, by_symbol, now)
+        inserted_ids = []
+        if not inserts or dry_run:
+            break
+        # The first write, so a conflict has nothing else to undo
+        try:
+            inserted_ids = db.execute(table.insert().returning(table.c.id), inserts).scalars().all()
+            break
+        except IntegrityError as e:
+            db.rollback()
+            if retries > 0:
+                retries -= 1
+                continue
+            errors += [
+                schemas.FundamentalsRowError(symbol=row["symbol"], error=f"Insert failed: {e.orig}") for row in inserts
+            ]
+            inserts = []
+            break
+
+    written_ids = [row["b_id"] for rows in updates.values() for row in rows]
+    if not dry_run:
+        before = rollups.company_snapshot(db, rollup_ids)
+        for names, rows in updates.items():
+            stmt = (
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values({name: bindparam(name) for name in (*names, "last_updated")})
+            )
+            db.execute(stmt, rows)
+        written_ids += inserted_ids
+        rollups.apply_company_changes(db, before, rollups.company_snapshot(db, [*rollup_ids, *inserted_ids]))
+
+    result = schemas.FundamentalsBatchResult(
+        inserted=len(inserts),
+        changed=sum(len(rows) for rows in updates.values()),
+        unchanged=unchanged,
+        rejected=len(errors),
+        changed_columns=changed_columns,
+        errors=errors,
+        dry_run=dry_run,
+        elapsed_seconds=time.perf_counter() - started,
+    )
+    return result, written_ids
+
+
+def read_snapshot(path: str) -> tuple[list, list]:
+    """Parse a CSV, NDJSON or JSON file into (rows, errors)."""
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            # Empty cells are left out rather than compared as nulls
+            raw = [{k: v for k, v in record.items() if v not in ("", None)} for record in csv.DictReader(f)]
+        elif path.endswith(".ndjson") or path.endswith(".jsonl"):
+            raw = [json.loads(line) for line in f if line.strip()]
+        else:
+            raw = json.load(f)
+
+    rows, errors = [], []
+    for record in raw:
+        try:
+            rows.append(schemas.CompanyFundamentals.model_validate(record))
+        except ValidationError as e:
+            errors.append(schemas.FundamentalsRowError(symbol=str(record.get("symbol")), error=str(e.errors()[0]["msg"])))
+    return rows, errors
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    import migrations
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Snapshot file (.csv, .ndjson or .json)")
+    parser.add_argument("--dry-run", action="store_true", help="Report the diff without writing it")
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    rows, parse_errors = read_snapshot(args.path)
+    session = SessionLocal()
+    try:
+        result, _ = apply_snapshot(session, rows, dry_run=args.dry_run)
+        session.commit()
+    finally:
+        session.close()
+    result.rejected += len(parse_errors)
+    result.errors = parse_errors + result.errors
+    print(result.model_dump_json(indent=2))
@@ -0,0 +1,126 @@
+"""Password hashing off the request threads.
+
+sha256_crypt runs thousands of rounds in Python and holds the GIL, so a
+burst of logins would stall every other request even from the threadpool.
+Hashes are computed in a small process pool instead. At most MAX_PENDING
+jobs may be queued or running; beyond that callers get a 503 straight
+away instead of piling up behind the storm.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# HASH_WORKERS=0 hashes inline on the calling thread (CLI tools, tests)
+WORKERS = int(os.environ.get("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.environ.get("HASH_MAX_PENDING", "64"))
+ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", "535000"))
+
+# Hashes with fewer rounds than ROUNDS are flagged by verify_and_update and rehashed on login
+pwd_context = CryptContext(
+    schemes=["sha256_crypt"],
+    deprecated="auto",
+    sha256_crypt__default_rounds=ROUNDS,
+    sha256_crypt__min_rounds=ROUNDS,
+)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+class HashingPool:
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        if self.workers and self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    context = multiprocessing.get_context("spawn")
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many authentication requests, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        with self._lock:
+            self.pending += 1
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        self._acquire()
+        try:
+            if not self.workers:
+                return fn(*args)
+            self.start()
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._release()
+
+    async def _run_async(self, fn, *args):
+        # Awaits the worker process without holding an event loop or threadpool slot
+        self._acquire()
+        try:
+            if not self.workers:
+                return fn(*args)
+            self.start()
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self._release()
+
+    def verify_and_update(self, plain_password: str, hashed_password: str):
+        # Returns (valid, new_hash); new_hash is set when the stored hash is out of date
+        return self._run(_verify_and_update, plain_password, hashed_password)
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    async def verify_and_update_async(self, plain_password: str, hashed_password: str):
+        return await self._run_async(_verify_and_update, plain_password, hashed_password)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async(_hash, password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+hashing_pool = HashingPool()
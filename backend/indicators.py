@@ -0,0 +1,238 @@
+"""Vectorized technical indicators over the columnar price store.
+
+Indicator names are a kind followed by an optional period, e.g. ``sma50``,
+``ema20``, ``rsi14``, ``bb20``, ``atr14`` or ``macd``. Every indicator is
+computed from a start index so that, when new bars are appended, only the
+tail is recomputed from the state saved after the previous run.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from fastapi import HTTPException
+import pricestore
+
+DEFAULT_PERIODS = {"sma": 20, "ema": 20, "rsi": 14, "bb": 20, "atr": 14, "macd": None}
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLLINGER_WIDTH = 2.0
+CACHE_SIZE = 4096
+
+_NAME = re.compile(r"^(sma|ema|rsi|bb|atr|macd)(\d*)$")
+
+
+def parse_names(names: str) -> list[tuple[str, str, int]]:
+    parsed = []
+    for name in dict.fromkeys(n.strip().lower() for n in names.split(",") if n.strip()):
+        match = _NAME.match(name)
+        if not match:
+            raise HTTPException(status_code=400, detail=f"Unknown indicator: {name}")
+        kind, period = match.group(1), match.group(2)
+        if kind == "macd" and period:
+            raise HTTPException(status_code=400, detail="macd does not take a period")
+        period = int(period) if period else DEFAULT_PERIODS[kind]
+        if period is not None and not 1 <= period <= 1000:
+            raise HTTPException(status_code=400, detail=f"Invalid period for {name}")
+        parsed.append((name, kind, period))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="No indicators requested")
+    return parsed
+
+
+def _ewm(x: np.ndarray, alpha: float, prev: float) -> np.ndarray:
+    # y[t] = (1 - alpha) * y[t-1] + alpha * x[t], seeded with y[-1] = prev.
+    # Solved in closed form per block: y = p * (prev + alpha * cumsum(x / p))
+    # with p = decay ** (1..m). Blocks are short enough that p never drops
+    # below 1e-6, which keeps the division numerically safe.
+    decay = 1.0 - alpha
+    out = np.empty(len(x), dtype=np.float64)
+    if decay <= 0.0:
+        out[:] = x
+        return out
+    block = max(1, int(np.log(1e-6) / np.log(decay)))
+    powers = decay ** np.arange(1, block + 1)
+    for start in range(0, len(x), block):
+        chunk = x[start:start + block]
+        p = powers[:len(chunk)]
+        y = p * (prev + alpha * np.cumsum(chunk / p))
+        out[start:start + len(chunk)] = y
+        prev = y[-1]
+    return out
+
+
+def _rolling_window(x: np.ndarray, period: int, start: int) -> np.ndarray:
+    # Windows ending at positions start..len(x)-1 (windows shorter than period are skipped)
+    first = max(start, period - 1)
+    if first >= len(x):
+        return np.empty((0, period))
+    return np.lib.stride_tricks.sliding_window_view(x[first - period + 1:], period)
+
+
+def _pad(values: np.ndarray, start: int, n: int) -> np.ndarray:
+    # Left-pad with NaN so the result covers positions start..n-1
+    out = np.full(n - start, np.nan)
+    if len(values):
+        out[len(out) - len(values):] = values
+    return out
+
+
+def _sma(series, period, start, state):
+    close = series["close"]
+    windows = _rolling_window(close, period, start)
+    return {"": _pad(windows.mean(axis=1), start, len(close))}, None
+
+
+def _bollinger(series, period, start, state):
+    close = series["close"]
+    windows = _rolling_window(close, period, start)
+    mid = windows.mean(axis=1)
+    width = BOLLINGER_WIDTH * windows.std(axis=1)
+    n = len(close)
+    return {
+        "_mid": _pad(mid, start, n),
+        "_upper": _pad(mid + width, start, n),
+        "_lower": _pad(mid - width, start, n),
+    }, None
+
+
+def _ema_from(x, period, start, prev):
+    alpha = 2.0 / (period + 1)
+    if prev is None:
+        prev = x[0]
+    return _ewm(x[start:], alpha, prev)
+
+
+def _ema(series, period, start, state):
+    values = _ema_from(series["close"], period, start, state)
+    return {"": values}, values[-1]
+
+
+def _macd(series, period, start, state):
+    close = series["close"]
+    fast_prev, slow_prev, signal_prev = state or (None, None, None)
+    fast = _ema_from(close, MACD_FAST, start, fast_prev)
+    slow = _ema_from(close, MACD_SLOW, start, slow_prev)
+    line = fast - slow
+    signal = _ewm(line, 2.0 / (MACD_SIGNAL + 1), line[0] if signal_prev is None else signal_prev)
+    return (
+        {"": line, "_signal": signal, "_hist": line - signal},
+        (fast[-1], slow[-1], signal[-1]),
+    )
+
+
+def _wilder(x, period, start, prev):
+    # Wilder smoothing is an EWM with alpha = 1 / period
+    if prev is None:
+        prev = x[0]
+    return _ewm(x[start:], 1.0 / period, prev)
+
+
+def _rsi(series, period, start, state):
+    close = series["close"]
+    change = np.diff(close, prepend=close[0])
+    gain_prev, loss_prev = state or (None, None)
+    gains = _wilder(np.clip(change, 0, None), period, start, gain_prev)
+    losses = _wilder(np.clip(-change, 0, None), period, start, loss_prev)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(losses == 0, 100.0, 100.0 - 100.0 / (1.0 + gains / losses))
+    # Not enough history before the first full period
+    positions = np.arange(start, len(close))
+    rsi[positions < period] = np.nan
+    return {"": rsi}, (gains[-1], losses[-1])
+
+
+def _atr(series, period, start, state):
+    high, low, close = series["high"], series["low"], series["close"]
+    prev_close = np.concatenate(([close[0]], close[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    atr = _wilder(true_range, period, start, state)
+    positions = np.arange(start, len(close))
+    result = atr.copy()
+    result[positions < period - 1] = np.nan
+    return {"": result}, atr[-1]
+
+
+_INDICATORS = {
+    "sma": _sma,
+    "ema": _ema,
+    "rsi": _rsi,
+    "macd": _macd,
+    "bb": _bollinger,
+    "atr": _atr,
+}
+
+
+class IndicatorCache:
+    """Bounded LRU of computed indicators keyed by (company_id, name).
+
+    Each entry remembers how many bars it covered, the last bar's date and
+    a digest of the inputs up to that bar. If the current series still
+    starts with exactly those bars, only the new tail is computed; an edit
+    to an older bar (from any worker) changes the digest and forces a full
+    recompute.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+cache = IndicatorCache()
+
+
+def _digest(bars: np.ndarray, length: int) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for row in (pricestore.DATE, pricestore.HIGH, pricestore.LOW, pricestore.CLOSE):
+        h.update(np.ascontiguousarray(bars[row, :length]))
+    return h.digest()
+
+
+def compute(company_id: int, bars: np.ndarray, name: str, kind: str, period: int) -> dict:
+    n = bars.shape[1]
+    if n == 0:
+        return {}
+    series = {
+        "close": np.asarray(bars[pricestore.CLOSE]),
+        "high": np.asarray(bars[pricestore.HIGH]),
+        "low": np.asarray(bars[pricestore.LOW]),
+    }
+    dates = bars[pricestore.DATE]
+
+    key = (company_id, name)
+    entry = cache.get(key)
+    start, state, previous = 0, None, None
+    if entry is not None:
+        length, last_date, digest, values, saved_state = entry
+        if length <= n and dates[length - 1] == last_date and _digest(bars, length) == digest:
+            if length == n:
+                return values
+            start, state, previous = length, saved_state, values
+
+    tail, state = _INDICATORS[kind](series, period, start, state)
+    values = {}
+    for suffix, column in tail.items():
+        if previous is not None:
+            column = np.concatenate((previous[name + suffix], column))
+        values[name + suffix] = column
+
+    cache.put(key, (n, dates[-1], _digest(bars, n), values, state))
+    return values
+
+
+def to_json(values: np.ndarray) -> list:
+    return [None if v != v else round(v, 6) for v in values.tolist()]
@@ -0,0 +1,457 @@
+"""Persistent background jobs worked by a local process pool.
+
+Jobs are rows in the `jobs` table, so they survive restarts and need
+nothing but the database. A worker claims the oldest runnable job with a
+conditional UPDATE (queued -> running), so any number of workers in any
+number of API processes can share the queue without running a job twice.
+
+While a job runs, a heartbeat thread in its worker flushes progress,
+refreshes heartbeat_at every HEARTBEAT_SECONDS and picks up cancellation
+requests. Handlers report progress with JobContext.progress(), which
+raises JobCancelled once a cancel was requested; a handler that has not
+stopped CANCEL_GRACE_SECONDS after the request gets its worker process
+killed and replaced. A failed attempt is retried after
+RETRY_DELAY_SECONDS * 2**(attempt - 1) until max_attempts is used up.
+
+Running jobs whose heartbeat is older than STALE_SECONDS belong to a
+worker that died (crash, kill -9, a restart that outlived the shutdown
+grace period) and are queued again by the pool supervisor, which also
+replaces dead worker processes.
+
+Jobs are worked by a pool run as its own process, next to the API or on
+another host:
+
+    python jobs.py --workers 4
+
+The API only queues jobs. JOB_WORKERS > 0 also starts a pool of that size
+in the API's lifespan, for single-process setups; every API worker process
+starts its own, so the total is JOB_WORKERS times the number of API workers.
+"""
+import argparse
+import atexit
+import inspect
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Job
+import backtest
+import fundamentals
+import predict
+import retention
+import rollups
+import seed
+
+logger = logging.getLogger(__name__)
+
+# Pool started inside each API worker process; off unless set
+WORKERS = int(os.environ.get("JOB_WORKERS", "0"))
+# Pool size of `python jobs.py` without --workers
+DEFAULT_POOL_WORKERS = 2
+POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "1"))
+HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "5"))
+STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "30"))
+CANCEL_GRACE_SECONDS = float(os.environ.get("JOB_CANCEL_GRACE_SECONDS", "30"))
+SHUTDOWN_SECONDS = float(os.environ.get("JOB_SHUTDOWN_SECONDS", "10"))
+RETRY_DELAY_SECONDS = float(os.environ.get("JOB_RETRY_DELAY_SECONDS", "10"))
+# Progress is written at most this often; heartbeats go out with it
+PROGRESS_SECONDS = 0.5
+CLAIM_CANDIDATES = 5
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.cancelled = threading.Event()
+        self.cancel_requested = False  # False when cancelled by a pool shutdown
+        self.state = (0.0, None)
+
+    def progress(self, fraction: float, message: str = None):
+        """Record progress (0..1); raises JobCancelled if the job should stop."""
+        self.state = (min(max(float(fraction), 0.0), 1.0), message)
+        self.check()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+
+# Handlers take the context plus the job's params as keyword arguments and
+# return something JSON serializable, stored as the job's result
+def _seed_sectors(ctx: JobContext) -> dict:
+    db = SessionLocal()
+    try:
+        created, removed = seed.seed_sectors(db, progress=ctx.progress)
+        db.commit()
+    finally:
+        db.close()
+    return {"created": created, "duplicates_removed": removed}
+
+
+def _rebuild_rollups(ctx: JobContext) -> dict:
+    db = SessionLocal()
+    try:
+        sectors = rollups.rebuild(db, progress=ctx.progress)
+        db.commit()
+    finally:
+        db.close()
+    return {"sectors": sectors}
+
+
+def _predictions(ctx: JobContext, full: bool = False, sector_id: int = None, workers: int = None,
+                 chunk_size: int = predict.DEFAULT_CHUNK_SIZE) -> dict:
+    return predict.run_predictions(full, sector_id, workers, chunk_size, progress=ctx.progress)
+
+
+def _backtest(ctx: JobContext, sector_id: int = None, workers: int = None) -> dict:
+    # Per-company scores are left out; GET /backtest/ serves those
+    result = backtest.run_backtest(sector_id=sector_id, workers=workers, progress=ctx.progress)
+    return {k: result[k] for k in ("workers", "elapsed_seconds", "sectors")}
+
+
+def _fundamentals(ctx: JobContext, path: str, dry_run: bool = False) -> dict:
+    # `path` is read on the worker's host; API caches pick the change up when their TTL expires
+    rows, parse_errors = fundamentals.read_snapshot(path)
+    ctx.progress(0.1, f"{len(rows)} rows parsed")
+    db = SessionLocal()
+    try:
+        result, _ = fundamentals.apply_snapshot(db, rows, dry_run=dry_run)
+        db.commit()
+    finally:
+        db.close()
+    result.rejected += len(parse_errors)
+    result.errors = parse_errors + result.errors
+    return result.model_dump()
+
+
+def _retention(ctx: JobContext, weekly_after_days: int = retention.WEEKLY_AFTER_DAYS,
+               monthly_after_days: int = retention.MONTHLY_AFTER_DAYS, dry_run: bool = False) -> dict:
+    return retention.run_retention(weekly_after_days, monthly_after_days, dry_run, progress=ctx.progress)
+
+
+HANDLERS = {
+    "seed_sectors": _seed_sectors,
+    "rebuild_rollups": _rebuild_rollups,
+    "predictions": _predictions,
+    "backtest": _backtest,
+    "fundamentals": _fundamentals,
+    "retention": _retention,
+}
+
+
+def check_params(kind: str, params: dict):
+    """Raise ValueError unless `params` fit the handler for `kind`."""
+    handler = HANDLERS.get(kind)
+    if handler is None:
+        raise ValueError(f"Unknown job kind {kind!r}, expected one of: {', '.join(HANDLERS)}")
+    try:
+        inspect.signature(handler).bind(None, **params)
+    except TypeError as e:
+        raise ValueError(f"Invalid params for {kind}: {e}")
+
+
+def submit(db: Session, kind: str, params: dict = None, max_attempts: int = 3, created_by: int = None) -> Job:
+    params = params or {}
+    check_params(kind, params)
+    job = Job(kind=kind, params=params, max_attempts=max_attempts, created_by=created_by)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    job_pool.notify()
+    return job
+
+
+def cancel(db: Session, job_id: int):
+    """Cancel a queued job now, or ask the worker running it to stop."""
+    now = datetime.utcnow()
+    db.execute(
+        update(Job).where(Job.id == job_id, Job.status == "queued")
+        .values(status="cancelled", cancel_requested=True, finished_at=now)
+    )
+    db.execute(update(Job).where(Job.id == job_id, Job.status == "running").values(cancel_requested=True))
+    db.commit()
+    return db.get(Job, job_id)
+
+
+def retry(db: Session, job_id: int) -> bool:
+    """Queue a failed or cancelled job again with a fresh set of attempts."""
+    retried = db.execute(
+        update(Job).where(Job.id == job_id, Job.status.in_(("failed", "cancelled")))
+        .values(status="queued", attempts=0, cancel_requested=False, progress=0.0, message=None,
+                result=None, error=None, worker=None, run_after=datetime.utcnow(),
+                started_at=None, finished_at=None)
+    ).rowcount
+    db.commit()
+    if retried:
+        job_pool.notify()
+    return bool(retried)
+
+
+def recover_stale() -> int:
+    """Requeue (or fail, or finish cancelling) running jobs whose worker stopped heartbeating."""
+    now = datetime.utcnow()
+    new_status = case(
+        (Job.cancel_requested, "cancelled"),
+        (Job.attempts < Job.max_attempts, "queued"),
+        else_="failed",
+    )
+    db = SessionLocal()
+    try:
+        recovered = db.execute(
+            update(Job)
+            .where(Job.status == "running", Job.heartbeat_at < now - timedelta(seconds=STALE_SECONDS))
+            .values(
+                status=new_status,
+                error="Worker " + Job.worker + " stopped responding",
+                worker=None,
+                run_after=now,
+                finished_at=case((new_status == "queued", None), else_=now),
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+    finally:
+        db.close()
+    if recovered:
+        logger.warning("recovered %d jobs from unresponsive workers", recovered)
+    return recovered
+
+
+def _claim(worker: str):
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        candidates = db.execute(
+            select(Job.id).where(Job.status == "queued", Job.run_after <= now).order_by(Job.id).limit(CLAIM_CANDIDATES)
+        ).scalars().all()
+        for job_id in candidates:
+            # Another worker may take the job between the select and the update
+            claimed = db.execute(
+                update(Job).where(Job.id == job_id, Job.status == "queued")
+                .values(status="running", worker=worker, attempts=Job.attempts + 1,
+                        started_at=now, heartbeat_at=now, progress=0.0, message=None)
+            ).rowcount
+            db.commit()
+            if claimed:
+                return db.execute(
+                    select(Job.id, Job.kind, Job.params, Job.attempts, Job.max_attempts).where(Job.id == job_id)
+                ).one()
+        return None
+    finally:
+        db.close()
+
+
+def _heartbeat(ctx: JobContext, worker: str, done: threading.Event, stopping):
+    cancel_seen = None
+    written = None
+    last_beat = time.monotonic()
+    while not done.wait(PROGRESS_SECONDS):
+        now = time.monotonic()
+        if stopping.is_set():
+            ctx.cancelled.set()
+        if ctx.state == written and now - last_beat < HEARTBEAT_SECONDS and cancel_seen is None:
+            continue
+        fraction, message = written = ctx.state
+        last_beat = now
+        db = SessionLocal()
+        try:
+            owned = db.execute(
+                update(Job).where(Job.id == ctx.job_id, Job.worker == worker, Job.status == "running")
+                .values(heartbeat_at=datetime.utcnow(), progress=fraction, message=message)
+            ).rowcount
+            cancel = db.execute(select(Job.cancel_requested).where(Job.id == ctx.job_id)).scalar()
+            db.commit()
+        except Exception as e:
+            # Usually a long write elsewhere holding the SQLite lock; retried on the next tick
+            logger.warning("job %d: heartbeat failed: %s", ctx.job_id, e.__class__.__name__)
+            continue
+        finally:
+            db.close()
+
+        if not owned:
+            # Recovered as stale by the supervisor; whoever claims it next runs it
+            ctx.cancelled.set()
+            return
+        if cancel and cancel_seen is None:
+            cancel_seen = now
+            ctx.cancel_requested = True
+            ctx.cancelled.set()
+        if cancel_seen is not None and now - cancel_seen > CANCEL_GRACE_SECONDS:
+            logger.warning("job %d ignored cancellation for %.0f s, stopping its worker", ctx.job_id, CANCEL_GRACE_SECONDS)
+            _finish(ctx.job_id, worker, {"status": "cancelled", "finished_at": datetime.utcnow()})
+            os._exit(1)
+
+
+def _finish(job_id: int, worker: str, values: dict):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Job).where(Job.id == job_id, Job.worker == worker, Job.status == "running").values(**values)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_job(job, worker: str, stopping):
+    ctx = JobContext(job.id)
+    done = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(ctx, worker, done, stopping), name="job-heartbeat", daemon=True)
+    beat.start()
+    started = time.perf_counter()
+    now = None
+    try:
+        result = HANDLERS[job.kind](ctx, **(job.params or {}))
+        now = datetime.utcnow()
+        values = {"status": "succeeded", "result": jsonable_encoder(result), "progress": 1.0, "finished_at": now}
+    except JobCancelled:
+        now = datetime.utcnow()
+        if ctx.cancel_requested:
+            values = {"status": "cancelled", "finished_at": now}
+        else:
+            # Interrupted by a pool shutdown: give the attempt back and run it again later
+            values = {"status": "queued", "worker": None, "attempts": job.attempts - 1, "run_after": now}
+    except Exception:
+        logger.exception("job %d (%s) failed", job.id, job.kind)
+        now = datetime.utcnow()
+        values = {"error": traceback.format_exc(limit=20)}
+        if ctx.cancel_requested:
+            values.update(status="cancelled", finished_at=now)
+        elif job.attempts < job.max_attempts and job.kind in HANDLERS:
+            delay = RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+            values.update(status="queued", worker=None, run_after=now + timedelta(seconds=delay))
+        else:
+            values.update(status="failed", finished_at=now)
+    finally:
+        done.set()
+        beat.join()
+    _finish(job.id, worker, values)
+    logger.info("job %d (%s) %s after %.1f s", job.id, job.kind, values["status"], time.perf_counter() - started)
+
+
+def _worker_main(stopping, wake):
+    # Ctrl-C reaches the whole process group; only the parent decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s job-worker %(process)d %(message)s")
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    parent = os.getppid()
+    while not stopping.is_set() and os.getppid() == parent:
+        try:
+            job = _claim(worker)
+        except Exception:
+            logger.exception("claiming a job failed")
+            job = None
+        if job is None:
+            wake.wait(POLL_SECONDS)
+            wake.clear()
+            continue
+        run_job(job, worker, stopping)
+
+
+class JobPool:
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._stopping = None
+        self._wake = None
+        self._supervisor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not self.workers or self._supervisor is not None:
+                return
+            self._stopping = self._context.Event()
+            self._wake = self._context.Event()
+            # Worker processes are not daemonic so jobs can start process pools of their own
+            self._processes = [self._spawn() for _ in range(self.workers)]
+            self._supervisor = threading.Thread(target=self._supervise, name="job-supervisor", daemon=True)
+            self._supervisor.start()
+        # Non-daemonic children are joined at interpreter exit, so an exit
+        # that skipped the lifespan shutdown would otherwise wait forever
+        atexit.register(self.shutdown)
+
+    def _spawn(self):
+        process = self._context.Process(target=_worker_main, args=(self._stopping, self._wake), name="job-worker")
+        process.start()
+        return process
+
+    def _supervise(self):
+        interval = min(STALE_SECONDS / 2, 5.0)
+        while True:
+            try:
+                recover_stale()
+            except Exception:
+                logger.exception("recovering stale jobs failed")
+            if self._stopping.wait(interval):
+                return
+            with self._lock:
+                for i, process in enumerate(self._processes):
+                    if not process.is_alive() and not self._stopping.is_set():
+                        logger.warning("job worker %d exited with code %s, starting a new one", process.pid, process.exitcode)
+                        self._processes[i] = self._spawn()
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def shutdown(self, timeout: float = SHUTDOWN_SECONDS):
+        """Ask workers to stop; running jobs get `timeout` seconds to reach a progress() call."""
+        with self._lock:
+            if self._supervisor is None:
+                return
+            self._stopping.set()
+            self._wake.set()
+            processes, self._processes, self._supervisor = self._processes, [], None
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+        for process in processes:
+            if process.is_alive():
+                # Its job goes back on the queue once the heartbeat is stale
+                process.terminate()
+                process.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "alive": sum(p.is_alive() for p in self._processes)}
+
+
+job_pool = JobPool()
+
+
+if __name__ == "__main__":
+    from database import engine
+    import migrations
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WORKERS or DEFAULT_POOL_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    migrations.upgrade(engine)
+    pool = JobPool(args.workers)
+    pool.start()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    logger.info("job pool running with %d workers", args.workers)
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    pool.shutdown()
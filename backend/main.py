@@ -1,60 +1,88 @@
+import time
+
+STARTED = time.perf_counter()
+
+import logging
+import os
+from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi import FastAPI
 from routers.sectors import router as sectors_router
 from routers.companies import router as companies_router  
 from routers.analyses import router as analyses_router
 from routers.users import router as users_router
-from routers.auth import router as auth_router, get_password_hash
-from models import Base, Company, Sector, User
-from database import SessionLocal
-from database import engine
-
-
-
-def make_user_admin():
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.username == "kri").first()
-        if user:
-            user.role = "admin"
-            db.commit()
-            print(f"✅ Made {user.username} an admin!")
-        else:
-            # Create admin user if doesn't exist
-            admin_user = User(
-                username="kri",
-                email="kri@yahjo.com", 
-                hashed_password=get_password_hash("kri"),
-                role="admin"
-            )
-            db.add(admin_user)
-            db.commit()
-            print("✅ Created Kristupas as admin!")
-    finally:
-        db.close()
-
-
-
-
-def create_test_data():
-    db = SessionLocal()
-    
-    # Add sectors
-    tech = Sector(name="Technology", description="Tech companies")
-    healthcare = Sector(name="Healthcare", description="Medical companies")
-    db.add_all([tech, healthcare])
-    db.commit()
-    
-    print("✅ Test data added!")
-
-
-Base.metadata.create_all(bind=engine)
-create_test_data()
-make_user_admin()  
-
-app = FastAPI()
+from routers.auth import router as auth_router
+from routers.backtest import router as backtest_router
+from routers.signals import router as signals_router
+from routers.predictions import router as predictions_router
+from routers.jobs import router as jobs_router
+from routers.feed import router as feed_router
+from routers.access import router as access_router
+from routers.metrics import router as metrics_router
+from feed import feed_hub
+from hashing import hashing_pool
+from jobs import job_pool
+import backtest
+import metrics
+import migrations
+from database import engine, read_engine
+
+logger = logging.getLogger(__name__)
+
+# Apply pending migrations at startup; set to 0 when `python migrations.py`
+# runs as a deploy step so workers only check the version
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "1") != "0"
+
+
+def check_schema():
+    if MIGRATE_ON_STARTUP:
+        migrations.upgrade(engine)
+        return
+    version = migrations.current_version(engine)
+    if version < migrations.LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {migrations.LATEST_VERSION}; run `python migrations.py`"
+        )
+
+
+# Sync routes and dependencies run in AnyIO's worker threads
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", "40"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    imported = time.perf_counter()
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await to_thread.run_sync(check_schema)
+    hashing_pool.start()
+    job_pool.start()
+    feed_hub.start()
+    ready = time.perf_counter()
+    logger.info("startup: %.0f ms (imports %.0f ms, schema check %.0f ms)",
+                (ready - STARTED) * 1000, (imported - STARTED) * 1000, (ready - imported) * 1000)
+    yield
+    feed_hub.close()
+    hashing_pool.shutdown()
+    backtest.shutdown()
+    # Waits up to JOB_SHUTDOWN_SECONDS for running jobs to hand their work back
+    await to_thread.run_sync(job_pool.shutdown)
+
+
+app = FastAPI(lifespan=lifespan)
+if metrics.ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(read_engine)
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(users_router, prefix="/api/v1", tags=["users"])
+app.include_router(access_router, prefix="/api/v1", tags=["access"])
 app.include_router(sectors_router, prefix="/sectors", tags=["sectors"])
 app.include_router(companies_router, prefix="/companies", tags=["companies"])
-app.include_router(analyses_router, prefix="/analyses", tags=["analyses"])
\ No newline at end of file
+app.include_router(analyses_router, prefix="/analyses", tags=["analyses"])
+app.include_router(backtest_router, prefix="/backtest", tags=["backtest"])
+app.include_router(signals_router, prefix="/signals", tags=["signals"])
+app.include_router(predictions_router, prefix="/predictions", tags=["predictions"])
+app.include_router(jobs_router, prefix="/jobs", tags=["jobs"])
+app.include_router(feed_router, prefix="/feed", tags=["feed"])
+app.include_router(metrics_router, tags=["metrics"])
\ No newline at end of file
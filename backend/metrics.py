@@ -0,0 +1,222 @@
+"""Per-route request metrics in Prometheus text format.
+
+MetricsMiddleware is a plain ASGI middleware: it times every request,
+counts the response body bytes and, once routing has resolved the route
+template, records them under that template. SQL statements are
+attributed to the request through a context variable, which the
+threadpool copies into the worker running a sync route, so the engine
+hooks add to the right request without any locking. Statements outside
+a request (the write queue thread, startup) are counted separately.
+
+Route metrics are written and read under the registry lock, since
+/metrics may be served while another request is being recorded.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "size", "statements", "db_time", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.statuses = {}
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+class Registry:
+    def __init__(self):
+        self.routes = {}
+        self.in_flight = 0
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+        self.unattributed_statements = 0
+        self.unattributed_db_time = 0.0
+
+    def record(self, method: str, route: str, status: int, elapsed: float, size: int, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            metrics = self.routes.get(key)
+            if metrics is None:
+                metrics = self.routes[key] = RouteMetrics()
+            metrics.latency.observe(elapsed)
+            metrics.size.observe(size)
+            metrics.statements.observe(stats.statements)
+            metrics.db_time.observe(stats.db_time)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def record_statement(self, elapsed: float, statement: str):
+        stats = _current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+        else:
+            with self._lock:
+                self.unattributed_statements += 1
+                self.unattributed_db_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            with self._lock:
+                self.slow_queries += 1
+            logger.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+    def render(self, extra: dict = None) -> str:
+        lines = [
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# TYPE db_slow_queries_total counter",
+            f"db_slow_queries_total {self.slow_queries}",
+            "# TYPE db_unattributed_statements_total counter",
+            f"db_unattributed_statements_total {self.unattributed_statements}",
+            "# TYPE db_unattributed_seconds_total counter",
+            f"db_unattributed_seconds_total {self.unattributed_db_time}",
+        ]
+        sections = {
+            "http_requests_total": ("counter", []),
+            "http_request_duration_seconds": ("histogram", []),
+            "http_response_size_bytes": ("histogram", []),
+            "http_request_db_statements": ("histogram", []),
+            "http_request_db_seconds": ("histogram", []),
+        }
+        with self._lock:
+            for (method, route), metrics in sorted(self.routes.items()):
+                labels = f'method="{method}",route="{route}"'
+                for status, count in sorted(metrics.statuses.items()):
+                    sections["http_requests_total"][1].append(f'http_requests_total{{{labels},status="{status}"}} {count}')
+                sections["http_request_duration_seconds"][1].extend(metrics.latency.render("http_request_duration_seconds", labels))
+                sections["http_response_size_bytes"][1].extend(metrics.size.render("http_response_size_bytes", labels))
+                sections["http_request_db_statements"][1].extend(metrics.statements.render("http_request_db_statements", labels))
+                sections["http_request_db_seconds"][1].extend(metrics.db_time.render("http_request_db_seconds", labels))
+        for name, (kind, samples) in sections.items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        # Gauges from other components, e.g. {"hashing_pool": {"queue_depth": 3}}
+        for prefix, values in (extra or {}).items():
+            for name, value in values.items():
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.in_flight -= 1
+            _current.reset(token)
+            registry.record(scope["method"], _route_template(scope), status, time.perf_counter() - started, size, stats)
+
+
+def _route_template(scope) -> str:
+    # Routes of included routers may only know their path relative to the
+    # router prefix; recover the prefix from the part of the URL in front of it
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return "unmatched"
+    try:
+        concrete = path_format.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return path_format
+    path = scope["path"]
+    prefix = path[:-len(concrete)] if concrete and path.endswith(concrete) else ""
+    return prefix + path_format
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    registry.record_statement(time.perf_counter() - started, statement)
+
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,164 @@
+"""Versioned schema migrations.
+
+schema_version records every migration that has been applied. At startup
+the app only reads the highest version (one indexed query) and runs the
+migrations above it; databases that are current pay nothing more. Add a
+schema change by appending a (version, description, function) entry to
+MIGRATIONS; the function receives a Connection inside the migration's
+transaction.
+
+Run from the backend directory to migrate before starting the workers:
+
+    python migrations.py
+"""
+import logging
+import time
+from sqlalchemy import delete, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from models import (
+    Analysis, AnalysisMonthly, AnalysisWeekly, Base, Company, Job, PredictionState, SchemaVersion, Sector, SectorStats,
+    UserCompanyAccess,
+)
+import pricestore
+import rollups
+
+logger = logging.getLogger(__name__)
+
+
+# Unique indexes existing rows may violate; each is created by its own
+# migration once duplicates were reported or removed, never by the baseline
+OWNED_INDEXES = {"ux_companies_symbol", "ux_user_company_access", "ux_analyses_company_date"}
+
+
+def _baseline(conn: Connection):
+    # Databases from before schema_version may lack tables, columns and
+    # indexes added since they were created; bring them up to the models
+    Base.metadata.create_all(bind=conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        _add_missing_columns(conn, inspector, table)
+        for index in table.indexes:
+            if index.name not in OWNED_INDEXES:
+                index.create(bind=conn, checkfirst=True)
+    rollups.ensure_built(Session(bind=conn))
+
+
+def _index(model, name: str):
+    return next(i for i in model.__table__.indexes if i.name == name)
+
+
+def _add_missing_columns(conn: Connection, inspector, table):
+    existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing_columns:
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            conn.execute(text(ddl))
+
+
+def _unique_symbols(conn: Connection):
+    duplicates = conn.execute(
+        select(Company.symbol).group_by(Company.symbol).having(func.count() > 1).limit(20)
+    ).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Cannot add the unique symbol index, duplicated symbols: {', '.join(duplicates)}")
+    _index(Company, "ux_companies_symbol").create(bind=conn, checkfirst=True)
+
+
+def _prediction_state(conn: Connection):
+    PredictionState.__table__.create(bind=conn, checkfirst=True)
+
+
+def _jobs(conn: Connection):
+    Job.__table__.create(bind=conn, checkfirst=True)
+
+
+def _retention_tiers(conn: Connection):
+    AnalysisWeekly.__table__.create(bind=conn, checkfirst=True)
+    AnalysisMonthly.__table__.create(bind=conn, checkfirst=True)
+
+
+def _unique_grants(conn: Connection):
+    # Repeated grants of the same company are redundant; keep the oldest
+    keep = select(func.min(UserCompanyAccess.id)).group_by(UserCompanyAccess.user_id, UserCompanyAccess.company_id)
+    conn.execute(delete(UserCompanyAccess).where(UserCompanyAccess.id.not_in(keep.scalar_subquery())))
+    _index(UserCompanyAccess, "ux_user_company_access").create(bind=conn, checkfirst=True)
+
+
+def _sector_stats_deltas(conn: Connection):
+    # Sums, counts and per-signal columns that writes adjust by deltas; the
+    # signal_counts JSON they replace is dropped and every row rebuilt
+    inspector = inspect(conn)
+    _add_missing_columns(conn, inspector, SectorStats.__table__)
+    if "signal_counts" in {c["name"] for c in inspector.get_columns("sector_stats")}:
+        conn.execute(text("ALTER TABLE sector_stats DROP COLUMN signal_counts"))
+    db = Session(bind=conn)
+    rollups.refresh_sectors(db, db.execute(select(Sector.id)).scalars().all())
+    db.flush()
+
+
+def _unique_bars(conn: Connection):
+    # Repeated (company_id, date) bars predate the unique index; keep the newest
+    keep = select(func.max(Analysis.id)).group_by(Analysis.company_id, Analysis.date)
+    company_ids = conn.execute(
+        select(Analysis.company_id).where(Analysis.id.not_in(keep.scalar_subquery())).distinct()
+    ).scalars().all()
+    if company_ids:
+        conn.execute(delete(Analysis).where(Analysis.id.not_in(keep.scalar_subquery())))
+        # The snapshot may point at a removed bar
+        db = Session(bind=conn)
+        rollups.refresh_latest(db, company_ids)
+        db.flush()
+        pricestore.invalidate(*company_ids)
+    _index(Analysis, "ux_analyses_company_date").create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "baseline: create missing tables, columns and indexes; fill rollups", _baseline),
+    (2, "unique index on companies.symbol", _unique_symbols),
+    (3, "prediction_state table", _prediction_state),
+    (4, "jobs table", _jobs),
+    (5, "weekly and monthly retention tiers for analyses", _retention_tiers),
+    (6, "unique index on user_company_access (user_id, company_id)", _unique_grants),
+    (7, "incremental sector_stats: sum, count and signal count columns", _sector_stats_deltas),
+    (8, "unique index on analyses (company_id, date), keeping the newest duplicate bar", _unique_bars),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(engine: Engine) -> int:
+    SchemaVersion.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def upgrade(engine: Engine) -> list[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    applied = []
+    version = current_version(engine)
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            # Another process may have applied it since we looked
+            if conn.execute(select(SchemaVersion.version).where(SchemaVersion.version == number)).first():
+                continue
+            migrate(conn)
+            conn.execute(SchemaVersion.__table__.insert().values(version=number, description=description))
+        logger.info("applied migration %d (%s) in %.0f ms", number, description, (time.perf_counter() - started) * 1000)
+        applied.append(number)
+    return applied
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    before = current_version(engine)
+    applied = upgrade(engine)
+    print(f"Schema at version {LATEST_VERSION} (was {before}, applied {len(applied)} migrations)")
@@ -1,4 +1,4 @@
-from sqlalchemy import DECIMAL, Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, Table, DATE, Enum, BIGINT, DATETIME
+from sqlalchemy import DECIMAL, JSON, Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, Table, DATE, Enum, BIGINT, DATETIME, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -13,11 +13,17 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     role = Column(Enum('guest', 'member', 'admin', name='user_roles'), default='guest') 
+    # Bumped on password/role changes; tokens carrying an older value are rejected
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class UserCompanyAccess(Base):
     __tablename__ = 'user_company_access'
+    __table_args__ = (
+        # Serves the ACL filters in access.company_filter() and keeps grants unique
+        Index('ux_user_company_access', 'user_id', 'company_id', unique=True),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'))  # ADDED: Link to User
     company_id = Column(Integer, ForeignKey('companies.id'))  # ADDED: Link to Company
@@ -36,6 +42,9 @@ class Sector(Base):
 
 class Company(Base):
     __tablename__ = 'companies'
+    __table_args__ = (
+        Index('ux_companies_symbol', 'symbol', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     sector_id = Column(Integer, ForeignKey('sectors.id'))
@@ -53,10 +62,14 @@ class Company(Base):
     last_updated = Column(DATETIME, default=datetime.now)         # 2024-01-15 09:30:00
 
     sector = relationship("Sector", back_populates="companies")  # ADDED
-    analyses = relationship("Analysis", back_populates="company")  # ADDED
+    analyses = relationship("Analysis", back_populates="company", order_by="Analysis.date")  # ADDED
 
 class Analysis(Base):
     __tablename__ = 'analyses'
+    __table_args__ = (
+        # One bar per company and timestamp; also serves all per-company time range scans
+        Index('ux_analyses_company_date', 'company_id', 'date', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     company_id = Column(Integer, ForeignKey('companies.id'))  # LINK TO COMPANY
@@ -80,3 +93,134 @@ class Analysis(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     company = relationship("Company", back_populates="analyses")
+
+
+class LatestAnalysis(Base):
+    # Newest Analysis per company, kept in step by the analyses write paths (see rollups.py)
+    __tablename__ = 'latest_analysis'
+
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), primary_key=True)
+    analysis_id = Column(Integer)
+    date = Column(DateTime, nullable=False)
+    signal = Column(Enum('BUY', 'SELL', 'HOLD', 'STRONG_BUY', 'STRONG_SELL'), index=True)
+    confidence_score = Column(DECIMAL(3, 2))
+    close_price = Column(DECIMAL(10, 2))
+    predicted_close = Column(DECIMAL(10, 2))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SectorStats(Base):
+    # Per-sector rollup; company and latest-signal changes are applied as deltas (see rollups.py)
+    __tablename__ = 'sector_stats'
+
+    sector_id = Column(Integer, ForeignKey('sectors.id', ondelete='CASCADE'), primary_key=True)
+    company_count = Column(Integer, nullable=False, default=0)
+    total_market_cap = Column(Float)
+    market_cap_count = Column(Integer, nullable=False, default=0, server_default='0')
+    avg_market_cap = Column(Float)
+    median_pe_ratio = Column(Float)
+    profit_margin_sum = Column(Float)
+    profit_margin_count = Column(Integer, nullable=False, default=0, server_default='0')
+    avg_profit_margin = Column(Float)
+    dividend_yield_sum = Column(Float)
+    dividend_yield_count = Column(Integer, nullable=False, default=0, server_default='0')
+    avg_dividend_yield = Column(Float)
+    # Latest signal per company
+    buy_count = Column(Integer, nullable=False, default=0, server_default='0')
+    sell_count = Column(Integer, nullable=False, default=0, server_default='0')
+    hold_count = Column(Integer, nullable=False, default=0, server_default='0')
+    strong_buy_count = Column(Integer, nullable=False, default=0, server_default='0')
+    strong_sell_count = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def signal_counts(self) -> dict:
+        return {signal: getattr(self, f"{signal.lower()}_count") or 0
+                for signal in ('BUY', 'SELL', 'HOLD', 'STRONG_BUY', 'STRONG_SELL')}
+
+
+class SchemaVersion(Base):
+    # One row per applied migration (see migrations.py)
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String(255))
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PredictionState(Base):
+    # Last bar each company's predictions were fitted through (see predict.py)
+    __tablename__ = 'prediction_state'
+
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), primary_key=True)
+    last_date = Column(DateTime)
+    bars = Column(Integer, nullable=False, default=0)
+    residual_std = Column(Float)
+    fitted_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Job(Base):
+    # Background job queue worked by the process pool in jobs.py
+    __tablename__ = 'jobs'
+    __table_args__ = (Index('ix_jobs_status_run_after', 'status', 'run_after'),)
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    params = Column(JSON)
+    status = Column(Enum('queued', 'running', 'succeeded', 'failed', 'cancelled', name='job_status'),
+                    nullable=False, default='queued')
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(String(255))
+    result = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)  # not claimed before; retry backoff
+    worker = Column(String(100))                                          # host:pid of the claiming worker
+    heartbeat_at = Column(DateTime)
+    created_by = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class RolledBarsMixin:
+    # Aggregate of the analyses bars of one period, written by retention.py once the
+    # raw bars age out. Counts and sums are kept so periods can be merged further.
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), primary_key=True)
+    period_start = Column(DateTime, primary_key=True)
+    first_date = Column(DateTime, nullable=False)
+    last_date = Column(DateTime, nullable=False)
+    bars = Column(Integer, nullable=False)
+
+    open_price = Column(DECIMAL(10, 2))
+    high_price = Column(DECIMAL(10, 2))
+    low_price = Column(DECIMAL(10, 2))
+    close_price = Column(DECIMAL(10, 2))
+    volume = Column(BIGINT)
+
+    # Predictions made on the period's last bar, i.e. for the bar that follows it
+    predicted_open = Column(DECIMAL(10, 2))
+    predicted_high = Column(DECIMAL(10, 2))
+    predicted_low = Column(DECIMAL(10, 2))
+    predicted_close = Column(DECIMAL(10, 2))
+    signal = Column(Enum('BUY', 'SELL', 'HOLD', 'STRONG_BUY', 'STRONG_SELL'))
+
+    signal_counts = Column(JSON)                          # {"BUY": 3, ...} over the period's bars
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    confidence_count = Column(Integer, nullable=False, default=0)
+    trades = Column(Integer, nullable=False, default=0)   # bars with a BUY/SELL-side signal
+    hits = Column(Integer, nullable=False, default=0)     # ... followed by a move in that direction
+    prediction_count = Column(Integer, nullable=False, default=0)
+    prediction_abs_error = Column(Float, nullable=False, default=0.0)  # sum |predicted_close - next close|
+    prediction_sq_error = Column(Float, nullable=False, default=0.0)
+
+
+class AnalysisWeekly(RolledBarsMixin, Base):
+    # Weeks split at month boundaries, so they roll up into whole months
+    __tablename__ = 'analyses_weekly'
+
+
+class AnalysisMonthly(RolledBarsMixin, Base):
+    __tablename__ = 'analyses_monthly'
@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, get_args
+import orjson
+from fastapi import HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import DateTime, Float, Numeric, and_, cast, func, or_
+from sqlalchemy.orm import Session
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Shared query parameters for every paginated list endpoint
+def page_params(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated list of fields to return"),
+):
+    return {"cursor": cursor, "limit": limit, "fields": fields}
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(jsonable_encoder(values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_columns: list) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(key_columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(key_columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str], schema) -> Optional[list[str]]:
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+
+def _is_float(annotation) -> bool:
+    return annotation is float or float in get_args(annotation)
+
+
+@lru_cache(maxsize=None)
+def _columns(model, schema) -> dict:
+    # Plain columns for every schema field. DECIMAL (and other non-float)
+    # columns the schema declares as float are cast by the database, so the
+    # driver hands back floats instead of one Decimal object per value.
+    # DECIMALs are rounded to their scale first, as the ORM's Decimal
+    # conversion does, since SQLite keeps whatever float was written
+    columns = {}
+    for name, field in schema.model_fields.items():
+        column = getattr(model, name)
+        if not isinstance(column.type, Float) and (isinstance(column.type, Numeric) or _is_float(field.annotation)):
+            if isinstance(column.type, Numeric) and column.type.scale is not None:
+                column = func.round(column, column.type.scale)
+            column = cast(column, Float).label(name)
+        columns[name] = column
+    return columns
+
+
+def _after(key_columns: list, values: list):
+    # Row-value comparison (a, b) > (x, y) spelled out so every backend can use the index
+    clauses = []
+    for i, column in enumerate(key_columns):
+        equal = [key_columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+
+def fetch_page(
+    db: Session,
+    model,
+    schema,
+    page: dict,
+    filters: tuple = (),
+    key: tuple = ("id",),
+) -> Response:
+    """Return one keyset page of `model` rows ordered by `key` as a JSON Response.
+
+    Only the columns of `schema` (or of `fields`, when requested) are
+    selected, as plain tuples, and encoded with orjson straight into the
+    body; no ORM objects or response model validation per row. The body
+    matches what `schema` would serialize to, so routes keep it as their
+    response_model for the OpenAPI schema. The cursor for the next page is
+    sent in the X-Next-Cursor header.
+    """
+    key_columns = [getattr(model, k) for k in key]
+    columns = _columns(model, schema)
+    fields = parse_fields(page["fields"], schema) or list(columns)
+
+    # Output fields first so each row zips straight into a dict; key columns
+    # not asked for ride along at the end for the cursor
+    extra = [k for k in key if k not in fields]
+    query = db.query(*[columns[name] for name in fields], *[getattr(model, k) for k in extra])
+    query = query.filter(*filters)
+    if page["cursor"]:
+        query = query.filter(_after(key_columns, decode_cursor(page["cursor"], key_columns)))
+
+    limit = page["limit"]
+    rows = query.order_by(*key_columns).limit(limit + 1).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(rows[-1], k) for k in key])
+
+    body = orjson.dumps([dict(zip(fields, row)) for row in rows])
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,309 @@
+"""Fit per-company price models and write predictions, signals and confidence.
+
+The prediction stored on bar t is for bar t+1 (the convention backtest.py
+scores against). For every bar the features are an intercept, the last
+LAGS log close returns, the bar's high/low range relative to its close
+and the log volume change; the four targets are the next bar's open,
+high, low and close as log ratios to the current close. One least-squares
+model per company fits all four targets at once.
+
+Fits are walk-forward: bars are split into blocks of REFIT_EVERY, and
+each block is predicted with coefficients fitted only on the blocks
+before it. Block sums of X'X and X'Y are accumulated once, so every
+block's fit is a small K x K solve and all of a company's solves run in
+one batched np.linalg.solve call. Bars with fewer than MIN_TRAIN earlier
+bars to learn from are left untouched.
+
+The signal comes from the predicted close return z-scored by the
+in-sample residual deviation, and confidence_score is the normal
+probability that the predicted direction is right.
+
+Companies are split into chunks that are loaded and fitted in worker
+processes; the parent writes each chunk's results back as executemany
+UPDATEs by id and records the last fitted bar in prediction_state. A run
+without --full only refits companies whose newest bar is newer than
+their recorded one and only rewrites those new bars.
+
+Run from the backend directory:
+
+    python predict.py [--full] [--sector ID] [--workers N]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+import numpy as np
+from sqlalchemy import Float, bindparam, or_, select, type_coerce, update
+from database import ReadSessionLocal, SessionLocal
+from models import Analysis, Company, LatestAnalysis, PredictionState
+import rollups
+
+LAGS = 5
+REFIT_EVERY = 63        # about a quarter of daily bars
+MIN_TRAIN = 60
+RIDGE = 1e-3            # relative to the mean diagonal of X'X, keeps near-singular fits stable
+DEFAULT_CHUNK_SIZE = 250
+
+SIGNALS = np.array(["STRONG_SELL", "SELL", "HOLD", "BUY", "STRONG_BUY"])
+# Bounds on the z-scored predicted close return between the signals above
+SIGNAL_THRESHOLDS = (-0.25, -0.05, 0.05, 0.25)
+PREDICTED_COLUMNS = ("predicted_open", "predicted_high", "predicted_low", "predicted_close")
+
+
+def _load_chunk(company_ids: list) -> dict:
+    query = (
+        select(
+            Analysis.company_id,
+            Analysis.id,
+            Analysis.date,
+            *[type_coerce(getattr(Analysis, name), Float) for name in ("open_price", "high_price", "low_price", "close_price")],
+            type_coerce(Analysis.volume, Float),
+        )
+        .where(Analysis.company_id.in_(company_ids))
+        .order_by(Analysis.company_id, Analysis.date)
+    )
+    db = ReadSessionLocal()
+    try:
+        rows = db.execute(query).all()
+    finally:
+        db.close()
+    if not rows:
+        return {}
+
+    columns = list(zip(*rows))
+    company = np.array(columns[0], dtype=np.int64)
+    bounds = np.flatnonzero(np.diff(company)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(company)]))
+    ids = np.array(columns[1], dtype=np.int64)
+    dates = np.array(columns[2], dtype="datetime64[us]")
+    prices = np.array(columns[3:], dtype=np.float64)  # open, high, low, close, volume
+    return {
+        int(company[s]): {"ids": ids[s:e], "dates": dates[s:e], "prices": prices[:, s:e]}
+        for s, e in zip(starts, ends)
+    }
+
+
+def _design(prices: np.ndarray) -> tuple:
+    """Feature rows for bars LAGS..n-1 and targets for the bar after each."""
+    open_, high, low, close, volume = prices
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_close = np.log(close)
+        returns = np.diff(log_close, prepend=np.nan)
+        features = [np.ones_like(close)]
+        features += [np.roll(returns, lag) for lag in range(LAGS)]
+        features += [np.log(high / close), np.log(low / close), np.diff(np.log1p(volume), prepend=np.nan)]
+        X = np.stack(features, axis=1)[LAGS:]
+
+        # Next bar's open, high, low, close relative to this bar's close
+        following = np.log(np.stack([open_, high, low, close], axis=1)[1:] / close[:-1, None])
+        Y = np.vstack([following, np.full((1, 4), np.nan)])[LAGS:]
+    X = np.where(np.isfinite(X), X, 0.0)
+    return X, Y
+
+
+def fit_predict(prices: np.ndarray) -> tuple:
+    """Walk-forward predictions for one company.
+
+    Returns (valid mask over bars, predicted open/high/low/close (4, n),
+    z-scored close return, residual deviation of the newest fit).
+    """
+    n = prices.shape[1]
+    valid = np.zeros(n, dtype=bool)
+    predicted = np.full((4, n), np.nan)
+    z = np.full(n, np.nan)
+    if n <= LAGS + MIN_TRAIN:
+        return valid, predicted, z, None
+
+    X, Y = _design(prices)
+    m, k = X.shape
+    trainable = np.isfinite(Y).all(axis=1)
+    Xt = np.where(trainable[:, None], X, 0.0)
+    Yt = np.where(trainable[:, None], Y, 0.0)
+
+    blocks = -(-m // REFIT_EVERY)
+    pad = blocks * REFIT_EVERY - m
+    Xb = np.pad(Xt, ((0, pad), (0, 0))).reshape(blocks, REFIT_EVERY, k)
+    Yb = np.pad(Yt, ((0, pad), (0, 0))).reshape(blocks, REFIT_EVERY, 4)
+    counts = np.pad(trainable, (0, pad)).reshape(blocks, REFIT_EVERY).sum(axis=1)
+
+    # Sums over all blocks strictly before each block
+    def before(sums):
+        return np.cumsum(sums, axis=0) - sums
+
+    xtx = before(np.einsum("bik,bil->bkl", Xb, Xb))
+    xty = before(np.einsum("bik,bil->bkl", Xb, Yb))
+    yty = before(np.einsum("bi,bi->b", Yb[:, :, 3], Yb[:, :, 3]))
+    trained = before(counts)
+
+    ridge = RIDGE * np.trace(xtx, axis1=1, axis2=2) / k + 1e-12
+    beta = np.linalg.solve(xtx + ridge[:, None, None] * np.eye(k), xty)  # (blocks, k, 4)
+
+    # Residual variance of the close model from the same sums
+    close_beta = beta[:, :, 3]
+    sse = yty - 2 * np.einsum("bk,bk->b", close_beta, xty[:, :, 3]) + np.einsum("bk,bkl,bl->b", close_beta, xtx, close_beta)
+    sigma = np.sqrt(np.maximum(sse, 0) / np.maximum(trained - k, 1))
+
+    usable = (trained >= MIN_TRAIN) & (sigma > 0)
+    Xall = np.pad(X, ((0, pad), (0, 0))).reshape(blocks, REFIT_EVERY, k)
+    fitted = np.einsum("bik,bkl->bil", Xall, beta).reshape(-1, 4)[:m]
+    row_usable = np.repeat(usable, REFIT_EVERY)[:m]
+    row_sigma = np.repeat(sigma, REFIT_EVERY)[:m]
+
+    close = prices[3, LAGS:]
+    levels = close[:, None] * np.exp(fitted)
+    # Keep the predicted bar consistent: high above and low below open and close
+    levels[:, 1] = np.maximum(levels[:, 1], levels[:, [0, 3]].max(axis=1))
+    levels[:, 2] = np.minimum(levels[:, 2], levels[:, [0, 3]].min(axis=1))
+    ok = row_usable & np.isfinite(levels).all(axis=1) & (close > 0)
+
+    valid[LAGS:] = ok
+    predicted[:, LAGS:] = levels.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z[LAGS:] = fitted[:, 3] / row_sigma
+    latest_sigma = float(sigma[usable][-1]) if usable.any() else None
+    return valid, predicted, z, latest_sigma
+
+
+def signals_from_z(z: np.ndarray) -> tuple:
+    signal = SIGNALS[np.searchsorted(SIGNAL_THRESHOLDS, z)]
+    # Standard normal CDF of |z| (tanh approximation, error < 2e-4)
+    a = np.abs(z)
+    confidence = 0.5 * (1 + np.tanh(0.7978845608 * (a + 0.044715 * a ** 3)))
+    return signal, np.round(confidence, 2)
+
+
+def _run_chunk(companies: list) -> list:
+    """companies: [(company_id, only bars after this datetime or None)]"""
+    since = dict(companies)
+    results = []
+    for company_id, bars in _load_chunk(list(since)).items():
+        valid, predicted, z, sigma = fit_predict(bars["prices"])
+        if since[company_id] is not None:
+            valid &= bars["dates"] > np.datetime64(since[company_id], "us")
+        signal, confidence = signals_from_z(np.nan_to_num(z[valid]))
+        results.append({
+            "company_id": company_id,
+            "ids": bars["ids"][valid],
+            "predicted": np.round(predicted[:, valid], 2),
+            "signal": signal,
+            "confidence": confidence,
+            "last_date": bars["dates"][-1].astype(datetime),
+            "bars": len(bars["ids"]),
+            "residual_std": sigma,
+        })
+    return results
+
+
+def _select_companies(full: bool, sector_id) -> list:
+    query = (
+        select(Company.id, PredictionState.last_date)
+        .join(LatestAnalysis, LatestAnalysis.company_id == Company.id)
+        .outerjoin(PredictionState, PredictionState.company_id == Company.id)
+        .order_by(Company.id)
+    )
+    if sector_id is not None:
+        query = query.where(Company.sector_id == sector_id)
+    if not full:
+        query = query.where(or_(PredictionState.last_date.is_(None), LatestAnalysis.date > PredictionState.last_date))
+    db = ReadSessionLocal()
+    try:
+        return [(company_id, None if full else last_date) for company_id, last_date in db.execute(query)]
+    finally:
+        db.close()
+
+
+def _write(results: list) -> int:
+    table = Analysis.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values({name: bindparam(name) for name in (*PREDICTED_COLUMNS, "signal", "confidence_score")})
+    )
+    now = datetime.utcnow()
+    written = 0
+    db = SessionLocal()
+    try:
+        for result in results:
+            rows = [
+                {"b_id": int(analysis_id), **dict(zip(PREDICTED_COLUMNS, map(float, values))),
+                 "signal": str(signal), "confidence_score": float(confidence)}
+                for analysis_id, values, signal, confidence in zip(
+                    result["ids"], result["predicted"].T, result["signal"], result["confidence"])
+            ]
+            if rows:
+                db.execute(stmt, rows)
+                written += len(rows)
+        rollups.upsert(db, PredictionState, [
+            {"company_id": r["company_id"], "last_date": r["last_date"], "bars": r["bars"],
+             "residual_std": r["residual_std"], "fitted_at": now}
+            for r in results
+        ], ("company_id",))
+        rollups.refresh_latest(db, [r["company_id"] for r in results])
+        db.commit()
+    finally:
+        db.close()
+    return written
+
+
+def run_predictions(full: bool = False, sector_id: int = None, workers: int = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, progress=None) -> dict:
+    """`progress(fraction, message)`, when given, is called after every written chunk."""
+    started = time.perf_counter()
+    companies = _select_companies(full, sector_id)
+    chunks = [companies[i:i + chunk_size] for i in range(0, len(companies), chunk_size)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks) or 1))
+
+    totals = {"fitted": 0, "bars_written": 0}
+    chunks_done = 0
+
+    def consume(results):
+        nonlocal chunks_done
+        totals["fitted"] += sum(1 for r in results if r["residual_std"] is not None)
+        totals["bars_written"] += _write(results)
+        chunks_done += 1
+        if progress is not None:
+            progress(chunks_done / len(chunks), f"{chunks_done}/{len(chunks)} chunks of {chunk_size} companies")
+
+    if workers == 1:
+        for chunk in chunks:
+            consume(_run_chunk(chunk))
+    else:
+        # spawn, not fork: the API process is multi-threaded and owns open connections.
+        # At most two chunks per worker are in flight so finished results never pile up
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = set()
+            for chunk in chunks:
+                pending.add(pool.submit(_run_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        consume(future.result())
+            for future in pending:
+                consume(future.result())
+
+    return {
+        "full": full,
+        "workers": workers,
+        "companies": len(companies),
+        **totals,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+if __name__ == "__main__":
+    from database import engine
+    import migrations
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Refit every company and rewrite all bars")
+    parser.add_argument("--sector", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    migrations.upgrade(engine)
+    print(json.dumps(run_predictions(args.full, args.sector, args.workers, args.chunk_size), indent=2))
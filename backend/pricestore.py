@@ -0,0 +1,217 @@
+"""Columnar OHLCV side store.
+
+Each company's bars live in one ``<company_id>.npy`` file holding a float64
+array of shape (len(COLUMNS), n_bars), one row per column, ordered by date.
+Files are opened memory-mapped, so history requests slice them without
+building ORM objects or converting DECIMAL values per row.
+
+Writes to ``analyses`` call ``invalidate()`` after commit; the file is
+rebuilt from the database on the next read. ``invalidate()`` also bumps the
+company's ``<company_id>.gen`` generation file, which ``build()`` checks so a
+rebuild that read the database before a write cannot install its stale copy
+after the write's invalidation already ran.
+
+Bars aged out of ``analyses`` by retention.py live in the weekly and
+monthly tier tables; their aggregates go to a second ``<company_id>.rolled.npy``
+file with the same layout, dated by period start.
+"""
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import Float, select, type_coerce
+from sqlalchemy.orm import Session
+from models import Analysis, AnalysisMonthly, AnalysisWeekly
+
+STORE_DIR = os.environ.get("PRICE_STORE_DIR", "./pricestore")
+ENABLED = os.environ.get("PRICE_STORE_ENABLED", "1") != "0"
+
+COLUMNS = ("date", "open_price", "high_price", "low_price", "close_price", "volume")
+DATE, OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(COLUMNS))
+TIERS = {"raw": (Analysis,), "rolled": (AnalysisMonthly, AnalysisWeekly)}
+
+# Binary response: magic, column count, row count, then each column as little-endian float64
+BINARY_MAGIC = b"OHLCV\x00\x00\x01"
+BINARY_HEADER = struct.Struct("<8sII")
+BINARY_MEDIA_TYPE = "application/vnd.stocksml.ohlcv"
+
+_open_arrays = {}
+_lock = threading.Lock()
+
+
+def _path(company_id: int, tier: str = "raw") -> str:
+    suffix = "" if tier == "raw" else f".{tier}"
+    return os.path.join(STORE_DIR, f"{company_id}{suffix}.npy")
+
+
+def to_timestamp(value: datetime) -> float:
+    # Bars are stored as naive UTC datetimes
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _generation_path(company_id: int) -> str:
+    return os.path.join(STORE_DIR, f"{company_id}.gen")
+
+
+def _generation(company_id: int) -> bytes:
+    try:
+        with open(_generation_path(company_id), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def _bump_generation(company_id: int):
+    path = _generation_path(company_id)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(os.urandom(8))
+    os.replace(tmp_path, path)
+
+
+def invalidate(*company_ids: int):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    for company_id in company_ids:
+        # Bump before unlinking: a build() that installs its file after this
+        # unlink sees the new generation and removes the file again
+        _bump_generation(company_id)
+        for tier in TIERS:
+            with _lock:
+                _open_arrays.pop((company_id, tier), None)
+            try:
+                os.remove(_path(company_id, tier))
+            except FileNotFoundError:
+                pass
+
+
+def from_records(records: list) -> np.ndarray:
+    data = np.empty((len(COLUMNS), len(records)), dtype=np.float64)
+    if records:
+        columns = list(zip(*records))
+        data[DATE] = [to_timestamp(d) for d in columns[DATE]]
+        for i in range(1, len(COLUMNS)):
+            # None becomes NaN
+            data[i] = np.array(columns[i], dtype=np.float64)
+    return data
+
+
+def query(db: Session, company_id: int, tier: str = "raw") -> np.ndarray:
+    """Read a company's bars of `tier` straight from the database."""
+    rows = []
+    for model in TIERS[tier]:
+        date = Analysis.date if model is Analysis else model.period_start
+        # type_coerce skips the per-value Decimal conversion of the DECIMAL columns
+        rows += db.execute(
+            select(date, *[type_coerce(getattr(model, name), Float) for name in COLUMNS[1:]])
+            .where(model.company_id == company_id)
+            .order_by(date)
+        ).all()
+    if len(TIERS[tier]) > 1:
+        rows.sort(key=lambda row: row[0])
+    return from_records(rows)
+
+
+def build(db: Session, company_id: int, tier: str = "raw") -> np.ndarray:
+    """Write the company's file from the database and return its bars."""
+    generation = _generation(company_id)
+    # A new session, so the snapshot starts after the generation was read;
+    # the caller's transaction may predate a write that committed since
+    with Session(bind=db.get_bind()) as fresh:
+        data = query(fresh, company_id, tier)
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = _path(company_id, tier)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp_path, path)
+    if _generation(company_id) != generation:
+        # A write was invalidated while we read; our copy may predate it
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return data
+
+
+def load(db: Session, company_id: int, tier: str = "raw") -> np.ndarray:
+    path = _path(company_id, tier)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return build(db, company_id, tier)
+
+    # Reuse the mapping while the file on disk is unchanged; another worker
+    # rebuilding it replaces the inode
+    version = (stat.st_ino, stat.st_mtime_ns)
+    with _lock:
+        cached = _open_arrays.get((company_id, tier))
+    if cached and cached[0] == version:
+        return cached[1]
+
+    data = np.load(path, mmap_mode="r")
+    with _lock:
+        _open_arrays[(company_id, tier)] = (version, data)
+    return data
+
+
+def window(data: np.ndarray, date_from: datetime = None, date_to: datetime = None) -> np.ndarray:
+    # Zero-copy view of the bars inside [date_from, date_to]
+    dates = data[DATE]
+    start = 0 if date_from is None else np.searchsorted(dates, to_timestamp(date_from), side="left")
+    end = len(dates) if date_to is None else np.searchsorted(dates, to_timestamp(date_to), side="right")
+    return data[:, start:end]
+
+
+def resample(data: np.ndarray, interval: str) -> np.ndarray:
+    if data.shape[1] == 0:
+        return data
+
+    days = np.floor(data[DATE] / 86400).astype(np.int64)
+    if interval == "day":
+        periods = days
+    elif interval == "week":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        periods = (days + 3) // 7
+    else:
+        periods = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+    starts = np.flatnonzero(np.diff(periods, prepend=periods[0] - 1))
+    ends = np.append(starts[1:], data.shape[1]) - 1
+    if interval == "day":
+        period_start = periods[starts] * 86400
+    elif interval == "week":
+        period_start = (periods[starts] * 7 - 3) * 86400
+    else:
+        period_start = periods[starts].astype("datetime64[M]").astype("datetime64[s]").astype(np.int64)
+
+    out = np.empty((len(COLUMNS), len(starts)), dtype=np.float64)
+    out[DATE] = period_start
+    out[OPEN] = data[OPEN, starts]
+    out[HIGH] = np.fmax.reduceat(data[HIGH], starts)
+    out[LOW] = np.fmin.reduceat(data[LOW], starts)
+    out[CLOSE] = data[CLOSE, ends]
+    out[VOLUME] = np.add.reduceat(np.nan_to_num(data[VOLUME]), starts)
+    return out
+
+
+def to_records(data: np.ndarray) -> list[dict]:
+    columns = [data[i].tolist() for i in range(len(COLUMNS))]
+    records = []
+    for date, open_, high, low, close, volume in zip(*columns):
+        records.append({
+            "date": datetime.fromtimestamp(date, timezone.utc).replace(tzinfo=None),
+            "open_price": None if open_ != open_ else open_,
+            "high_price": None if high != high else high,
+            "low_price": None if low != low else low,
+            "close_price": None if close != close else close,
+            "volume": None if volume != volume else int(volume),
+        })
+    return records
+
+
+def to_binary(data: np.ndarray) -> bytes:
+    header = BINARY_HEADER.pack(BINARY_MAGIC, data.shape[0], data.shape[1])
+    return header + np.ascontiguousarray(data, dtype="<f8").tobytes()
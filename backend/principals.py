@@ -0,0 +1,76 @@
+"""In-process cache of authenticated users.
+
+Tokens carry the user's ``token_version`` in the ``ver`` claim and entries
+are keyed by (username, version). Changing a password or role bumps the
+version in the database, so older tokens stop matching; the handlers that
+do so also drop the user's entries here. Other workers drop theirs when
+the TTL runs out.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+CACHE_TTL_SECONDS = float(os.environ.get("PRINCIPAL_CACHE_TTL", "60"))
+CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    username: str
+    email: str
+    role: str
+    token_version: int
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            token_version=user.token_version,
+            created_at=user.created_at,
+        )
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str, version: int) -> Optional[Principal]:
+        key = (username, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def put(self, principal: Principal):
+        key = (principal.username, principal.token_version)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == username]:
+                del self._entries[key]
+
+
+principal_cache = PrincipalCache()
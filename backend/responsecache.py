@@ -0,0 +1,173 @@
+"""Read-through cache for reference data responses.
+
+Cached responses are keyed by the request path and query plus the current
+version of every entity or collection they were built from, e.g.
+``sector:3`` or ``companies``. Write handlers bump those versions with
+``invalidate()``, so later reads build new keys and old entries simply age
+out. Each entry carries a strong ETag over its body; a matching
+``If-None-Match`` gets a 304 without touching the database.
+
+The in-process backend is the default. Set RESPONSE_CACHE_URL to a
+``redis://`` URL to share entries and versions between workers (needs the
+``redis`` package). With the in-process backend a write in one worker is
+only seen by the others once RESPONSE_CACHE_TTL runs out.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+CACHE_URL = os.environ.get("RESPONSE_CACHE_URL", "")
+CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "2048"))
+# Response headers that are part of the cached payload
+KEPT_HEADERS = ("x-next-cursor",)
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # Versions live outside the LRU: evicting one would reset it and revive old keys
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: tuple):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def versions(self, names: tuple) -> list[int]:
+        with self._lock:
+            return [self._versions.get(name, 0) for name in names]
+
+    def bump(self, names: tuple):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class RedisBackend:
+    def __init__(self, url: str, ttl: int = CACHE_TTL_SECONDS):
+        import redis
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[tuple]:
+        raw = self._client.get("resp:" + key)
+        if raw is None:
+            return None
+        meta, body = raw.split(b"\n", 1)
+        etag, headers = json.loads(meta)
+        return etag, body, headers
+
+    def set(self, key: str, value: tuple):
+        etag, body, headers = value
+        meta = json.dumps([etag, headers]).encode()
+        self._client.set("resp:" + key, meta + b"\n" + body, ex=self.ttl)
+
+    def versions(self, names: tuple) -> list[int]:
+        return [int(v or 0) for v in self._client.mget(["ver:" + name for name in names])]
+
+    def bump(self, names: tuple):
+        pipe = self._client.pipeline()
+        for name in names:
+            pipe.incr("ver:" + name)
+        pipe.execute()
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, *names: str):
+        self.backend.bump(names)
+
+    def _count(self, hit: bool, not_modified: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if not_modified:
+                self.not_modified += 1
+
+    def respond(self, request: Request, depends_on: tuple, schema, load: Callable[[Response], object]) -> Response:
+        """Serve `request` from the cache or build it with `load`.
+
+        `load` receives a Response to set headers on and returns either the
+        content to validate against `schema` or a ready Response. Errors
+        raised by `load` are not cached.
+        """
+        versions = self.backend.versions(depends_on)
+        key = "|".join([
+            request.url.path,
+            "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items())),
+            *[f"{name}@{version}" for name, version in zip(depends_on, versions)],
+        ])
+
+        entry = self.backend.get(key)
+        hit = entry is not None
+        if not hit:
+            entry = self._build(schema, load)
+            self.backend.set(key, entry)
+
+        etag, body, headers = entry
+        headers = {**headers, "ETag": etag}
+        not_modified = _etag_matches(request.headers.get("if-none-match"), etag)
+        self._count(hit, not_modified)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def _build(self, schema, load) -> tuple:
+        response = Response()
+        content = load(response)
+        if isinstance(content, Response):
+            body, source = content.body, content.headers
+        else:
+            adapter = TypeAdapter(schema)
+            body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+            source = response.headers
+        headers = {name: source[name] for name in KEPT_HEADERS if name in source}
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        return etag, body, headers
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+response_cache = ResponseCache(RedisBackend(CACHE_URL) if CACHE_URL else MemoryBackend())
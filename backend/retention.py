@@ -0,0 +1,332 @@
+"""Tiered retention for old analysis bars.
+
+Bars older than RETENTION_WEEKLY_AFTER_DAYS are aggregated into
+analyses_weekly and deleted from analyses; weekly rows older than
+RETENTION_MONTHLY_AFTER_DAYS are merged into analyses_monthly and deleted
+in turn. Cutoffs are aligned to the start of a week (month), so only whole
+periods are rolled, and weeks are split at month boundaries so they merge
+into months exactly. Each company's newest week always stays raw, which
+keeps latest_analysis and the prediction state pointing at real rows.
+
+An aggregate keeps OHLCV, the predictions and signal made on the period's
+last bar, signal counts, confidence and the hit/prediction error sums
+backtest.py reports, all as counts and sums so periods merge without loss.
+The history endpoint reads the tiers through pricestore and merges them
+with the raw bars.
+
+Run from the backend directory (also available as the "retention" job):
+
+    python retention.py
+    python retention.py --weekly-after-days 180 --monthly-after-days 730 --dry-run
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import Float, bindparam, delete, func, select, type_coerce
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Analysis, AnalysisMonthly, AnalysisWeekly
+import backtest
+import pricestore
+import rollups
+
+WEEKLY_AFTER_DAYS = int(os.environ.get("RETENTION_WEEKLY_AFTER_DAYS", "365"))
+MONTHLY_AFTER_DAYS = int(os.environ.get("RETENTION_MONTHLY_AFTER_DAYS", "1825"))
+CHUNK_COMPANIES = 100
+
+SIGNALS = rollups.SIGNALS
+# Scored the way backtest.py scores raw bars
+SIGNAL_POSITION = backtest.SIGNAL_POSITION
+PRICE_FIELDS = ("open_price", "high_price", "low_price", "close_price", "volume",
+                "predicted_open", "predicted_high", "predicted_low", "predicted_close")
+SUM_FIELDS = ("bars", "confidence_sum", "confidence_count", "trades", "hits",
+              "prediction_count", "prediction_abs_error", "prediction_sq_error")
+
+
+def week_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day) - timedelta(days=value.weekday())
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _segment_starts(dates: np.ndarray) -> np.ndarray:
+    # Monday of the bar's week, or the 1st of its month when that is later
+    days = dates.astype("datetime64[D]")
+    weeks = days - ((days.astype(np.int64) + 3) % 7)  # 1970-01-01 was a Thursday
+    months = days.astype("datetime64[M]").astype("datetime64[D]")
+    return np.maximum(weeks, months)
+
+
+def _number(value, digits: int = 2):
+    return None if value != value else round(float(value), digits)
+
+
+def _merge(period_start: datetime, rows: list) -> dict:
+    """Combine aggregates of consecutive stretches of one company into one period."""
+    rows = sorted(rows, key=lambda row: row["first_date"])
+    first, last = rows[0], rows[-1]
+    highs = [row["high_price"] for row in rows if row["high_price"] is not None]
+    lows = [row["low_price"] for row in rows if row["low_price"] is not None]
+    volumes = [row["volume"] for row in rows if row["volume"] is not None]
+    counts = {}
+    for row in rows:
+        for signal, count in (row["signal_counts"] or {}).items():
+            counts[signal] = counts.get(signal, 0) + count
+    return {
+        "company_id": first["company_id"],
+        "period_start": period_start,
+        "first_date": first["first_date"],
+        "last_date": last["last_date"],
+        "open_price": first["open_price"],
+        "high_price": max(highs) if highs else None,
+        "low_price": min(lows) if lows else None,
+        "close_price": last["close_price"],
+        "volume": sum(volumes) if volumes else None,
+        **{name: last[name] for name in ("predicted_open", "predicted_high", "predicted_low", "predicted_close", "signal")},
+        "signal_counts": counts,
+        **{name: sum(row[name] for row in rows) for name in SUM_FIELDS},
+    }
+
+
+def _replace(db: Session, model, rows: list, existing: dict):
+    # Rows already in the table were merged into `rows`; swap them out and insert
+    # everything with one executemany (far cheaper than a multi-row upsert statement)
+    table = model.__table__
+    if existing:
+        db.execute(
+            delete(table).where(table.c.company_id == bindparam("b_company"), table.c.period_start == bindparam("b_start")),
+            [{"b_company": company_id, "b_start": start} for company_id, start in existing],
+        )
+    if rows:
+        db.execute(table.insert(), rows)
+
+
+def _existing(db: Session, model, keys: set) -> dict:
+    if not keys:
+        return {}
+    company_ids = {company_id for company_id, _ in keys}
+    starts = [start for _, start in keys]
+    rows = db.execute(
+        select(model.__table__)
+        .where(model.company_id.in_(company_ids), model.period_start.between(min(starts), max(starts)))
+    ).mappings().all()
+    return {(row["company_id"], row["period_start"]): dict(row) for row in rows if (row["company_id"], row["period_start"]) in keys}
+
+
+def _load_bars(db: Session, cutoffs: dict) -> dict:
+    query = (
+        select(
+            Analysis.company_id,
+            Analysis.date,
+            Analysis.signal,
+            type_coerce(Analysis.confidence_score, Float),
+            *[type_coerce(getattr(Analysis, name), Float) for name in PRICE_FIELDS],
+        )
+        .where(Analysis.company_id.in_(list(cutoffs)), Analysis.date < max(cutoffs.values()))
+        .order_by(Analysis.company_id, Analysis.date)
+    )
+    rows = [row for row in db.execute(query) if row[1] < cutoffs[row[0]]]
+    if not rows:
+        return {}
+    columns = list(zip(*rows))
+    bars = {
+        "company_id": np.array(columns[0], dtype=np.int64),
+        "date": np.array(columns[1], dtype="datetime64[us]"),
+        "signal": np.array([s or "" for s in columns[2]]),
+        "confidence": np.array(columns[3], dtype=np.float64),
+        **{name: np.array(column, dtype=np.float64) for name, column in zip(PRICE_FIELDS, columns[4:])},
+    }
+    # The close that follows each bar; for a company's last rolled bar it is the first bar kept raw
+    next_close = np.append(bars["close_price"][1:], np.nan)
+    last = np.append(np.flatnonzero(np.diff(bars["company_id"])), len(rows) - 1)
+    for i in last:
+        company_id = int(bars["company_id"][i])
+        following = db.execute(
+            select(type_coerce(Analysis.close_price, Float))
+            .where(Analysis.company_id == company_id, Analysis.date >= cutoffs[company_id])
+            .order_by(Analysis.date)
+            .limit(1)
+        ).scalar()
+        next_close[i] = np.nan if following is None else following
+    bars["next_close"] = next_close
+    return bars
+
+
+def _aggregate(bars: dict) -> list[dict]:
+    """One weekly row per company and week (split at month ends)."""
+    segments = _segment_starts(bars["date"])
+    company_ids = bars["company_id"]
+    changed = (np.diff(company_ids) != 0) | (np.diff(segments) != np.timedelta64(0, "D"))
+    starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+    ends = np.append(starts[1:], len(company_ids)) - 1
+
+    close = bars["close_price"]
+    move = bars["next_close"] - close
+    position = np.array([SIGNAL_POSITION.get(s, 0.0) for s in bars["signal"]])
+    traded = (position != 0) & np.isfinite(move)
+    hit = traded & (np.sign(move) == position)
+    confidence = bars["confidence"]
+    # Scores are stored either as 0-1 or as a 0-100 percentage
+    confidence = np.where(confidence > 1, confidence / 100, confidence)
+    has_confidence = np.isfinite(confidence)
+    predicted = bars["predicted_close"]
+    # 0.0 is the schema default for "no prediction"
+    has_prediction = np.isfinite(predicted) & (predicted != 0) & np.isfinite(bars["next_close"])
+    error = np.where(has_prediction, predicted - bars["next_close"], 0.0)
+
+    def sums(values):
+        return np.add.reduceat(values, starts)
+
+    signal_counts = {name: sums((bars["signal"] == name).astype(np.int64)) for name in SIGNALS}
+    aggregates = {
+        "bars": ends - starts + 1,
+        "confidence_sum": sums(np.where(has_confidence, confidence, 0.0)),
+        "confidence_count": sums(has_confidence.astype(np.int64)),
+        "trades": sums(traded.astype(np.int64)),
+        "hits": sums(hit.astype(np.int64)),
+        "prediction_count": sums(has_prediction.astype(np.int64)),
+        "prediction_abs_error": sums(np.abs(error)),
+        "prediction_sq_error": sums(error ** 2),
+    }
+    high = np.fmax.reduceat(bars["high_price"], starts)
+    low = np.fmin.reduceat(bars["low_price"], starts)
+    volume = np.add.reduceat(np.nan_to_num(bars["volume"]), starts)
+    has_volume = sums(np.isfinite(bars["volume"]).astype(np.int64)) > 0
+
+    rows = []
+    for g, (s, e) in enumerate(zip(starts, ends)):
+        rows.append({
+            "company_id": int(company_ids[s]),
+            "period_start": segments[s].astype("datetime64[us]").astype(datetime),
+            "first_date": bars["date"][s].astype(datetime),
+            "last_date": bars["date"][e].astype(datetime),
+            "open_price": _number(bars["open_price"][s]),
+            "high_price": _number(high[g]),
+            "low_price": _number(low[g]),
+            "close_price": _number(close[e]),
+            "volume": int(volume[g]) if has_volume[g] else None,
+            **{name: _number(bars[name][e]) for name in ("predicted_open", "predicted_high", "predicted_low", "predicted_close")},
+            "signal": str(bars["signal"][e]) or None,
+            "signal_counts": {name: int(counts[g]) for name, counts in signal_counts.items() if counts[g]},
+            **{name: values[g].item() for name, values in aggregates.items()},
+        })
+    return rows
+
+
+def _raw_cutoffs(db: Session, cutoff: datetime) -> dict:
+    # Never roll a company's newest week, whatever its age
+    rows = db.execute(
+        select(Analysis.company_id, func.min(Analysis.date), func.max(Analysis.date))
+        .where(Analysis.company_id.is_not(None))
+        .group_by(Analysis.company_id)
+    ).all()
+    cutoffs = {}
+    for company_id, oldest, newest in rows:
+        company_cutoff = min(cutoff, week_start(newest))
+        if oldest < company_cutoff:
+            cutoffs[company_id] = company_cutoff
+    return cutoffs
+
+
+def roll_raw(db: Session, cutoff: datetime, dry_run: bool = False, progress=None) -> dict:
+    """Move bars dated before `cutoff` (a Monday) into analyses_weekly."""
+    cutoffs = _raw_cutoffs(db, cutoff)
+    company_ids = sorted(cutoffs)
+    totals = {"companies": len(company_ids), "bars_rolled": 0, "weekly_rows": 0}
+    for start in range(0, len(company_ids), CHUNK_COMPANIES):
+        chunk = {company_id: cutoffs[company_id] for company_id in company_ids[start:start + CHUNK_COMPANIES]}
+        bars = _load_bars(db, chunk)
+        if bars:
+            rows = _aggregate(bars)
+            totals["bars_rolled"] += len(bars["date"])
+            totals["weekly_rows"] += len(rows)
+            if not dry_run:
+                # Late backfills may land in weeks that were already rolled
+                existing = _existing(db, AnalysisWeekly, {(r["company_id"], r["period_start"]) for r in rows})
+                if existing:
+                    rows = [
+                        _merge(row["period_start"], [existing[(row["company_id"], row["period_start"])], row])
+                        if (row["company_id"], row["period_start"]) in existing else row
+                        for row in rows
+                    ]
+                _replace(db, AnalysisWeekly, rows, existing)
+                table = Analysis.__table__
+                db.execute(
+                    delete(table).where(table.c.company_id == bindparam("b_company"), table.c.date < bindparam("b_cutoff")),
+                    [{"b_company": company_id, "b_cutoff": c} for company_id, c in chunk.items()],
+                )
+                db.commit()
+                pricestore.invalidate(*chunk)
+        if progress is not None:
+            progress(min(start + CHUNK_COMPANIES, len(company_ids)) / len(company_ids), f"weekly: {totals['bars_rolled']} bars rolled")
+    return totals
+
+
+def roll_weekly(db: Session, cutoff: datetime, dry_run: bool = False) -> dict:
+    """Merge weekly rows dated before `cutoff` (the 1st of a month) into analyses_monthly."""
+    company_ids = db.execute(
+        select(AnalysisWeekly.company_id).where(AnalysisWeekly.period_start < cutoff).distinct().order_by(AnalysisWeekly.company_id)
+    ).scalars().all()
+    totals = {"companies": len(company_ids), "weeks_rolled": 0, "monthly_rows": 0}
+    for start in range(0, len(company_ids), CHUNK_COMPANIES):
+        chunk = company_ids[start:start + CHUNK_COMPANIES]
+        weeks = db.execute(
+            select(AnalysisWeekly.__table__)
+            .where(AnalysisWeekly.company_id.in_(chunk), AnalysisWeekly.period_start < cutoff)
+        ).mappings().all()
+        months = {}
+        for week in weeks:
+            months.setdefault((week["company_id"], month_start(week["period_start"])), []).append(dict(week))
+        totals["weeks_rolled"] += len(weeks)
+        totals["monthly_rows"] += len(months)
+        if dry_run:
+            continue
+        existing = _existing(db, AnalysisMonthly, set(months))
+        rows = [_merge(key[1], group + ([existing[key]] if key in existing else [])) for key, group in months.items()]
+        _replace(db, AnalysisMonthly, rows, existing)
+        db.execute(delete(AnalysisWeekly).where(AnalysisWeekly.company_id.in_(chunk), AnalysisWeekly.period_start < cutoff))
+        db.commit()
+        pricestore.invalidate(*chunk)
+    return totals
+
+
+def run_retention(weekly_after_days: int = WEEKLY_AFTER_DAYS, monthly_after_days: int = MONTHLY_AFTER_DAYS,
+                  dry_run: bool = False, now: datetime = None, progress=None) -> dict:
+    if monthly_after_days < weekly_after_days:
+        raise ValueError("monthly_after_days must not be smaller than weekly_after_days")
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    weekly_cutoff = week_start(now - timedelta(days=weekly_after_days))
+    monthly_cutoff = month_start(now - timedelta(days=monthly_after_days))
+    db = SessionLocal()
+    try:
+        weekly = roll_raw(db, weekly_cutoff, dry_run, progress)
+        monthly = roll_weekly(db, monthly_cutoff, dry_run)
+    finally:
+        db.close()
+    return {
+        "dry_run": dry_run,
+        "weekly_cutoff": weekly_cutoff.isoformat(),
+        "monthly_cutoff": monthly_cutoff.isoformat(),
+        "weekly": weekly,
+        "monthly": monthly,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+if __name__ == "__main__":
+    from database import engine
+    import migrations
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weekly-after-days", type=int, default=WEEKLY_AFTER_DAYS)
+    parser.add_argument("--monthly-after-days", type=int, default=MONTHLY_AFTER_DAYS)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be rolled without writing")
+    args = parser.parse_args()
+    migrations.upgrade(engine)
+    print(json.dumps(run_retention(args.weekly_after_days, args.monthly_after_days, args.dry_run), indent=2))
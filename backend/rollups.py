@@ -0,0 +1,387 @@
+"""Derived tables kept next to the data they summarize.
+
+latest_analysis holds the newest Analysis of every company and
+sector_stats one summary row per sector. Write handlers update both inside
+their own transaction, so they change together with the rows they
+describe. The newest analysis is upserted directly (or recomputed for
+bulk inserts and deletes). sector_stats keeps counts, sums and signal
+counts that writes adjust by deltas: a company write applies the
+difference between the company before and after it, an analysis write
+only touches the sector when the company's latest signal changed. The
+median P/E is the one value recomputed over the sector, and only when a
+P/E in it changed. Reads are a single lookup per company or sector.
+
+Run from the backend directory to rebuild every row from scratch:
+
+    python rollups.py
+"""
+import statistics
+import time
+from datetime import datetime
+from sqlalchemy import Float, and_, case, delete, func, select, type_coerce, update
+from sqlalchemy.orm import Session
+from models import Analysis, Company, LatestAnalysis, Sector, SectorStats
+
+SIGNALS = ('BUY', 'SELL', 'HOLD', 'STRONG_BUY', 'STRONG_SELL')
+LATEST_FIELDS = ('date', 'signal', 'confidence_score', 'close_price', 'predicted_close')
+
+
+def upsert(db: Session, model, rows: list[dict], keys: tuple, where=None):
+    # INSERT ... ON CONFLICT DO UPDATE where the dialect has it, merge() elsewhere.
+    # `where(excluded)` optionally limits which conflicting rows get updated.
+    if not rows:
+        return
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        for row in rows:
+            db.merge(model(**row))
+        return
+    stmt = insert(model).values(rows)
+    updated = {name: stmt.excluded[name] for name in rows[0] if name not in keys}
+    condition = where(stmt.excluded) if where is not None else None
+    db.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=updated, where=condition))
+
+
+def upsert_latest(db: Session, analyses: list) -> None:
+    """Record flushed Analysis objects that may be their company's newest bar."""
+    rows = {}
+    for analysis in analyses:
+        current = rows.get(analysis.company_id)
+        if current is None or analysis.date >= current["date"]:
+            rows[analysis.company_id] = {
+                "company_id": analysis.company_id,
+                "analysis_id": analysis.id,
+                **{name: getattr(analysis, name) for name in LATEST_FIELDS},
+                "updated_at": datetime.utcnow(),
+            }
+    if not rows:
+        return
+    previous = {
+        company_id: (date, signal) for company_id, date, signal in db.execute(
+            select(LatestAnalysis.company_id, LatestAnalysis.date, LatestAnalysis.signal)
+            .where(LatestAnalysis.company_id.in_(list(rows)))
+        )
+    }
+    # Only replace the snapshot with a bar at least as new as the stored one
+    upsert(db, LatestAnalysis, list(rows.values()), ("company_id",),
+           where=lambda excluded: LatestAnalysis.date <= excluded.date)
+    _signals_changed(db, {
+        company_id: (previous[company_id][1] if company_id in previous else None, row["signal"])
+        for company_id, row in rows.items()
+        if company_id not in previous or previous[company_id][0] <= row["date"]
+    })
+
+
+def refresh_latest(db: Session, company_ids=None) -> None:
+    """Recompute latest_analysis from analyses for `company_ids` (all when None).
+
+    With `company_ids`, sector signal counts follow; with None the caller
+    rebuilds sector_stats.
+    """
+    previous = {}
+    if company_ids is not None:
+        company_ids = list(set(company_ids))
+        if not company_ids:
+            return
+        previous = dict(db.execute(
+            select(LatestAnalysis.company_id, LatestAnalysis.signal).where(LatestAnalysis.company_id.in_(company_ids))
+        ).all())
+    newest = select(Analysis.company_id, func.max(Analysis.date).label("date")).group_by(Analysis.company_id)
+    cleared = delete(LatestAnalysis)
+    if company_ids is not None:
+        newest = newest.where(Analysis.company_id.in_(company_ids))
+        cleared = cleared.where(LatestAnalysis.company_id.in_(company_ids))
+    newest = newest.subquery()
+
+    query = (
+        select(Analysis.company_id, Analysis.id, *[getattr(Analysis, name) for name in LATEST_FIELDS])
+        .join(newest, and_(Analysis.company_id == newest.c.company_id, Analysis.date == newest.c.date))
+        .join(Company, Company.id == Analysis.company_id)
+    )
+    now = datetime.utcnow()
+    # Keyed by company: a database from before the unique (company_id, date)
+    # index may hold the newest bar twice, the higher id wins
+    rows = list({
+        row[0]: {"company_id": row[0], "analysis_id": row[1], **dict(zip(LATEST_FIELDS, row[2:])), "updated_at": now}
+        for row in db.execute(query.order_by(Analysis.id))
+    }.values())
+    db.execute(cleared)
+    if rows:
+        db.execute(LatestAnalysis.__table__.insert(), rows)
+    if company_ids is not None:
+        current = {row["company_id"]: row["signal"] for row in rows}
+        _signals_changed(db, {
+            company_id: (previous.get(company_id), current.get(company_id)) for company_id in company_ids
+        })
+
+
+# Averaged company columns -> (sum, count, average) columns of sector_stats
+AVERAGED = {
+    "market_cap": ("total_market_cap", "market_cap_count", "avg_market_cap"),
+    "profit_margin": ("profit_margin_sum", "profit_margin_count", "avg_profit_margin"),
+    "dividend_yield": ("dividend_yield_sum", "dividend_yield_count", "avg_dividend_yield"),
+}
+SIGNAL_COLUMNS = {signal: f"{signal.lower()}_count" for signal in SIGNALS}
+# Stays well below SQLite's bound parameter limit
+SNAPSHOT_CHUNK = 500
+# Sectors per refresh_sectors() call in rebuild(), between progress reports
+REBUILD_CHUNK = 100
+
+
+def _median_pe(db: Session, sector_ids: list) -> dict:
+    values = {}
+    query = select(Company.sector_id, type_coerce(Company.pe_ratio, Float)).where(
+        Company.sector_id.in_(sector_ids), Company.pe_ratio.is_not(None)
+    )
+    for sector_id, pe_ratio in db.execute(query):
+        values.setdefault(sector_id, []).append(pe_ratio)
+    return {sector_id: statistics.median(pes) for sector_id, pes in values.items()}
+
+
+def company_snapshot(db: Session, company_ids) -> dict:
+    """What each company contributes to its sector's stats, including its latest signal.
+
+    Take one before and one after a company write and pass both to
+    apply_company_changes().
+    """
+    company_ids = sorted(set(company_ids))
+    query = (
+        select(
+            Company.id,
+            Company.sector_id,
+            *[type_coerce(getattr(Company, name), Float).label(name) for name in (*AVERAGED, "pe_ratio")],
+            LatestAnalysis.signal,
+        )
+        .outerjoin(LatestAnalysis, LatestAnalysis.company_id == Company.id)
+    )
+    snapshot = {}
+    for start in range(0, len(company_ids), SNAPSHOT_CHUNK):
+        chunk = company_ids[start:start + SNAPSHOT_CHUNK]
+        snapshot.update((row.id, row._asdict()) for row in db.execute(query.where(Company.id.in_(chunk))))
+    return snapshot
+
+
+def _add(deltas: dict, contribution: dict, sign: int):
+    if contribution["sector_id"] is None:
+        return
+    delta = deltas.setdefault(contribution["sector_id"], {})
+    delta["company_count"] = delta.get("company_count", 0) + sign
+    for name, (total, count, _) in AVERAGED.items():
+        if contribution[name] is not None:
+            delta[total] = delta.get(total, 0.0) + sign * contribution[name]
+            delta[count] = delta.get(count, 0) + sign
+    if contribution["signal"] is not None:
+        column = SIGNAL_COLUMNS[contribution["signal"]]
+        delta[column] = delta.get(column, 0) + sign
+
+
+def _apply(db: Session, deltas: dict, median_sectors=()) -> None:
+    # One UPDATE per sector; the right-hand sides all read the pre-update row
+    now = datetime.utcnow()
+    stats = SectorStats.__table__.c
+    missing = []
+    for sector_id, delta in sorted(deltas.items()):
+        values = {"updated_at": now}
+        for column, change in delta.items():
+            if column not in ("company_count", *SIGNAL_COLUMNS.values()):
+                continue
+            values[column] = stats[column] + change
+        for total, count, average in AVERAGED.values():
+            if total not in delta and count not in delta:
+                continue
+            new_count = stats[count] + delta.get(count, 0)
+            new_total = func.coalesce(stats[total], 0.0) + delta.get(total, 0.0)
+            values[count] = new_count
+            values[total] = case((new_count > 0, new_total), else_=None)
+            values[average] = case((new_count > 0, new_total / new_count), else_=None)
+        result = db.execute(update(SectorStats).where(SectorStats.sector_id == sector_id).values(values))
+        if result.rowcount == 0:
+            missing.append(sector_id)
+
+    medians = sorted(set(median_sectors) - set(missing))
+    if medians:
+        found = _median_pe(db, medians)
+        for sector_id in medians:
+            db.execute(
+                update(SectorStats).where(SectorStats.sector_id == sector_id)
+                .values(median_pe_ratio=found.get(sector_id), updated_at=now)
+            )
+    if missing:
+        # No row to apply the delta to (e.g. a sector added behind our back): build it whole
+        refresh_sectors(db, missing)
+
+
+def apply_company_changes(db: Session, before: dict, after: dict) -> None:
+    """Update sector_stats for companies created, changed, moved or deleted.
+
+    `before` and `after` come from company_snapshot() around the write; a
+    company missing from one side was created or deleted. The median P/E
+    of a sector is only recomputed when a P/E in it changed.
+    """
+    deltas = {}
+    median_sectors = set()
+    for company_id in before.keys() | after.keys():
+        old, new = before.get(company_id), after.get(company_id)
+        if old == new:
+            continue
+        if old is not None:
+            _add(deltas, old, -1)
+        if new is not None:
+            _add(deltas, new, 1)
+        moved = old is None or new is None or old["sector_id"] != new["sector_id"]
+        if moved or old["pe_ratio"] != new["pe_ratio"]:
+            for side in (old, new):
+                if side is not None and side["pe_ratio"] is not None and side["sector_id"] is not None:
+                    median_sectors.add(side["sector_id"])
+    _apply(db, deltas, median_sectors)
+
+
+def _signals_changed(db: Session, changes: dict) -> None:
+    # changes: company_id -> (previous latest signal, new latest signal)
+    changes = {company_id: pair for company_id, pair in changes.items() if pair[0] != pair[1]}
+    if not changes:
+        return
+    sectors = dict(db.execute(select(Company.id, Company.sector_id).where(Company.id.in_(list(changes)))).all())
+    deltas = {}
+    for company_id, (old, new) in changes.items():
+        # Deleted companies are taken out of their sector by apply_company_changes()
+        sector_id = sectors.get(company_id)
+        if sector_id is None:
+            continue
+        delta = deltas.setdefault(sector_id, {})
+        for signal, sign in ((old, -1), (new, 1)):
+            if signal is not None:
+                delta[SIGNAL_COLUMNS[signal]] = delta.get(SIGNAL_COLUMNS[signal], 0) + sign
+    _apply(db, deltas)
+
+
+def _mean(values: list):
+    return sum(values) / len(values) if values else None
+
+
+def _company_aggregates(db: Session, sector_ids: list) -> dict:
+    query = select(
+        Company.sector_id,
+        type_coerce(Company.market_cap, Float),
+        type_coerce(Company.pe_ratio, Float),
+        type_coerce(Company.profit_margin, Float),
+        type_coerce(Company.dividend_yield, Float),
+    ).where(Company.sector_id.in_(sector_ids))
+
+    columns = {}
+    for sector_id, *values in db.execute(query):
+        sector = columns.setdefault(sector_id, {"count": 0, "market_cap": [], "pe_ratio": [], "profit_margin": [], "dividend_yield": []})
+        sector["count"] += 1
+        for name, value in zip(("market_cap", "pe_ratio", "profit_margin", "dividend_yield"), values):
+            if value is not None:
+                sector[name].append(value)
+
+    result = {}
+    for sector_id, sector in columns.items():
+        result[sector_id] = {
+            "company_count": sector["count"],
+            "median_pe_ratio": statistics.median(sector["pe_ratio"]) if sector["pe_ratio"] else None,
+        }
+        for name, (total, count, average) in AVERAGED.items():
+            values = sector[name]
+            result[sector_id].update({
+                total: sum(values) if values else None,
+                count: len(values),
+                average: _mean(values),
+            })
+    return result
+
+
+def _latest_signals(db: Session, sector_ids: list) -> dict:
+    query = (
+        select(Company.sector_id, LatestAnalysis.signal, func.count())
+        .join(Company, Company.id == LatestAnalysis.company_id)
+        .where(Company.sector_id.in_(sector_ids))
+        .group_by(Company.sector_id, LatestAnalysis.signal)
+    )
+    counts = {}
+    for sector_id, signal, count in db.execute(query):
+        counts.setdefault(sector_id, {})[signal] = count
+    return counts
+
+
+def refresh_sectors(db: Session, sector_ids) -> None:
+    """Recompute sector_stats from scratch for `sector_ids` in the caller's transaction.
+
+    O(companies in those sectors); for created, deleted or reseeded sectors
+    and rebuilds. Company and analysis writes apply deltas instead.
+    """
+    sector_ids = sorted({sid for sid in sector_ids if sid is not None})
+    if not sector_ids:
+        return
+    existing = {sid for (sid,) in db.execute(select(Sector.id).where(Sector.id.in_(sector_ids)))}
+    gone = [sid for sid in sector_ids if sid not in existing]
+    if gone:
+        db.execute(delete(SectorStats).where(SectorStats.sector_id.in_(gone)))
+    if not existing:
+        return
+
+    ids = sorted(existing)
+    aggregates = _company_aggregates(db, ids)
+    signals = _latest_signals(db, ids)
+    now = datetime.utcnow()
+    empty = {"company_count": 0, "median_pe_ratio": None}
+    for total, count, average in AVERAGED.values():
+        empty.update({total: None, count: 0, average: None})
+    rows = [
+        {
+            "sector_id": sid,
+            **aggregates.get(sid, empty),
+            **{column: signals.get(sid, {}).get(signal, 0) for signal, column in SIGNAL_COLUMNS.items()},
+            "updated_at": now,
+        }
+        for sid in ids
+    ]
+    upsert(db, SectorStats, rows, ("sector_id",))
+
+
+def rebuild(db: Session, progress=None) -> int:
+    """Rebuild both tables; returns the number of sectors summarized.
+
+    `progress(fraction, message)`, when given, is called after
+    latest_analysis and after every REBUILD_CHUNK sectors.
+    """
+    refresh_latest(db)
+    db.execute(delete(SectorStats))
+    sector_ids = db.execute(select(Sector.id)).scalars().all()
+    if progress is not None:
+        progress(0.5, "latest_analysis rebuilt")
+    for start in range(0, len(sector_ids), REBUILD_CHUNK):
+        refresh_sectors(db, sector_ids[start:start + REBUILD_CHUNK])
+        if progress is not None:
+            done = min(start + REBUILD_CHUNK, len(sector_ids))
+            progress(0.5 + 0.5 * done / len(sector_ids), f"{done}/{len(sector_ids)} sectors")
+    return len(sector_ids)
+
+
+def ensure_built(db: Session) -> None:
+    # Fill the tables once for databases that existed before they were added
+    missing_stats = db.query(SectorStats.sector_id).first() is None and db.query(Sector.id).first() is not None
+    missing_latest = db.query(LatestAnalysis.company_id).first() is None and db.query(Analysis.id).first() is not None
+    if missing_stats or missing_latest:
+        rebuild(db)
+        db.commit()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    import migrations
+
+    migrations.upgrade(engine)
+    started = time.perf_counter()
+    session = SessionLocal()
+    try:
+        count = rebuild(session)
+        session.commit()
+    finally:
+        session.close()
+    print(f"Rebuilt stats for {count} sectors in {time.perf_counter() - started:.2f}s")
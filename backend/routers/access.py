@@ -0,0 +1,108 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from access import access_cache
+from database import get_db, get_read_db
+from feed import feed_hub
+from models import Company, User, UserCompanyAccess
+from principals import Principal
+from responsecache import response_cache
+from routers.auth import get_current_admin
+import schemas
+
+router = APIRouter()
+
+MAX_IDS = 10000
+MAX_PAIRS = 100000
+
+
+def _unique_ids(change: schemas.AccessChange) -> tuple[list, list]:
+    user_ids = list(dict.fromkeys(change.user_ids))
+    company_ids = list(dict.fromkeys(change.company_ids))
+    if len(user_ids) > MAX_IDS or len(company_ids) > MAX_IDS or len(user_ids) * len(company_ids) > MAX_PAIRS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_IDS} users or companies and {MAX_PAIRS} user/company pairs per request",
+        )
+    return user_ids, company_ids
+
+
+def _missing(db: Session, column, ids: list) -> list:
+    found = set(db.execute(select(column).where(column.in_(ids))).scalars())
+    return [i for i in ids if i not in found]
+
+
+def _access_changed(user_ids: list):
+    # This worker's cached id sets, the users' cached responses and their open feeds
+    access_cache.invalidate(*user_ids)
+    response_cache.invalidate(*[f"acl:{user_id}" for user_id in user_ids])
+    feed_hub.drop_users(user_ids)
+
+
+@router.post("/access/grant", response_model=schemas.AccessChangeResult)
+def grant_access(
+    change: schemas.AccessChange,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    user_ids, company_ids = _unique_ids(change)
+    missing_users = _missing(db, User.id, user_ids)
+    if missing_users:
+        raise HTTPException(status_code=404, detail=f"Users not found: {missing_users}")
+    missing_companies = _missing(db, Company.id, company_ids)
+    if missing_companies:
+        raise HTTPException(status_code=404, detail=f"Companies not found: {missing_companies}")
+
+    existing = set(db.execute(
+        select(UserCompanyAccess.user_id, UserCompanyAccess.company_id)
+        .where(UserCompanyAccess.user_id.in_(user_ids), UserCompanyAccess.company_id.in_(company_ids))
+    ).tuples())
+    granted_at = datetime.utcnow()
+    rows = [
+        {"user_id": user_id, "company_id": company_id, "granted_by": current_user.id, "granted_at": granted_at}
+        for user_id in user_ids for company_id in company_ids if (user_id, company_id) not in existing
+    ]
+    if rows:
+        try:
+            db.execute(insert(UserCompanyAccess), rows)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Access was granted concurrently, retry the request")
+        _access_changed(user_ids)
+    return {"changed": len(rows), "unchanged": len(existing)}
+
+
+@router.post("/access/revoke", response_model=schemas.AccessChangeResult)
+def revoke_access(
+    change: schemas.AccessChange,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    user_ids, company_ids = _unique_ids(change)
+    result = db.execute(
+        delete(UserCompanyAccess)
+        .where(UserCompanyAccess.user_id.in_(user_ids), UserCompanyAccess.company_id.in_(company_ids))
+    )
+    db.commit()
+    if result.rowcount:
+        _access_changed(user_ids)
+    return {"changed": result.rowcount, "unchanged": len(user_ids) * len(company_ids) - result.rowcount}
+
+
+@router.get("/users/{user_id}/access", response_model=schemas.UserAccess)
+def get_user_access(
+    user_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_read_db)
+):
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    company_ids = db.execute(
+        select(UserCompanyAccess.company_id)
+        .where(UserCompanyAccess.user_id == user_id)
+        .order_by(UserCompanyAccess.company_id)
+    ).scalars().all()
+    return {"user_id": user_id, "company_ids": company_ids}
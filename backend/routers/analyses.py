@@ -1,47 +1,290 @@
-from fastapi import APIRouter, HTTPException, Depends
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_read_db, write_queue
+from feed import feed_hub
 from models import Analysis
+from pagination import fetch_page, page_params
+from principals import Principal
+from routers.auth import get_viewer
+import access
+import export
+import pricestore
+import rollups
 import schemas
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Bulk ingest: rows are validated and inserted this many at a time, one transaction per chunk
+BULK_CHUNK_SIZE = 5000
+MAX_BULK_CHUNK_SIZE = 50000
+MAX_ERRORS_PER_CHUNK = 20
+
+# Shared filter parameters for listing and exporting analyses
+def analysis_filters(
+    company_id: Optional[int] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    signal: Optional[Literal['BUY', 'SELL', 'HOLD', 'STRONG_BUY', 'STRONG_SELL']] = None,
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db),
+) -> tuple:
+    filters = list(access.company_filter(db, viewer, Analysis.company_id))
+    if company_id is not None:
+        filters.append(Analysis.company_id == company_id)
+    if date_from is not None:
+        filters.append(Analysis.date >= date_from)
+    if date_to is not None:
+        filters.append(Analysis.date <= date_to)
+    if signal is not None:
+        filters.append(Analysis.signal == signal)
+    return tuple(filters)
 
 @router.get("/", response_model=list[schemas.Analysis])
-async def list_analyses(db: Session = Depends(get_db)):
-    analyses = db.query(Analysis).all()
-    return analyses
+def list_analyses(
+    filters: tuple = Depends(analysis_filters),
+    order: Literal["id", "company_date"] = "id",
+    page: dict = Depends(page_params),
+    db: Session = Depends(get_read_db)
+):
+    # (company_id, date) ordering keeps id as a tie breaker so the cursor is unique
+    key = ("id",) if order == "id" else ("company_id", "date", "id")
+    return fetch_page(db, Analysis, schemas.Analysis, page, filters=filters, key=key)
 
-@router.post("/", response_model=schemas.Analysis, status_code=201)
-async def create_analysis(analysis: schemas.AnalysisCreate, db: Session = Depends(get_db)):
-    db_analysis = Analysis(
-        company_id=analysis.company_id,
-        date=analysis.date,
-        open_price=analysis.open_price,
-        close_price=analysis.close_price,
-        high_price=analysis.high_price,
-        low_price=analysis.low_price,
-        volume=analysis.volume,
-        predicted_high=analysis.predicted_high,
-        predicted_low=analysis.predicted_low,
-        predicted_open=analysis.predicted_open,  # ← ADD THIS
-        predicted_close=analysis.predicted_close,
-        signal=analysis.signal,
-        confidence_score=analysis.confidence_score
+# Declared before /{analysis_id} so "export" is not parsed as an id
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in export.MEDIA_TYPES.values()}}},
+)
+def export_analyses(
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    filters: tuple = Depends(analysis_filters),
+):
+    return StreamingResponse(
+        export.stream(format, filters),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="analyses.{format}"'},
     )
-    db.add(db_analysis)
-    db.commit()
-    db.refresh(db_analysis)
+
+@router.post("/", response_model=schemas.Analysis, status_code=201)
+def create_analysis(analysis: schemas.AnalysisCreate):
+    def insert_analysis(session: Session):
+        db_analysis = Analysis(
+            company_id=analysis.company_id,
+            date=analysis.date,
+            open_price=analysis.open_price,
+            close_price=analysis.close_price,
+            high_price=analysis.high_price,
+            low_price=analysis.low_price,
+            volume=analysis.volume,
+            predicted_high=analysis.predicted_high,
+            predicted_low=analysis.predicted_low,
+            predicted_open=analysis.predicted_open,
+            predicted_close=analysis.predicted_close,
+            signal=analysis.signal,
+            confidence_score=analysis.confidence_score
+        )
+        session.add(db_analysis)
+        session.flush()
+        rollups.upsert_latest(session, [db_analysis])
+        return db_analysis
+
+    # Single-row inserts go through the shared writer so concurrent requests
+    # are committed together instead of one fsync each
+    try:
+        db_analysis = write_queue.run(insert_analysis)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Analysis for this company and date already exists")
+    pricestore.invalidate(analysis.company_id)
+    feed_hub.publish([db_analysis])
     return db_analysis
 
+async def _iter_lines(request: Request):
+    # Split the raw body stream into lines without buffering the whole upload
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def _iter_records(request: Request, fmt: str):
+    # Yields (line_number, record) where record is a dict or an error message
+    header = None
+    line_number = 0
+    async for raw in _iter_lines(request):
+        line_number += 1
+        try:
+            text = raw.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            yield line_number, "Line is not valid UTF-8"
+            continue
+        if not text:
+            continue
+
+        if fmt == "csv":
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                yield line_number, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            # Empty cells fall back to the schema defaults
+            yield line_number, {k: v for k, v in zip(header, values) if v != ""}
+        else:
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, "Expected a JSON object"
+                continue
+            yield line_number, record
+
+
+def _existing_bars(db: Session, rows: list) -> set:
+    # One indexed lookup for every (company_id, date) the chunk would insert
+    company_ids = {row["company_id"] for row in rows}
+    dates = [row["date"] for row in rows]
+    existing = db.query(Analysis.company_id, Analysis.date).filter(
+        Analysis.company_id.in_(company_ids),
+        Analysis.date.between(min(dates), max(dates))
+    )
+    return {(company_id, date) for company_id, date in existing}
+
+
+def _write_chunk(db: Session, index: int, chunk: list) -> schemas.BulkChunkResult:
+    validated = []
+    errors = []
+    for line_number, record in chunk:
+        if isinstance(record, str):
+            errors.append(schemas.BulkRowError(line=line_number, error=record))
+            continue
+        try:
+            validated.append((line_number, schemas.AnalysisCreate(**record).model_dump()))
+        except ValidationError as e:
+            errors.append(schemas.BulkRowError(line=line_number, error=str(e)))
+
+    rows = []
+    seen = _existing_bars(db, [row for _, row in validated]) if validated else set()
+    for line_number, row in validated:
+        bar = (row["company_id"], row["date"])
+        if bar in seen:
+            errors.append(schemas.BulkRowError(line=line_number, error="Duplicate bar for company_id and date"))
+            continue
+        seen.add(bar)
+        rows.append(row)
+
+    accepted = len(rows)
+    if rows:
+        try:
+            # One executemany INSERT per chunk, committed as a single transaction
+            if feed_hub.wanted():
+                # Feed subscribers need the generated keys, so only then pay for RETURNING
+                inserted = db.execute(
+                    insert(Analysis).returning(Analysis.id, Analysis.created_at, sort_by_parameter_order=True), rows
+                ).all()
+                published = [{**row, "id": id_, "created_at": created_at} for row, (id_, created_at) in zip(rows, inserted)]
+            else:
+                db.execute(insert(Analysis), rows)
+                published = []
+            company_ids = {row["company_id"] for row in rows}
+            rollups.refresh_latest(db, company_ids)
+            db.commit()
+            pricestore.invalidate(*{row["company_id"] for row in rows})
+            feed_hub.publish(published)
+        except SQLAlchemyError as e:
+            db.rollback()
+            errors.append(schemas.BulkRowError(line=chunk[0][0], error=f"Chunk rolled back: {e}"))
+            accepted = 0
+
+    return schemas.BulkChunkResult(
+        chunk=index,
+        accepted=accepted,
+        rejected=len(chunk) - accepted,
+        errors=errors[:MAX_ERRORS_PER_CHUNK]
+    )
+
+@router.post(
+    "/bulk",
+    response_model=schemas.BulkIngestResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def bulk_create_analyses(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=MAX_BULK_CHUNK_SIZE),
+    db: Session = Depends(get_db)
+):
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+
+    started = time.perf_counter()
+    chunks = []
+    pending = []
+    # Parsing stays on the event loop; each chunk's DB work runs in the threadpool
+    async for item in _iter_records(request, format):
+        pending.append(item)
+        if len(pending) >= chunk_size:
+            chunks.append(await run_in_threadpool(_write_chunk, db, len(chunks), pending))
+            pending = []
+    if pending:
+        chunks.append(await run_in_threadpool(_write_chunk, db, len(chunks), pending))
+
+    elapsed = time.perf_counter() - started
+    accepted = sum(c.accepted for c in chunks)
+    rows_per_second = accepted / elapsed if elapsed > 0 else 0.0
+    logger.info("bulk ingest: %d rows accepted in %.3fs (%.0f rows/s)", accepted, elapsed, rows_per_second)
+
+    return schemas.BulkIngestResult(
+        format=format,
+        accepted=accepted,
+        rejected=sum(c.rejected for c in chunks),
+        chunks=chunks,
+        elapsed_seconds=elapsed,
+        rows_per_second=rows_per_second
+    )
+
 @router.get("/{analysis_id}", response_model=schemas.Analysis)
-async def get_analysis(analysis_id: int, db: Session = Depends(get_db)):
+def get_analysis(
+    analysis_id: int,
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
     analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
-    if not analysis:
+    allowed = access.allowed_company_ids(db, viewer)
+    if not analysis or (allowed is not None and analysis.company_id not in allowed):
         raise HTTPException(status_code=404, detail="Analysis not found")
     return analysis
 
 @router.put("/{analysis_id}")
-async def update_analysis(analysis_id: int, analysis_data: schemas.AnalysisUpdate, db: Session = Depends(get_db)):
+def update_analysis(analysis_id: int, analysis_data: schemas.AnalysisUpdate, db: Session = Depends(get_db)):
     analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
@@ -51,14 +294,22 @@ async def update_analysis(analysis_id: int, analysis_data: schemas.AnalysisUpdat
     analysis.signal = analysis_data.signal
     analysis.confidence_score = analysis_data.confidence_score
     
+    db.flush()
+    rollups.upsert_latest(db, [analysis])
     db.commit()
+    pricestore.invalidate(analysis.company_id)
+    feed_hub.publish([analysis], op="updated")
     return {"message": "Analysis updated"}
 
 @router.delete("/{analysis_id}", status_code=204)
-async def delete_analysis(analysis_id: int, db: Session = Depends(get_db)):
+def delete_analysis(analysis_id: int, db: Session = Depends(get_db)):
     analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
+    company_id = analysis.company_id
     db.delete(analysis)
+    db.flush()
+    rollups.refresh_latest(db, [company_id])
     db.commit()
+    pricestore.invalidate(company_id)
@@ -1,34 +1,52 @@
+import logging
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_read_db
+from hashing import hashing_pool
+import access
 from models import User
+from principals import Principal, principal_cache
 import schemas
 from datetime import datetime, timedelta
 import jwt
 from jwt import PyJWTError as JWTError
-from passlib.context import CryptContext
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # JWT settings
 SECRET_KEY = "your-secret-key-here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
+# Blocking helpers for scripts and sync routes; hashing runs in the bounded
+# process pool and raises 503 when it is saturated
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing_pool.verify_and_update(plain_password, hashed_password)[0]
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hashing_pool.hash(password)
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+# Async so that a login waiting on the hashing pool holds no threadpool slot;
+# the database calls themselves still run in the threadpool
+async def authenticate_user(db: Session, username: str, password: str):
+    user = await run_in_threadpool(db.query(User).filter(User.username == username).first)
+    if not user:
+        return False
+    valid, new_hash = await hashing_pool.verify_and_update_async(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Stored hash used outdated parameters; upgrade it while we have the password
+        user.hashed_password = new_hash
+        await run_in_threadpool(db.commit)
+        await run_in_threadpool(db.refresh, user)
     return user
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -41,9 +59,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    print(f"🛑🛑🛑 TOKEN RECEIVED: {token}")  # ← THIS WILL SHOW IF TOKEN ARRIVES
-    
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -51,36 +67,53 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
     
     if not token:
-        print("🛑🛑🛑 NO TOKEN RECEIVED!")
         raise credentials_exception
         
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"🛑🛑🛑 DECODED PAYLOAD: {payload}")  # ← THIS SHOWS DECODING
         username: str = payload.get("sub")
-        role: str = payload.get("role")
+        version: int = payload.get("ver", 0)
         if username is None:
             raise credentials_exception
     except JWTError as e:
-        print(f"🛑🛑🛑 JWT ERROR: {e}")  # ← THIS SHOWS DECODE ERRORS
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.username == username).first()
-    print(f"🛑🛑🛑 USER FOUND: {user}")  # ← THIS SHOWS USER SEARCH
-    if user is None:
+        # Guarded so the message is never formatted when debug logging is off
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("rejected token: %s", e)
         raise credentials_exception
     
-    return user
+    principal = principal_cache.get(username, version)
+    if principal is None:
+        user = db.query(User).filter(User.username == username).first()
+        # A bumped token_version (password or role change) revokes older tokens
+        if user is None or user.token_version != version:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("no current user for subject %s version %s", username, version)
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        principal_cache.put(principal)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("authenticated %s (%s)", principal.username, principal.role)
+    return principal
     
 
 
+# Company and analysis reads: with the company ACL on they need a user, whose grants scope the rows
+def get_viewer(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_read_db)
+) -> Optional[Principal]:
+    if not access.ENABLED:
+        return None
+    return get_current_user(token, db)
+
 # Funkcijos rolėms patikrinti
-async def get_current_admin(current_user: User = Depends(get_current_user)):
+def get_current_admin(current_user: Principal = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
-async def get_current_member(current_user: User = Depends(get_current_user)):
+def get_current_member(current_user: Principal = Depends(get_current_user)):
     if current_user.role not in ["member", "admin"]:
         raise HTTPException(status_code=403, detail="Authentication required")
     return current_user
@@ -88,9 +121,9 @@ async def get_current_member(current_user: User = Depends(get_current_user)):
 @router.post("/register", response_model=schemas.User)
 async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # Check if user exists
-    db_user = db.query(User).filter(
+    db_user = await run_in_threadpool(db.query(User).filter(
         (User.username == user.username) | (User.email == user.email)
-    ).first()
+    ).first)
     if db_user:
         raise HTTPException(status_code=400, detail="Username or email already registered")
     
@@ -99,7 +132,7 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=422, detail="All fields are required")
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hashing_pool.hash_async(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -107,13 +140,13 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         role="member"
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await run_in_threadpool(db.commit)
+    await run_in_threadpool(db.refresh, db_user)
     return db_user
 
 @router.post("/login")
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -121,7 +154,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role}, expires_delta=access_token_expires
+        data={"sub": user.username, "role": user.role, "ver": user.token_version}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
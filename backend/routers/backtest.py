@@ -0,0 +1,18 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from principals import Principal
+from routers.auth import get_current_admin
+import backtest
+import schemas
+
+router = APIRouter()
+
+# Plain def: the backtest blocks on the process pool, so it runs in the threadpool
+@router.get("/", response_model=schemas.BacktestResult)
+def run_backtest(
+    sector_id: Optional[int] = None,
+    workers: Optional[int] = Query(None, ge=1, le=64),
+    include_equity: bool = False,
+    current_user: Principal = Depends(get_current_admin)
+):
+    return backtest.run_backtest(sector_id=sector_id, workers=workers, include_equity=include_equity)
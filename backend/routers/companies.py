@@ -1,59 +1,312 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Company
+from datetime import datetime
+from typing import Literal, Optional
+import numpy as np
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from sqlalchemy import DateTime, and_, delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from database import get_db, get_read_db
+from models import Analysis, AnalysisMonthly, AnalysisWeekly, Company, UserCompanyAccess
+from pagination import fetch_page, page_params
+from principals import Principal
+from responsecache import response_cache
+from routers.auth import get_viewer
+from symbolindex import symbol_index
+import access
+import fundamentals
+import indicators
+import pricestore
+import rollups
 import schemas
 
 router = APIRouter()
 
+MAX_BATCH_COMPANIES = 500
+MAX_SEARCH_RESULTS = 50
+
 @router.get("/", response_model=list[schemas.Company])
-async def list_companies(db: Session = Depends(get_db)):
-    companies = db.query(Company).all()
-    return companies
+def list_companies(
+    request: Request,
+    sector_id: Optional[int] = None,
+    symbols: Optional[str] = Query(None, description="Comma separated symbols, e.g. AAPL,MSFT"),
+    page: dict = Depends(page_params),
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    filters = () if sector_id is None else (Company.sector_id == sector_id,)
+    if symbols is not None:
+        wanted = list(dict.fromkeys(s.strip() for s in symbols.split(",") if s.strip()))
+        if not wanted or len(wanted) > MAX_BATCH_COMPANIES:
+            raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_BATCH_COMPANIES} symbols are required")
+        filters += (Company.symbol.in_(wanted),)
+        # Symbols are unique, so a page as large as the list returns every match at once
+        page = {**page, "limit": max(page["limit"], len(wanted))}
+    filters += access.company_filter(db, viewer, Company.id)
+    return response_cache.respond(
+        request, ("companies", *access.scope(viewer)), list[schemas.Company],
+        lambda response: fetch_page(db, Company, schemas.Company, page, filters=filters),
+    )
+
+def _company_indicators(db: Session, company_id: int, requested: list, limit: Optional[int]) -> dict:
+    bars = pricestore.load(db, company_id)
+    start = 0 if limit is None else max(0, bars.shape[1] - limit)
+    values = {}
+    for name, kind, period in requested:
+        for key, column in indicators.compute(company_id, bars, name, kind, period).items():
+            values[key] = indicators.to_json(column[start:])
+    return {
+        "company_id": company_id,
+        "dates": bars[pricestore.DATE, start:].astype("datetime64[s]").tolist(),
+        "indicators": values,
+    }
+
+# Declared before /{company_id} so "indicators" is not parsed as an id
+@router.get("/indicators", response_model=list[schemas.CompanyIndicators])
+def get_companies_indicators(
+    ids: str = Query(..., description="Comma separated company ids"),
+    names: str = Query(..., description="Comma separated indicators, e.g. rsi14,ema20,macd"),
+    limit: Optional[int] = Query(None, ge=1, description="Only return the last N points"),
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    try:
+        company_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma separated integers")
+    if not company_ids or len(company_ids) > MAX_BATCH_COMPANIES:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_BATCH_COMPANIES} ids are required")
+    requested = indicators.parse_names(names)
+
+    found = {cid for (cid,) in db.query(Company.id).filter(Company.id.in_(company_ids))}
+    allowed = access.allowed_company_ids(db, viewer)
+    missing = [cid for cid in company_ids if cid not in found or (allowed is not None and cid not in allowed)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Companies not found: {missing}")
+
+    return [_company_indicators(db, cid, requested, limit) for cid in company_ids]
+
+# Declared before /{company_id} so "search" is not parsed as an id
+@router.get("/search", response_model=list[schemas.CompanySearchResult])
+def search_companies(
+    q: str = Query(..., min_length=1, description="Prefix of a symbol or of a word in the company name"),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS),
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    symbol_index.ensure_loaded(db)
+    return symbol_index.search(q, limit, allowed=access.allowed_company_ids(db, viewer))
+
+@router.get("/by-symbol/{symbol}", response_model=schemas.Company)
+def get_company_by_symbol(
+    symbol: str,
+    request: Request,
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    def load(response):
+        company = db.query(Company).filter(Company.symbol == symbol).first()
+        if not company:
+            raise HTTPException(status_code=404, detail="Company not found")
+        access.require_company(db, viewer, company.id)
+        return company
+    return response_cache.respond(request, ("companies", *access.scope(viewer)), schemas.Company, load)
 
 @router.post("/", response_model=schemas.Company, status_code=201)
-async def create_company(company: schemas.CompanyCreate, db: Session = Depends(get_db)):
-    db_company = Company(
-        sector_id=company.sector_id,
-        symbol=company.symbol,
-        company_name=company.company_name,
-        market_cap=company.market_cap,
-        pe_ratio=company.pe_ratio,
-        revenue=company.revenue
-    )
+def create_company(company: schemas.CompanyCreate, db: Session = Depends(get_db)):
+    db_company = Company(**company.model_dump())
     db.add(db_company)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Company with symbol {company.symbol} already exists")
+    rollups.apply_company_changes(db, {}, rollups.company_snapshot(db, [db_company.id]))
     db.commit()
     db.refresh(db_company)
+    response_cache.invalidate("companies")
+    symbol_index.add(db_company.id, db_company.symbol, db_company.company_name, db_company.sector_id)
     return db_company
 
 @router.get("/{company_id}", response_model=schemas.Company)
-async def get_company(company_id: int, db: Session = Depends(get_db)):
-    company = db.query(Company).filter(Company.id == company_id).first()
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    return company
+def get_company(
+    company_id: int,
+    request: Request,
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    access.require_company(db, viewer, company_id)
+
+    def load(response):
+        company = db.query(Company).filter(Company.id == company_id).first()
+        if not company:
+            raise HTTPException(status_code=404, detail="Company not found")
+        return company
+    return response_cache.respond(request, (f"company:{company_id}",), schemas.Company, load)
+
+# Declared before /{company_id} so "batch" is not parsed as an id
+@router.put("/batch", response_model=schemas.FundamentalsBatchResult)
+def update_companies_batch(
+    snapshot: list[schemas.CompanyFundamentals],
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    result, written_ids = fundamentals.apply_snapshot(db, snapshot, dry_run=dry_run)
+    if dry_run:
+        db.rollback()
+        return result
+    db.commit()
+    if written_ids:
+        response_cache.invalidate("companies", *[f"company:{company_id}" for company_id in written_ids])
+        symbol_index.refresh(db, written_ids)
+    return result
 
 @router.put("/{company_id}")
-async def update_company(company_id: int, company_data: schemas.CompanyUpdate, db: Session = Depends(get_db)):
+def update_company(company_id: int, company_data: schemas.CompanyUpdate, db: Session = Depends(get_db)):
     company = db.query(Company).filter(Company.id == company_id).first()
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
     
-    # Update fields
+    before = rollups.company_snapshot(db, [company_id])
+    company.sector_id = company_data.sector_id
     company.symbol = company_data.symbol
     company.company_name = company_data.company_name
     company.market_cap = company_data.market_cap
-    # ... update other fields
-    
+    company.pe_ratio = company_data.pe_ratio
+    company.revenue = company_data.revenue
+    company.last_updated = datetime.now()
+
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Company with symbol {company_data.symbol} already exists")
+    rollups.apply_company_changes(db, before, rollups.company_snapshot(db, [company_id]))
     db.commit()
+    response_cache.invalidate("companies", f"company:{company_id}")
+    symbol_index.add(company_id, company_data.symbol, company_data.company_name, company_data.sector_id)
     return {"message": "Company updated"}
 
 @router.delete("/{company_id}")
-async def delete_company(company_id: int, db: Session = Depends(get_db)):
+def delete_company(company_id: int, db: Session = Depends(get_db)):
     company = db.query(Company).filter(Company.id == company_id).first()
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
     
+    before = rollups.company_snapshot(db, [company_id])
+    # Bars go first: deleting the company alone would leave them with a NULL company_id
+    for tier in (Analysis, AnalysisWeekly, AnalysisMonthly, UserCompanyAccess):
+        db.execute(delete(tier).where(tier.company_id == company_id))
     db.delete(company)
+    db.flush()
+    rollups.refresh_latest(db, [company_id])
+    rollups.apply_company_changes(db, before, {})
     db.commit()
-    return {"message": "Company deleted"}
\ No newline at end of file
+    pricestore.invalidate(company_id)
+    response_cache.invalidate("companies", f"company:{company_id}")
+    symbol_index.remove(company_id)
+    return {"message": "Company deleted"}
+
+def _period_start(column, interval: str, dialect: str):
+    # Start of the daily/weekly/monthly bucket a bar belongs to
+    if dialect == "sqlite":
+        if interval == "day":
+            return func.date(column, type_=DateTime)
+        if interval == "week":
+            # Next Sunday (or today), minus six days = Monday of the ISO week
+            return func.date(column, "weekday 0", "-6 days", type_=DateTime)
+        return func.date(column, "start of month", type_=DateTime)
+    return func.date_trunc(interval, column, type_=DateTime)
+
+def _history_from_sql(db: Session, company_id: int, date_from, date_to, interval: str) -> list[dict]:
+    # Every filter hits the (company_id, date) index as a range scan
+    filters = [Analysis.company_id == company_id]
+    if date_from is not None:
+        filters.append(Analysis.date >= date_from)
+    if date_to is not None:
+        filters.append(Analysis.date <= date_to)
+
+    period = _period_start(Analysis.date, interval, db.bind.dialect.name).label("period")
+    buckets = (
+        select(
+            period,
+            func.min(Analysis.date).label("first_date"),
+            func.max(Analysis.date).label("last_date"),
+            func.max(Analysis.high_price).label("high_price"),
+            func.min(Analysis.low_price).label("low_price"),
+            func.sum(Analysis.volume).label("volume"),
+        )
+        .where(*filters)
+        .group_by(period)
+        .subquery()
+    )
+
+    # Open comes from the first bar of each bucket and close from the last one;
+    # the unique (company_id, date) index makes both lookups single-row seeks
+    first_bar = aliased(Analysis)
+    last_bar = aliased(Analysis)
+    query = (
+        select(
+            buckets.c.period.label("date"),
+            first_bar.open_price,
+            buckets.c.high_price,
+            buckets.c.low_price,
+            last_bar.close_price,
+            buckets.c.volume,
+        )
+        .select_from(buckets)
+        .join(first_bar, and_(first_bar.company_id == company_id, first_bar.date == buckets.c.first_date))
+        .join(last_bar, and_(last_bar.company_id == company_id, last_bar.date == buckets.c.last_date))
+        .order_by(buckets.c.period)
+    )
+    return [row._asdict() for row in db.execute(query)]
+
+@router.get(
+    "/{company_id}/history",
+    response_model=list[schemas.PriceBar],
+    responses={200: {"content": {pricestore.BINARY_MEDIA_TYPE: {}}}},
+)
+def get_company_history(
+    company_id: int,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    interval: Literal["day", "week", "month"] = "day",
+    format: Literal["json", "binary"] = "json",
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    access.require_company(db, viewer, company_id)
+    if not db.query(Company.id).filter(Company.id == company_id).first():
+        raise HTTPException(status_code=404, detail="Company not found")
+
+    if pricestore.ENABLED:
+        bars = pricestore.resample(pricestore.window(pricestore.load(db, company_id), date_from, date_to), interval)
+        rolled = pricestore.load(db, company_id, tier="rolled")
+    else:
+        records = _history_from_sql(db, company_id, date_from, date_to, interval)
+        bars = pricestore.from_records([[r[name] for name in pricestore.COLUMNS] for r in records])
+        rolled = pricestore.query(db, company_id, tier="rolled")
+
+    # Weekly/monthly aggregates of bars retention.py removed precede the raw bars;
+    # the period straddling the boundary is merged by resampling again
+    rolled = pricestore.window(rolled, date_from, date_to)
+    if rolled.shape[1]:
+        bars = pricestore.resample(np.concatenate([rolled, bars], axis=1), interval)
+
+    if format == "binary":
+        return Response(pricestore.to_binary(bars), media_type=pricestore.BINARY_MEDIA_TYPE)
+    return pricestore.to_records(bars)
+
+
+@router.get("/{company_id}/indicators", response_model=schemas.CompanyIndicators)
+def get_company_indicators(
+    company_id: int,
+    names: str = Query(..., description="Comma separated indicators, e.g. rsi14,ema20,macd"),
+    limit: Optional[int] = Query(None, ge=1, description="Only return the last N points"),
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    requested = indicators.parse_names(names)
+    access.require_company(db, viewer, company_id)
+    if not db.query(Company.id).filter(Company.id == company_id).first():
+        raise HTTPException(status_code=404, detail="Company not found")
+    return _company_indicators(db, company_id, requested, limit)
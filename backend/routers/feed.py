@@ -0,0 +1,128 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocketState
+import access
+from database import ReadSessionLocal
+from feed import feed_hub, parse_topics
+from routers.auth import get_current_user
+
+router = APIRouter()
+
+
+def _token(connection, access_token: Optional[str]) -> Optional[str]:
+    # Browsers cannot set headers on EventSource or WebSocket, hence the query parameter
+    if access_token:
+        return access_token
+    scheme, _, credentials = connection.headers.get("authorization", "").partition(" ")
+    return credentials if scheme.lower() == "bearer" and credentials else None
+
+
+def _viewer(token: Optional[str]) -> tuple:
+    """(user id, allowed company ids) of the subscriber; (None, None) when unrestricted."""
+    if not access.ENABLED:
+        return None, None
+    with ReadSessionLocal() as db:
+        principal = get_current_user(token, db)
+        return principal.id, access.allowed_company_ids(db, principal)
+
+
+async def _subscribe(company_ids: Optional[str], sector_ids: Optional[str], signals: Optional[str],
+                     token: Optional[str]):
+    try:
+        topics = parse_topics(company_ids, sector_ids, signals)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    user_id, allowed = await run_in_threadpool(_viewer, token)
+    try:
+        return feed_hub.subscribe(topics, user_id=user_id, allowed=allowed)
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/sse")
+async def feed_sse(request: Request, company_ids: Optional[str] = None, sector_ids: Optional[str] = None,
+                   signals: Optional[str] = None, access_token: Optional[str] = None):
+    """Server-Sent Events stream of new and updated analyses matching any of the filters."""
+    subscriber = await _subscribe(company_ids, sector_ids, signals, _token(request, access_token))
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                frames = await subscriber.next()
+                if frames is None:
+                    break
+                # A comment line keeps proxies from closing an idle stream
+                yield b"".join(frame.sse for frame in frames) if frames else b": keepalive\n\n"
+        finally:
+            feed_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def feed_ws(websocket: WebSocket, company_ids: Optional[str] = None, sector_ids: Optional[str] = None,
+                  signals: Optional[str] = None, access_token: Optional[str] = None):
+    """WebSocket stream of analyses. Send {"action": "subscribe" | "unsubscribe",
+    "company_ids": [...], "sector_ids": [...], "signals": [...]} to change the filters."""
+    try:
+        subscriber = await _subscribe(company_ids, sector_ids, signals, _token(websocket, access_token))
+    except HTTPException as e:
+        await websocket.close(code=1013 if e.status_code == 503 else 1008, reason=e.detail)
+        return
+    await websocket.accept()
+
+    async def receive():
+        try:
+            while True:
+                try:
+                    message = await websocket.receive_json()
+                except (ValueError, TypeError):
+                    # Not JSON (or a binary frame): answer like a bad action and keep the subscription
+                    await websocket.send_json({"type": "error", "detail": "messages must be JSON text"})
+                    continue
+                action = message.get("action") if isinstance(message, dict) else None
+                try:
+                    if action not in ("subscribe", "unsubscribe"):
+                        raise ValueError("action must be subscribe or unsubscribe")
+                    topics = parse_topics(*(
+                        ",".join(str(v) for v in message.get(key) or ())
+                        for key in ("company_ids", "sector_ids", "signals")
+                    ))
+                    if action == "subscribe":
+                        feed_hub.update(subscriber, add=topics)
+                    else:
+                        feed_hub.update(subscriber, remove=topics)
+                except (ValueError, TypeError) as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                    continue
+                await websocket.send_json({"type": action + "d", "topics": sorted(subscriber.topics)})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            subscriber.close()
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            frames = await subscriber.next()
+            if frames is None:
+                # The receiver is still running when the hub (shutdown or changed grants) closed the
+                # subscriber rather than the client: ask it to reconnect
+                if not receiver.done() and websocket.client_state == WebSocketState.CONNECTED:
+                    await websocket.close(code=1012)
+                break
+            for frame in frames:
+                await websocket.send_text(frame.text)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        feed_hub.unsubscribe(subscriber)
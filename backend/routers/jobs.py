@@ -0,0 +1,75 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from database import get_db, get_read_db
+from models import Job
+from pagination import fetch_page, page_params
+from principals import Principal
+from routers.auth import get_current_admin
+import jobs
+import schemas
+
+router = APIRouter()
+
+JobStatus = Literal['queued', 'running', 'succeeded', 'failed', 'cancelled']
+
+@router.post("/", response_model=schemas.Job, status_code=202)
+def create_job(
+    job: schemas.JobCreate,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    try:
+        return jobs.submit(db, job.kind, job.params, job.max_attempts, created_by=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/", response_model=list[schemas.Job])
+def list_jobs(
+    status: Optional[JobStatus] = None,
+    kind: Optional[str] = None,
+    page: dict = Depends(page_params),
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_read_db)
+):
+    filters = []
+    if status is not None:
+        filters.append(Job.status == status)
+    if kind is not None:
+        filters.append(Job.kind == kind)
+    return fetch_page(db, Job, schemas.Job, page, filters=tuple(filters))
+
+@router.get("/{job_id}", response_model=schemas.Job)
+def get_job(
+    job_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_read_db)
+):
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# A running job stops at its next progress report; finished jobs are returned unchanged
+@router.post("/{job_id}/cancel", response_model=schemas.Job)
+def cancel_job(
+    job_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    job = jobs.cancel(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/{job_id}/retry", response_model=schemas.Job)
+def retry_job(
+    job_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    if not jobs.retry(db, job_id):
+        if db.get(Job, job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        raise HTTPException(status_code=409, detail="Only failed or cancelled jobs can be retried")
+    return db.get(Job, job_id)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from access import access_cache
+from feed import feed_hub
+from hashing import hashing_pool
+from jobs import job_pool
+from metrics import registry
+from responsecache import response_cache
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    extra = {
+        "access_cache": access_cache.stats(),
+        "feed": feed_hub.stats(),
+        "hashing_pool": hashing_pool.stats(),
+        "job_pool": job_pool.stats(),
+        "response_cache": response_cache.stats(),
+    }
+    return PlainTextResponse(registry.render(extra), media_type="text/plain; version=0.0.4")
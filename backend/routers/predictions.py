@@ -0,0 +1,18 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from principals import Principal
+from routers.auth import get_current_admin
+import predict
+import schemas
+
+router = APIRouter()
+
+# Plain def: the run blocks on the process pool, so it runs in the threadpool
+@router.post("/run", response_model=schemas.PredictionRunResult)
+def run_predictions(
+    full: bool = False,
+    sector_id: Optional[int] = None,
+    workers: Optional[int] = Query(None, ge=1, le=64),
+    current_user: Principal = Depends(get_current_admin)
+):
+    return predict.run_predictions(full=full, sector_id=sector_id, workers=workers)
@@ -1,40 +1,143 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
-from sqlalchemy.orm import Session
-from database import get_db
+from typing import Optional, Union
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session, aliased, selectinload
+from database import get_db, get_read_db
 from models import Sector
 import schemas
-from models import Company, User
-from routers.auth import oauth2_scheme, get_current_user, get_current_admin
+from models import Analysis, Company, SectorStats
+from principals import Principal
+from pagination import fetch_page, page_params
+from responsecache import response_cache
+import rollups
+from routers.auth import oauth2_scheme, get_current_user, get_current_admin, get_viewer
+import access
 
 
 router = APIRouter()
 
+INCLUDES = ("companies", "analyses")
+DEFAULT_ANALYSES_WINDOW = 20
+MAX_ANALYSES_WINDOW = 500
+
+def _parse_include(include: Optional[str]) -> set:
+    requested = {name.strip() for name in (include or "").split(",") if name.strip()}
+    unknown = requested - set(INCLUDES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    # Analyses are nested under companies
+    if "analyses" in requested:
+        requested.add("companies")
+    return requested
+
+def _recent_analysis_ids(sector_id: int, window: int):
+    # Ids of the newest `window` analyses of every company in the sector. Per
+    # company, the cutoff date is the oldest of its `window` newest bars: one
+    # seek of at most `window` rows on ux_analyses_company_date, then a range
+    # read from that date on, so the cost does not grow with older history
+    newest = aliased(Analysis)
+    recent = (
+        select(newest.date)
+        .where(newest.company_id == Company.id)
+        .order_by(newest.date.desc())
+        .limit(window)
+        .correlate(Company)
+        .subquery()
+    )
+    cutoff = select(func.min(recent.c.date)).correlate(Company).scalar_subquery()
+    return (
+        select(Analysis.id)
+        .select_from(Company)
+        .join(Analysis, and_(Analysis.company_id == Company.id, Analysis.date >= cutoff))
+        .where(Company.sector_id == sector_id)
+    )
+
+def _company_in_sector(db: Session, sector_id: int, company_id: int) -> Company:
+    # Sector and company existence in one query: no row means no sector, a NULL company means not in it
+    row = (
+        db.query(Sector.id, Company)
+        .outerjoin(Company, and_(Company.id == company_id, Company.sector_id == Sector.id))
+        .filter(Sector.id == sector_id)
+        .first()
+    )
+    if row is None:
+        raise HTTPException(status_code=404, detail="Sector not found")
+    if row.Company is None:
+        raise HTTPException(status_code=404, detail="Company not found in this sector")
+    return row.Company
+
 @router.get("/", response_model=list[schemas.Sector])
-async def list_sectors(db: Session = Depends(get_db)):
-    sectors = db.query(Sector).all()
-    return sectors
+def list_sectors(
+    request: Request,
+    page: dict = Depends(page_params),
+    db: Session = Depends(get_read_db)
+):
+    return response_cache.respond(
+        request, ("sectors",), list[schemas.Sector],
+        lambda response: fetch_page(db, Sector, schemas.Sector, page),
+    )
 
 @router.post("/", response_model=schemas.Sector, status_code=201)
-async def create_sector(
+def create_sector(
     sector: schemas.SectorCreate,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     db_sector = Sector(name=sector.name, description=sector.description)
     db.add(db_sector)
+    db.flush()
+    rollups.refresh_sectors(db, [db_sector.id])
     db.commit()
     db.refresh(db_sector)
+    response_cache.invalidate("sectors")
     return db_sector
 
-@router.get("/{sector_id}", response_model=schemas.Sector)
-async def get_sector(sector_id: int, db: Session = Depends(get_db)):
-    sector = db.query(Sector).filter(Sector.id == sector_id).first()
-    if not sector:
-        raise HTTPException(status_code=404, detail="Sector not found")
-    return sector
+# Declared before /{sector_id} so "stats" is not parsed as an id
+@router.get("/stats", response_model=list[schemas.SectorStats])
+def list_sector_stats(db: Session = Depends(get_read_db)):
+    return db.query(SectorStats).order_by(SectorStats.sector_id).all()
+
+@router.get("/{sector_id}", response_model=Union[schemas.SectorWithAnalyses, schemas.SectorWithCompanies, schemas.Sector])
+def get_sector(
+    sector_id: int,
+    request: Request,
+    include: Optional[str] = Query(None, description="Comma separated expansions: companies, analyses"),
+    analyses_limit: int = Query(DEFAULT_ANALYSES_WINDOW, ge=1, le=MAX_ANALYSES_WINDOW, description="Newest analyses per company"),
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    included = _parse_include(include)
+    # One extra SELECT ... IN per expanded level, however many companies the sector has
+    query = db.query(Sector).filter(Sector.id == sector_id)
+    schema = schemas.Sector
+    if "companies" in included:
+        visible = access.company_filter(db, viewer, Company.id)
+        loader = selectinload(Sector.companies.and_(*visible) if visible else Sector.companies)
+        schema = schemas.SectorWithCompanies
+        if "analyses" in included:
+            loader = loader.selectinload(
+                Company.analyses.and_(Analysis.id.in_(_recent_analysis_ids(sector_id, analyses_limit)))
+            )
+            schema = schemas.SectorWithAnalyses
+        query = query.options(loader)
+
+    def load(response):
+        sector = query.first()
+        if not sector:
+            raise HTTPException(status_code=404, detail="Sector not found")
+        return sector
+
+    if "analyses" in included:
+        # Analyses change far more often than reference data; not worth caching
+        sector = load(None)
+        return schema.model_validate(sector)
+    depends_on = (f"sector:{sector_id}",)
+    if "companies" in included:
+        depends_on += ("companies", *access.scope(viewer))
+    return response_cache.respond(request, depends_on, schema, load)
 
 @router.put("/{sector_id}")
-async def update_sector(sector_id: int, sector_data: schemas.SectorUpdate, db: Session = Depends(get_db)):
+def update_sector(sector_id: int, sector_data: schemas.SectorUpdate, db: Session = Depends(get_db)):
     sector = db.query(Sector).filter(Sector.id == sector_id).first()
     if not sector:
         raise HTTPException(status_code=404, detail="Sector not found")
@@ -42,62 +145,80 @@ async def update_sector(sector_id: int, sector_data: schemas.SectorUpdate, db: S
     sector.name = sector_data.name
     sector.description = sector_data.description
     db.commit()
+    response_cache.invalidate("sectors", f"sector:{sector_id}")
     return {"message": "Sector updated"}
 
 @router.delete("/{sector_id}")
-async def delete_sector(sector_id: int, db: Session = Depends(get_db)):
+def delete_sector(sector_id: int, db: Session = Depends(get_db)):
     sector = db.query(Sector).filter(Sector.id == sector_id).first()
     if not sector:
         raise HTTPException(status_code=404, detail="Sector not found")
     
     db.delete(sector)
+    db.flush()
+    rollups.refresh_sectors(db, [sector_id])
     db.commit()
+    response_cache.invalidate("sectors", f"sector:{sector_id}", "companies")
     return {"message": "Sector deleted"}
 
-@router.get("/{sector_id}/companies", response_model=list[schemas.Company])
-async def get_sector_companies(sector_id: int, db: Session = Depends(get_db)):
-    # First check if sector exists
-    sector = db.query(Sector).filter(Sector.id == sector_id).first()
-    if not sector:
+@router.get("/{sector_id}/stats", response_model=schemas.SectorStats)
+def get_sector_stats(sector_id: int, db: Session = Depends(get_read_db)):
+    stats = db.query(SectorStats).filter(SectorStats.sector_id == sector_id).first()
+    if not stats:
         raise HTTPException(status_code=404, detail="Sector not found")
-    
-    # Get companies in this sector
-    companies = db.query(Company).filter(Company.sector_id == sector_id).all()
-    return companies
+    return stats
+
+@router.get("/{sector_id}/companies", response_model=list[schemas.Company])
+def get_sector_companies(
+    sector_id: int,
+    request: Request,
+    page: dict = Depends(page_params),
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    filters = (Company.sector_id == sector_id, *access.company_filter(db, viewer, Company.id))
+
+    def load(response):
+        result = fetch_page(db, Company, schemas.Company, page, filters=filters)
+        # A non-empty page proves the sector exists; only an empty one needs the extra check
+        if result.body == b"[]" and not db.query(Sector.id).filter(Sector.id == sector_id).first():
+            raise HTTPException(status_code=404, detail="Sector not found")
+        return result
+    return response_cache.respond(
+        request, (f"sector:{sector_id}", "companies", *access.scope(viewer)), list[schemas.Company], load
+    )
 
 @router.get("/{sector_id}/companies/{company_id}", response_model=schemas.Company)
-async def get_sector_company(sector_id: int, company_id: int, db: Session = Depends(get_db)):
-    # Verify sector exists
-    sector = db.query(Sector).filter(Sector.id == sector_id).first()
-    if not sector:
-        raise HTTPException(status_code=404, detail="Sector not found")
-    
-    # Verify company exists AND belongs to this sector
-    company = db.query(Company).filter(
-        Company.id == company_id, 
-        Company.sector_id == sector_id
-    ).first()
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found in this sector")
-    
-    return company
+def get_sector_company(
+    sector_id: int,
+    company_id: int,
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    access.require_company(db, viewer, company_id)
+    return _company_in_sector(db, sector_id, company_id)
 
 @router.get("/{sector_id}/companies/{company_id}/analyses", response_model=list[schemas.Analysis])
-async def get_sector_company_analyses(sector_id: int, company_id: int, db: Session = Depends(get_db)):
-    # Verify sector exists
-    sector = db.query(Sector).filter(Sector.id == sector_id).first()
-    if not sector:
+def get_sector_company_analyses(
+    sector_id: int,
+    company_id: int,
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    access.require_company(db, viewer, company_id)
+    # Existence checks and the analyses in a single statement; the outer joins
+    # keep one row even when the sector or company is missing
+    rows = (
+        db.query(Sector.id, Company.id, Analysis)
+        .select_from(Sector)
+        .outerjoin(Company, and_(Company.id == company_id, Company.sector_id == Sector.id))
+        .outerjoin(Analysis, Analysis.company_id == Company.id)
+        .filter(Sector.id == sector_id)
+        .order_by(Analysis.date)
+        .all()
+    )
+    if not rows:
         raise HTTPException(status_code=404, detail="Sector not found")
-    
-    # Verify company exists AND belongs to this sector
-    company = db.query(Company).filter(
-        Company.id == company_id, 
-        Company.sector_id == sector_id
-    ).first()
-    if not company:
+    if rows[0][1] is None:
         raise HTTPException(status_code=404, detail="Company not found in this sector")
-    
-    # Get all analyses for this company
-    from models import Analysis  # ← ADD THIS IMPORT
-    analyses = db.query(Analysis).filter(Analysis.company_id == company_id).all()
-    return analyses
\ No newline at end of file
+    return [row.Analysis for row in rows if row.Analysis is not None]
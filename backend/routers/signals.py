@@ -0,0 +1,43 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends
+from sqlalchemy import Float, select, type_coerce
+from sqlalchemy.orm import Session
+from database import get_read_db
+from models import Company, LatestAnalysis
+from principals import Principal
+from routers.auth import get_viewer
+import access
+import schemas
+
+router = APIRouter()
+
+# Served from the latest_analysis snapshot: one row per company, no scan over analyses
+@router.get("/latest", response_model=list[schemas.LatestSignal])
+def get_latest_signals(
+    sector_id: Optional[int] = None,
+    signal: Optional[Literal['BUY', 'SELL', 'HOLD', 'STRONG_BUY', 'STRONG_SELL']] = None,
+    viewer: Optional[Principal] = Depends(get_viewer),
+    db: Session = Depends(get_read_db)
+):
+    query = (
+        select(
+            LatestAnalysis.company_id,
+            Company.symbol,
+            Company.company_name,
+            Company.sector_id,
+            LatestAnalysis.analysis_id,
+            LatestAnalysis.date,
+            LatestAnalysis.signal,
+            type_coerce(LatestAnalysis.confidence_score, Float).label("confidence_score"),
+            type_coerce(LatestAnalysis.close_price, Float).label("close_price"),
+            type_coerce(LatestAnalysis.predicted_close, Float).label("predicted_close"),
+        )
+        .join(Company, Company.id == LatestAnalysis.company_id)
+        .where(*access.company_filter(db, viewer, LatestAnalysis.company_id))
+        .order_by(LatestAnalysis.company_id)
+    )
+    if sector_id is not None:
+        query = query.where(Company.sector_id == sector_id)
+    if signal is not None:
+        query = query.where(LatestAnalysis.signal == signal)
+    return [row._asdict() for row in db.execute(query)]
@@ -1,8 +1,13 @@
 # users.py
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from database import get_db
-from models import User
+from database import get_db, get_read_db
+from access import access_cache
+from feed import feed_hub
+from models import User, UserCompanyAccess
+from pagination import fetch_page, page_params
+from principals import Principal, principal_cache
 import schemas
 from routers.auth import get_current_user, get_password_hash, verify_password, get_current_admin
 
@@ -10,37 +15,48 @@ router = APIRouter()
 
 # Change password
 @router.patch("/users/me/password")
-async def change_password(
+def change_password(
     password_data: schemas.PasswordChange,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    user = db.query(User).filter(User.id == current_user.id).first()
+
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not verify_password(password_data.current_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
-    # Update to new password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    # Update to new password; existing tokens are revoked
+    user.hashed_password = get_password_hash(password_data.new_password)
+    user.token_version += 1
     db.commit()
+    principal_cache.invalidate(current_user.username)
     
     return {"message": "Password updated successfully"}
 
 # Get all users (admin only)
 @router.get("/users", response_model=list[schemas.User])
-async def get_users_list(
-    current_user: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+def get_users_list(
+    role: Optional[str] = None,
+    page: dict = Depends(page_params),
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_read_db)
 ):
-    return db.query(User).all()
+    filters = () if role is None else (User.role == role,)
+    return fetch_page(db, User, schemas.User, page, filters=filters)
 
 # Delete my own account
 @router.delete("/users/me")
-async def delete_my_account(
-    current_user: User = Depends(get_current_user),
+def delete_my_account(
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    db.delete(current_user)
+    db.query(UserCompanyAccess).filter(UserCompanyAccess.user_id == current_user.id).delete()
+    db.query(User).filter(User.id == current_user.id).delete()
     db.commit()
+    principal_cache.invalidate(current_user.username)
+    access_cache.invalidate(current_user.id)
+    feed_hub.drop_users([current_user.id])
     
     return {
         "message": "Your account has been permanently deleted",
@@ -49,9 +65,9 @@ async def delete_my_account(
 
 # Delete any user account (admin only)
 @router.delete("/users/{user_id}")
-async def delete_user_account(
+def delete_user_account(
     user_id: int,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     # Prevent self-deletion via admin endpoint (optional safety)
@@ -65,8 +81,12 @@ async def delete_user_account(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    db.query(UserCompanyAccess).filter(UserCompanyAccess.user_id == user_id).delete()
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(user.username)
+    access_cache.invalidate(user_id)
+    feed_hub.drop_users([user_id])
     
     return {
         "message": f"User {user.username} deleted successfully",
@@ -76,18 +96,21 @@ async def delete_user_account(
 
 # Change user role (admin only)
 @router.patch("/users/{user_id}/role")
-async def change_user_role(
+def change_user_role(
     user_id: int,
     role_data: schemas.RoleChange,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Tokens carry the role claim, so issue new ones after a role change
     user.role = role_data.role
+    user.token_version += 1
     db.commit()
+    principal_cache.invalidate(user.username)
     
     return {
         "message": f"User role updated to {role_data.role}",
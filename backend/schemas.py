@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import Literal, Optional
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import Any, Literal, Optional
+from datetime import date, datetime, timezone
 
 class SectorBase(BaseModel):
     name: str
@@ -30,7 +30,12 @@ class CompanyBase(BaseModel):
     revenue: float
 
 class CompanyCreate(CompanyBase):
-    pass
+    eps: Optional[float] = None
+    profit_margin: Optional[float] = None
+    debt_to_equity: Optional[float] = None
+    next_earnings_date: Optional[date] = None
+    earnings_estimate: Optional[float] = None
+    dividend_yield: Optional[float] = None
 
 class CompanyUpdate(CompanyBase):
     pass
@@ -56,6 +61,31 @@ class AnalysisBase(BaseModel):
     signal: Literal['BUY', 'SELL', 'HOLD', 'STRONG_BUY', 'STRONG_SELL']
     confidence_score: float
 
+    # Dates are stored as naive UTC; an offset-aware input is converted so it
+    # compares and dedupes against stored bars
+    @field_validator("date")
+    @classmethod
+    def _naive_utc(cls, value: datetime) -> datetime:
+        if value.tzinfo is None:
+            return value
+        try:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        except OverflowError:
+            raise ValueError("date is out of range once converted to UTC")
+
+class PriceBar(BaseModel):
+    date: datetime
+    open_price: Optional[float] = None
+    high_price: Optional[float] = None
+    low_price: Optional[float] = None
+    close_price: Optional[float] = None
+    volume: Optional[int] = None
+
+class CompanyIndicators(BaseModel):
+    company_id: int
+    dates: list[datetime]
+    indicators: dict[str, list[Optional[float]]]
+
 class AnalysisCreate(AnalysisBase):
     pass
 
@@ -69,6 +99,190 @@ class Analysis(AnalysisBase):
     class Config:
         from_attributes = True
 
+class CompanySearchResult(BaseModel):
+    id: int
+    symbol: str
+    company_name: str
+    sector_id: Optional[int] = None
+
+# Fundamentals snapshot for PUT /companies/batch; fields left out are not compared
+class CompanyFundamentals(BaseModel):
+    symbol: str
+    sector_id: Optional[int] = None
+    company_name: Optional[str] = None
+    market_cap: Optional[float] = None
+    pe_ratio: Optional[float] = None
+    eps: Optional[float] = None
+    revenue: Optional[float] = None
+    profit_margin: Optional[float] = None
+    debt_to_equity: Optional[float] = None
+    next_earnings_date: Optional[date] = None
+    earnings_estimate: Optional[float] = None
+    dividend_yield: Optional[float] = None
+
+class FundamentalsRowError(BaseModel):
+    symbol: str
+    error: str
+
+class FundamentalsBatchResult(BaseModel):
+    inserted: int
+    changed: int
+    unchanged: int
+    rejected: int
+    changed_columns: dict[str, int]
+    errors: list[FundamentalsRowError] = []
+    dry_run: bool
+    elapsed_seconds: float
+
+# Sector expansions for ?include=companies,analyses
+class CompanyWithAnalyses(Company):
+    analyses: list[Analysis]
+
+class SectorWithCompanies(Sector):
+    companies: list[Company]
+
+class SectorWithAnalyses(Sector):
+    companies: list[CompanyWithAnalyses]
+
+# Bulk ingest responses
+class BulkRowError(BaseModel):
+    line: int
+    error: str
+
+class BulkChunkResult(BaseModel):
+    chunk: int
+    accepted: int
+    rejected: int
+    errors: list[BulkRowError] = []
+
+class BulkIngestResult(BaseModel):
+    format: str
+    accepted: int
+    rejected: int
+    chunks: list[BulkChunkResult]
+    elapsed_seconds: float
+    rows_per_second: float
+
+# Backtest results
+class PredictionError(BaseModel):
+    field: str
+    count: int
+    mae: Optional[float] = None
+    rmse: Optional[float] = None
+
+class CalibrationBin(BaseModel):
+    lower: float
+    upper: float
+    trades: int
+    hit_rate: Optional[float] = None
+
+class BacktestCompany(BaseModel):
+    company_id: int
+    sector_id: Optional[int] = None
+    bars: int
+    trades: int
+    hit_rate: Optional[float] = None
+    total_return: float
+    max_drawdown: float
+    prediction_errors: list[PredictionError]
+    calibration: list[CalibrationBin]
+    equity_curve: Optional[list[float]] = None
+
+class BacktestSector(BaseModel):
+    sector_id: Optional[int] = None
+    companies: int
+    trades: int
+    hit_rate: Optional[float] = None
+    mean_return: float
+    max_drawdown: float
+    prediction_errors: list[PredictionError]
+    calibration: list[CalibrationBin]
+
+class BacktestResult(BaseModel):
+    workers: int
+    elapsed_seconds: float
+    companies: list[BacktestCompany]
+    sectors: list[BacktestSector]
+
+# Prediction runs
+class PredictionRunResult(BaseModel):
+    full: bool
+    workers: int
+    companies: int
+    fitted: int
+    bars_written: int
+    elapsed_seconds: float
+
+# Background jobs
+class JobCreate(BaseModel):
+    kind: str
+    params: dict[str, Any] = {}
+    max_attempts: int = Field(3, ge=1, le=10)
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    params: Optional[dict[str, Any]] = None
+    status: Literal['queued', 'running', 'succeeded', 'failed', 'cancelled']
+    progress: float
+    message: Optional[str] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    run_after: datetime
+    worker: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    created_by: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Company access grants; every user in user_ids gets (or loses) every company in company_ids
+class AccessChange(BaseModel):
+    user_ids: list[int] = Field(..., min_length=1)
+    company_ids: list[int] = Field(..., min_length=1)
+
+class AccessChangeResult(BaseModel):
+    changed: int
+    unchanged: int
+
+class UserAccess(BaseModel):
+    user_id: int
+    company_ids: list[int]
+
+# Latest signal board
+class LatestSignal(BaseModel):
+    company_id: int
+    symbol: str
+    company_name: str
+    sector_id: Optional[int] = None
+    analysis_id: Optional[int] = None
+    date: datetime
+    signal: str
+    confidence_score: Optional[float] = None
+    close_price: Optional[float] = None
+    predicted_close: Optional[float] = None
+
+# Sector rollups
+class SectorStats(BaseModel):
+    sector_id: int
+    company_count: int
+    total_market_cap: Optional[float] = None
+    avg_market_cap: Optional[float] = None
+    median_pe_ratio: Optional[float] = None
+    avg_profit_margin: Optional[float] = None
+    avg_dividend_yield: Optional[float] = None
+    signal_counts: dict[str, int] = {}
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
 
 class UserBase(BaseModel):
     username: str
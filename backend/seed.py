@@ -0,0 +1,87 @@
+"""Seed the default sectors and admin account.
+
+Safe to run any number of times: sectors are only created when no sector
+of that name exists, and the admin is created or promoted to admin.
+Empty duplicates of the default sectors, left behind by older versions
+that seeded on every start, are removed.
+
+    python seed.py
+    python seed.py --admin-username ops --admin-password 'change me'
+"""
+import argparse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from hashing import pwd_context
+from models import Company, Sector, User
+import rollups
+
+DEFAULT_SECTORS = [
+    ("Technology", "Tech companies"),
+    ("Healthcare", "Medical companies"),
+]
+
+
+def seed_sectors(db: Session, progress=None) -> tuple[int, int]:
+    """Returns (created, duplicates removed).
+
+    `progress(fraction, message)`, when given, is called before every sector.
+    """
+    created = removed = 0
+    for done, (name, description) in enumerate(DEFAULT_SECTORS):
+        if progress is not None:
+            progress(done / len(DEFAULT_SECTORS), f"{done}/{len(DEFAULT_SECTORS)} sectors")
+        sectors = db.execute(
+            select(Sector.id, func.count(Company.id))
+            .outerjoin(Company, Company.sector_id == Sector.id)
+            .where(Sector.name == name)
+            .group_by(Sector.id)
+            .order_by(Sector.id)
+        ).all()
+        if not sectors:
+            db.add(Sector(name=name, description=description))
+            created += 1
+            continue
+        # Keep the oldest and any sector that has companies
+        duplicates = [sector_id for sector_id, companies in sectors[1:] if companies == 0]
+        if duplicates:
+            for sector in db.query(Sector).filter(Sector.id.in_(duplicates)):
+                db.delete(sector)
+            db.flush()
+            rollups.refresh_sectors(db, duplicates)
+            removed += len(duplicates)
+    db.flush()
+    rollups.refresh_sectors(db, db.execute(select(Sector.id).where(Sector.name.in_([n for n, _ in DEFAULT_SECTORS]))).scalars())
+    return created, removed
+
+
+def seed_admin(db: Session, username: str, email: str, password: str) -> str:
+    user = db.query(User).filter(User.username == username).first()
+    if user is None:
+        db.add(User(username=username, email=email, hashed_password=pwd_context.hash(password), role="admin"))
+        return "created"
+    if user.role != "admin":
+        user.role = "admin"
+        return "promoted"
+    return "unchanged"
+
+
+if __name__ == "__main__":
+    import migrations
+    from database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--admin-username", default="kri")
+    parser.add_argument("--admin-email", default="kri@yahjo.com")
+    parser.add_argument("--admin-password", default="kri")
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    session = SessionLocal()
+    try:
+        created, removed = seed_sectors(session)
+        admin = seed_admin(session, args.admin_username, args.admin_email, args.admin_password)
+        session.commit()
+    finally:
+        session.close()
+    print(f"Sectors: {created} created, {removed} empty duplicates removed; admin '{args.admin_username}' {admin}")
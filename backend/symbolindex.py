@@ -0,0 +1,129 @@
+"""In-memory prefix index for company autocomplete.
+
+Two sorted arrays of (key, company_id) back the lookups: one of
+lowercased symbols and one of lowercased company names plus each later
+word of the name. The matches for a prefix form one contiguous run, so a
+query is a bisect into each array followed by reading at most `limit`
+entries: O(log n + limit), without touching the database.
+
+Company write handlers update the index of their own worker after
+commit (add/remove, O(n) list shifts). Other workers pick the change up
+when their copy is older than SYMBOL_INDEX_TTL and is reloaded.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Company
+
+INDEX_TTL_SECONDS = float(os.environ.get("SYMBOL_INDEX_TTL", "60"))
+
+
+def _name_keys(name: str) -> set:
+    if not name:
+        return set()
+    name = name.lower()
+    return {name, *name.split()[1:]}
+
+
+def _take(entries: list, prefix: str, limit: int, found: dict, allowed=None):
+    # Entries are sorted, so the matches for a prefix are one contiguous run
+    i = bisect_left(entries, (prefix,))
+    while i < len(entries) and len(found) < limit and entries[i][0].startswith(prefix):
+        if allowed is None or entries[i][1] in allowed:
+            found.setdefault(entries[i][1], None)
+        i += 1
+
+
+class SymbolIndex:
+    def __init__(self, ttl: float = INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self._symbols = []       # sorted (lowercased symbol, company_id)
+        self._names = []         # sorted (lowercased name or name word, company_id)
+        self._companies = {}     # company_id -> (symbol, company_name, sector_id)
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self, db: Session):
+        rows = db.execute(select(Company.id, Company.symbol, Company.company_name, Company.sector_id)).all()
+        companies = {row.id: (row.symbol, row.company_name, row.sector_id) for row in rows}
+        symbols = sorted((symbol.lower(), company_id) for company_id, (symbol, _, _) in companies.items())
+        names = sorted(
+            (key, company_id) for company_id, (_, name, _) in companies.items() for key in _name_keys(name)
+        )
+        with self._lock:
+            self._symbols, self._names, self._companies = symbols, names, companies
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load(db)
+
+    @staticmethod
+    def _discard(entries: list, entry: tuple):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _remove_locked(self, company_id: int):
+        previous = self._companies.pop(company_id, None)
+        if previous is None:
+            return
+        self._discard(self._symbols, (previous[0].lower(), company_id))
+        for key in _name_keys(previous[1]):
+            self._discard(self._names, (key, company_id))
+
+    def add(self, company_id: int, symbol: str, company_name: str, sector_id):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._remove_locked(company_id)
+            self._companies[company_id] = (symbol, company_name, sector_id)
+            insort(self._symbols, (symbol.lower(), company_id))
+            for key in _name_keys(company_name):
+                insort(self._names, (key, company_id))
+
+    def remove(self, company_id: int):
+        with self._lock:
+            self._remove_locked(company_id)
+
+    def refresh(self, db: Session, company_ids):
+        """Re-read the given companies, e.g. after a bulk write."""
+        company_ids = list(set(company_ids))
+        if self._loaded_at is None or not company_ids:
+            return
+        rows = db.execute(
+            select(Company.id, Company.symbol, Company.company_name, Company.sector_id).where(Company.id.in_(company_ids))
+        ).all()
+        for row in rows:
+            self.add(row.id, row.symbol, row.company_name, row.sector_id)
+
+    def sector_ids(self, company_ids) -> dict:
+        with self._lock:
+            return {
+                company_id: self._companies[company_id][2]
+                for company_id in company_ids if company_id in self._companies
+            }
+
+    def search(self, query: str, limit: int, allowed=None) -> list[dict]:
+        """Symbol prefix matches first (an exact symbol sorts first), then name matches.
+
+        `allowed`, when given, is the set of company ids that may be returned.
+        """
+        prefix = query.strip().lower()
+        if not prefix:
+            return []
+        found = {}
+        with self._lock:
+            _take(self._symbols, prefix, limit, found, allowed)
+            _take(self._names, prefix, limit, found, allowed)
+            companies = [(company_id, self._companies[company_id]) for company_id in found]
+        return [
+            {"id": company_id, "symbol": symbol, "company_name": name, "sector_id": sector_id}
+            for company_id, (symbol, name, sector_id) in companies
+        ]
+
+
+symbol_index = SymbolIndex()
@@ -0,0 +1,28 @@
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+# Every test runs against a scratch SQLite database; set before database.py is imported
+DATA_DIR = tempfile.mkdtemp(prefix="stocks-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}"
+os.environ["DATABASE_READ_URL"] = os.environ["DATABASE_URL"]
+os.environ["PRICE_STORE_DIR"] = os.path.join(DATA_DIR, "pricestore")
+os.environ["HASH_WORKERS"] = "0"
+os.environ["JOB_WORKERS"] = "0"
+os.environ["COMPANY_ACL"] = "0"
+for name in ("RESPONSE_CACHE_URL", "FEED_URL"):
+    os.environ.pop(name, None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from database import engine
+    import migrations
+
+    migrations.upgrade(engine)
+    yield engine
+    engine.dispose()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,94 @@
+"""Company ACL: the SQL filter, the per-worker cache and grant invalidation."""
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from models import Company, Sector, User, UserCompanyAccess
+from principals import Principal
+from routers.auth import create_access_token
+import access
+
+SECTOR_ID = 9501
+COMPANY_IDS = (9501, 9502, 9503)
+ADMIN_ID, MEMBER_ID = 9501, 9502
+MEMBER = Principal(id=MEMBER_ID, username="acl-member", email="member@example.com", role="member", token_version=0)
+
+
+@pytest.fixture(scope="module")
+def data(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "ACL", "description": "Access"}])
+        conn.execute(insert(Company), [{
+            "id": company_id, "sector_id": SECTOR_ID, "symbol": f"ACL{company_id}", "company_name": f"ACL {company_id}",
+            "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+        } for company_id in COMPANY_IDS])
+        conn.execute(insert(User), [
+            {"id": ADMIN_ID, "username": "acl-admin", "email": "admin@example.com", "hashed_password": "-", "role": "admin"},
+            {"id": MEMBER_ID, "username": "acl-member", "email": "member@example.com", "hashed_password": "-", "role": "member"},
+        ])
+        conn.execute(insert(UserCompanyAccess), [
+            {"user_id": MEMBER_ID, "company_id": COMPANY_IDS[0], "granted_by": ADMIN_ID, "granted_at": datetime(2024, 1, 1)},
+        ])
+    return engine
+
+
+@pytest.fixture
+def enforced(monkeypatch):
+    monkeypatch.setattr(access, "ENABLED", True)
+    access.access_cache.invalidate(MEMBER_ID)
+    yield
+    access.access_cache.invalidate(MEMBER_ID)
+
+
+def _visible(db, principal, plan_max: int, monkeypatch) -> list:
+    monkeypatch.setattr(access, "SUBQUERY_MAX", plan_max)
+    query = select(Company.id).where(Company.sector_id == SECTOR_ID, *access.company_filter(db, principal, Company.id))
+    return db.execute(query.order_by(Company.id)).scalars().all()
+
+
+@pytest.mark.parametrize("plan_max", [1000, 0], ids=["in_subquery", "exists"])
+def test_filter_reads_current_grants(data, enforced, monkeypatch, plan_max):
+    admin = Principal(id=ADMIN_ID, username="acl-admin", email="admin@example.com", role="admin", token_version=0)
+    with Session(bind=data) as db:
+        assert _visible(db, admin, plan_max, monkeypatch) == list(COMPANY_IDS)
+        assert _visible(db, MEMBER, plan_max, monkeypatch) == [COMPANY_IDS[0]]
+        # A grant committed after the set was cached still shows up: the SQL reads the table
+        db.execute(insert(UserCompanyAccess), [{"user_id": MEMBER_ID, "company_id": COMPANY_IDS[1], "granted_by": ADMIN_ID}])
+        assert _visible(db, MEMBER, plan_max, monkeypatch) == list(COMPANY_IDS[:2])
+        db.rollback()
+
+
+def test_cache_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(access.time, "monotonic", lambda: now[0])
+    cache = access.AccessCache(ttl=60)
+    cache.put(MEMBER_ID, frozenset({1}))
+    now[0] += 59
+    assert cache.get(MEMBER_ID) == frozenset({1})
+    now[0] += 2
+    assert cache.get(MEMBER_ID) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_grant_invalidates_cached_set_and_responses(data, enforced):
+    import main
+
+    admin = {"Authorization": f"Bearer {create_access_token({'sub': 'acl-admin', 'ver': 0})}"}
+    member = {"Authorization": f"Bearer {create_access_token({'sub': 'acl-member', 'ver': 0})}"}
+    with TestClient(main.app) as client:
+        assert client.get("/companies/", params={"sector_id": SECTOR_ID}).status_code == 401
+        listed = client.get("/companies/", params={"sector_id": SECTOR_ID}, headers=member)
+        assert [c["id"] for c in listed.json()] == [COMPANY_IDS[0]]
+        assert client.get(f"/companies/{COMPANY_IDS[2]}", headers=member).status_code == 404
+
+        change = {"user_ids": [MEMBER_ID], "company_ids": [COMPANY_IDS[2]]}
+        assert client.post("/api/v1/access/grant", json=change, headers=admin).json()["changed"] == 1
+        # Neither the cached id set nor the cached page hides the new grant
+        assert access.access_cache.get(MEMBER_ID) is None
+        listed = client.get("/companies/", params={"sector_id": SECTOR_ID}, headers=member)
+        assert [c["id"] for c in listed.json()] == [COMPANY_IDS[0], COMPANY_IDS[2]]
+        assert client.get(f"/companies/{COMPANY_IDS[2]}", headers=member).status_code == 200
+
+        assert client.post("/api/v1/access/revoke", json=change, headers=admin).json()["changed"] == 1
+        assert client.get(f"/companies/{COMPANY_IDS[2]}", headers=member).status_code == 404
@@ -0,0 +1,52 @@
+"""Backtests score on one shared process pool and match the inline result."""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from models import Analysis, Company, Sector
+import backtest
+
+SECTOR_ID = 9801
+COMPANY_IDS = (9801, 9802, 9803)
+SIGNALS = ("BUY", "SELL", "HOLD", "STRONG_BUY")
+
+
+@pytest.fixture(scope="module")
+def sector(engine):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Backtest", "description": "Scoring"}])
+        conn.execute(insert(Company), [{
+            "id": company_id, "sector_id": SECTOR_ID, "symbol": f"BT{company_id}", "company_name": f"BT {company_id}",
+            "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+        } for company_id in COMPANY_IDS])
+        conn.execute(insert(Analysis), [{
+            "company_id": company_id, "date": start + timedelta(days=day), "signal": SIGNALS[(day + company_id) % 4],
+            "confidence_score": 0.6, "volume": 1000, "created_at": start,
+            **dict.fromkeys(("open_price", "high_price", "low_price", "close_price"), 10.0 + (day * company_id) % 7),
+            **dict.fromkeys(("predicted_open", "predicted_high", "predicted_low", "predicted_close"), 10.0 + day % 5),
+        } for company_id in COMPANY_IDS for day in range(40)])
+    yield SECTOR_ID
+    backtest.shutdown()
+
+
+def _strip(result: dict) -> dict:
+    return {"companies": result["companies"], "sectors": result["sectors"]}
+
+
+def test_pool_is_shared_and_matches_inline(sector, monkeypatch):
+    monkeypatch.setattr(backtest, "POOL_WORKERS", 2)
+    inline = backtest.run_backtest(sector_id=sector, workers=1, chunk_size=1)
+    assert inline["workers"] == 1 and len(inline["companies"]) == len(COMPANY_IDS)
+
+    reported = []
+    pooled = backtest.run_backtest(sector_id=sector, workers=2, chunk_size=1,
+                                   progress=lambda fraction, message: reported.append(fraction))
+    pool = backtest._pool
+    assert pooled["workers"] == 2
+    assert _strip(pooled) == _strip(inline)
+    assert reported[-1] == 1.0 and len(reported) == len(COMPANY_IDS)
+
+    # A second run, even asking for more workers, reuses the same processes
+    again = backtest.run_backtest(sector_id=sector, workers=8, chunk_size=1)
+    assert backtest._pool is pool and again["workers"] == 2
+    assert _strip(again) == _strip(inline)
@@ -0,0 +1,82 @@
+"""Push feed: filtered delivery, overflow notices, bad client messages and hub closes."""
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from starlette.websockets import WebSocketDisconnect
+from feed import Frame, Subscriber, feed_hub
+from models import Company, Sector
+
+SECTOR_ID = 10601
+COMPANY_IDS = (10601, 10602)
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Feed", "description": "Push"}])
+        conn.execute(insert(Company), [{
+            "id": company_id, "sector_id": SECTOR_ID, "symbol": f"FD{company_id}", "company_name": f"FD {company_id}",
+            "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+        } for company_id in COMPANY_IDS])
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _post(client, company_id: int, day: int, signal: str = "BUY"):
+    response = client.post("/analyses/", json={
+        "company_id": company_id, "date": f"2024-05-{day:02d}T00:00:00", "close_price": 10,
+        "predicted_close": 11, "signal": signal, "confidence_score": 0.5,
+    })
+    assert response.status_code == 201, response.text
+
+
+def test_only_matching_analyses_are_pushed(client):
+    with client.websocket_connect(f"/feed/ws?company_ids={COMPANY_IDS[0]}") as ws:
+        _post(client, COMPANY_IDS[1], 1)
+        _post(client, COMPANY_IDS[0], 2)
+        event = ws.receive_json()
+        assert (event["type"], event["op"], event["sector_id"]) == ("analysis", "created", SECTOR_ID)
+        assert event["analysis"]["company_id"] == COMPANY_IDS[0]
+
+        # Filters widen per message: by sector now as well
+        ws.send_json({"action": "subscribe", "sector_ids": [SECTOR_ID]})
+        assert ws.receive_json()["type"] == "subscribed"
+        _post(client, COMPANY_IDS[1], 3, "SELL")
+        assert ws.receive_json()["analysis"]["company_id"] == COMPANY_IDS[1]
+
+
+def test_slow_subscriber_is_told_what_it_lost():
+    async def run():
+        subscriber = Subscriber({"*"}, maxsize=2)
+        for i in range(5):
+            subscriber.push(Frame(("*",), json.dumps({"i": i})))
+        frames = await subscriber.next()
+        return [json.loads(frame.text) for frame in frames]
+
+    assert asyncio.run(run()) == [{"type": "dropped", "count": 3}, {"i": 3}, {"i": 4}]
+
+
+def test_bad_messages_keep_the_subscription(client):
+    with client.websocket_connect("/feed/ws") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"action": "dance"})
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"action": "subscribe", "company_ids": [4]})
+        reply = ws.receive_json()
+        assert reply["type"] == "subscribed" and "company:4" in reply["topics"]
+
+
+def test_hub_close_asks_to_reconnect(client):
+    with client.websocket_connect("/feed/ws") as ws:
+        ws.send_json({"action": "subscribe", "signals": ["BUY"]})
+        ws.receive_json()
+        # Without COMPANY_ACL every subscriber has no user id
+        feed_hub.drop_users([None])
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        assert closed.value.code == 1012
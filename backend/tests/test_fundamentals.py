@@ -0,0 +1,68 @@
+"""Fundamentals writes: the race between lookup and insert, and the single-company POST."""
+from datetime import date
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from models import Company, Sector, SectorStats
+import fundamentals
+import schemas
+
+SECTOR_ID = 9401
+
+
+def test_concurrently_inserted_symbol_is_updated(engine, monkeypatch):
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Fundamentals"}])
+    original = fundamentals._existing
+    lookups = []
+
+    def existing_then_race(db, symbols):
+        # The first lookup misses RACE; another writer commits it before our INSERT
+        lookups.append(symbols)
+        if len(lookups) == 1:
+            found = original(db, symbols)
+            with engine.begin() as conn:
+                conn.execute(insert(Company), [{
+                    "sector_id": SECTOR_ID, "symbol": "RACE", "company_name": "Race Inc.", "pe_ratio": 5,
+                }])
+            return found
+        return original(db, symbols)
+
+    monkeypatch.setattr(fundamentals, "_existing", existing_then_race)
+    snapshot = [
+        schemas.CompanyFundamentals(symbol="RACE", sector_id=SECTOR_ID, company_name="Race Inc.", pe_ratio=7),
+        schemas.CompanyFundamentals(symbol="CALM", sector_id=SECTOR_ID, company_name="Calm Inc.", pe_ratio=9),
+    ]
+    with Session(bind=engine) as db:
+        result, written_ids = fundamentals.apply_snapshot(db, snapshot)
+        db.commit()
+
+    assert len(lookups) == 2
+    assert (result.inserted, result.changed, result.rejected) == (1, 1, 0)
+    assert len(written_ids) == 2
+    with Session(bind=engine) as db:
+        stored = dict(db.execute(
+            select(Company.symbol, Company.pe_ratio).where(Company.symbol.in_(["RACE", "CALM"]))
+        ).all())
+    assert {symbol: float(pe) for symbol, pe in stored.items()} == {"RACE": 7.0, "CALM": 9.0}
+
+
+def test_create_company_keeps_fundamentals(engine):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID + 1, "name": "Fundamentals POST"}])
+    with TestClient(main.app) as client:
+        response = client.post("/companies/", json={
+            "sector_id": SECTOR_ID + 1, "symbol": "FUND", "company_name": "Fund Inc.", "market_cap": 1e9,
+            "pe_ratio": 12, "revenue": 1e8, "eps": 6.15, "profit_margin": 25.31, "debt_to_equity": 1.2,
+            "next_earnings_date": "2024-01-25", "earnings_estimate": 1.45, "dividend_yield": 0.55,
+        })
+    assert response.status_code == 201, response.text
+    with Session(bind=engine) as db:
+        company = db.get(Company, response.json()["id"])
+        assert [float(company.eps), float(company.profit_margin), float(company.debt_to_equity)] == [6.15, 25.31, 1.2]
+        assert company.next_earnings_date == date(2024, 1, 25)
+        assert [float(company.earnings_estimate), float(company.dividend_yield)] == [1.45, 0.55]
+        stats = db.get(SectorStats, SECTOR_ID + 1)
+        assert (stats.profit_margin_count, stats.dividend_yield_count) == (1, 1)
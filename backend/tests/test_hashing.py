@@ -0,0 +1,55 @@
+"""A saturated hashing pool answers 503 straight away instead of queueing more work."""
+import threading
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from hashing import HashingPool
+from models import User
+
+
+@pytest.fixture
+def saturated():
+    # One slot, held by a job that waits until the test lets it go
+    pool = HashingPool(workers=0, max_pending=1)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=pool._run, args=(lambda: started.set() or release.wait(5),))
+    holder.start()
+    assert started.wait(5)
+    yield pool
+    release.set()
+    holder.join(5)
+
+
+def test_rejects_when_full_and_recovers(saturated):
+    with pytest.raises(HTTPException) as rejected:
+        saturated.verify_and_update("secret", "-")
+    assert rejected.value.status_code == 503
+    assert rejected.value.headers == {"Retry-After": "1"}
+    assert saturated.stats()["rejected"] == 1 and saturated.stats()["queue_depth"] == 1
+
+
+def test_slot_is_released_after_an_error():
+    pool = HashingPool(workers=0, max_pending=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            pool._run(fail)
+    assert pool.stats()["queue_depth"] == 0 and pool.stats()["completed"] == 3
+
+
+def test_login_returns_503_when_saturated(engine, saturated, monkeypatch):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": 10201, "username": "hash-user", "email": "hash@example.com", "hashed_password": "-", "role": "member"},
+        ])
+    monkeypatch.setattr("routers.auth.hashing_pool", saturated)
+    with TestClient(main.app) as client:
+        response = client.post("/auth/login", data={"username": "hash-user", "password": "secret"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
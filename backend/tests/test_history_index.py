@@ -0,0 +1,64 @@
+"""The history range query must seek on ux_analyses_company_date, not scan analyses."""
+import re
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from models import Analysis, Company, Sector
+import pricestore
+from routers.companies import _history_from_sql
+
+COMPANY_ID = 9001
+INDEX_SEARCH = re.compile(r"SEARCH analyses USING (COVERING )?INDEX ux_analyses_company_date \(company_id=\?")
+
+
+@pytest.fixture(scope="module")
+def bars(engine):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": COMPANY_ID, "name": "History"}])
+        conn.execute(insert(Company), [{
+            "id": COMPANY_ID, "sector_id": COMPANY_ID, "symbol": "HIST", "company_name": "History Inc.",
+        }])
+        conn.execute(insert(Analysis), [{
+            "company_id": COMPANY_ID, "date": start + timedelta(days=i), "close_price": 100 + i,
+            "predicted_close": 100 + i, "signal": "HOLD", "confidence_score": 50,
+        } for i in range(60)])
+    return start
+
+
+def _plans(engine, run) -> list[str]:
+    """EXPLAIN QUERY PLAN of every SELECT on analyses that `run(session)` executes."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "analyses" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as db:
+            run(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert statements
+    with engine.connect() as conn:
+        return [
+            "\n".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            for statement, parameters in statements
+        ]
+
+
+@pytest.mark.parametrize("interval", ["day", "week", "month"])
+def test_sql_history_range_uses_company_date_index(engine, bars, interval):
+    date_from, date_to = bars + timedelta(days=10), bars + timedelta(days=40)
+    for plan in _plans(engine, lambda db: _history_from_sql(db, COMPANY_ID, date_from, date_to, interval)):
+        assert INDEX_SEARCH.search(plan), plan
+        assert "date>? AND date<?" in plan, plan
+        assert "SCAN analyses" not in plan, plan
+
+
+def test_price_store_build_uses_company_date_index(engine, bars):
+    for plan in _plans(engine, lambda db: pricestore.query(db, COMPANY_ID)):
+        assert INDEX_SEARCH.search(plan), plan
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
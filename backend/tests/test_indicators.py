@@ -0,0 +1,87 @@
+"""Indicators extended from a cached prefix equal a full recompute, and match plain reference formulas."""
+import numpy as np
+import pytest
+import indicators
+import pricestore
+
+NAMES = "sma20,ema20,rsi14,bb20,atr14,macd"
+
+
+def _bars(n: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    bars = np.empty((len(pricestore.COLUMNS), n))
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    bars[pricestore.DATE] = 1.7e9 + 86400 * np.arange(n)
+    bars[pricestore.OPEN] = close + rng.normal(0, 0.5, n)
+    bars[pricestore.HIGH] = close + np.abs(rng.normal(0, 1, n))
+    bars[pricestore.LOW] = close - np.abs(rng.normal(0, 1, n))
+    bars[pricestore.CLOSE] = close
+    bars[pricestore.VOLUME] = 1000
+    return bars
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(indicators, "cache", indicators.IndicatorCache())
+
+
+def _compute_all(company_id: int, bars: np.ndarray) -> dict:
+    values = {}
+    for name, kind, period in indicators.parse_names(NAMES):
+        values.update(indicators.compute(company_id, bars, name, kind, period))
+    return values
+
+
+def _assert_same(actual: dict, expected: dict):
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=name)
+
+
+def test_tail_extension_matches_full_recompute(monkeypatch):
+    starts = []
+
+    def recording(function):
+        def wrapper(series, period, start, state):
+            starts.append(start)
+            return function(series, period, start, state)
+        return wrapper
+
+    for kind, function in list(indicators._INDICATORS.items()):
+        monkeypatch.setitem(indicators._INDICATORS, kind, recording(function))
+    bars = _bars(300)
+    _compute_all(1, bars[:, :250])
+    extended = _compute_all(1, bars)
+    # Only the 50 new bars were computed the second time
+    assert starts == [0] * 6 + [250] * 6
+
+    monkeypatch.setattr(indicators, "cache", indicators.IndicatorCache())
+    _assert_same(extended, _compute_all(1, bars))
+
+
+def test_edited_older_bar_forces_full_recompute(monkeypatch):
+    bars = _bars(120)
+    _compute_all(2, bars[:, :100])
+    edited = bars.copy()
+    edited[pricestore.CLOSE, 10] += 5
+    after_edit = _compute_all(2, edited)
+
+    monkeypatch.setattr(indicators, "cache", indicators.IndicatorCache())
+    _assert_same(after_edit, _compute_all(2, edited))
+
+
+def test_reference_formulas():
+    bars = _bars(60)
+    close = bars[pricestore.CLOSE]
+    values = _compute_all(3, bars)
+
+    sma = np.convolve(close, np.ones(20) / 20, mode="valid")
+    np.testing.assert_allclose(values["sma20"][19:], sma)
+    assert np.isnan(values["sma20"][:19]).all()
+
+    ema = [close[0]]
+    for price in close[1:]:
+        ema.append(ema[-1] + 2 / 21 * (price - ema[-1]))
+    np.testing.assert_allclose(values["ema20"], ema)
+    np.testing.assert_allclose(values["bb20_mid"], values["sma20"], equal_nan=True)
+    assert np.isnan(values["rsi14"][:14]).all() and ((values["rsi14"][14:] >= 0) & (values["rsi14"][14:] <= 100)).all()
@@ -0,0 +1,23 @@
+"""Long running job handlers must observe a cooperative cancel."""
+import pytest
+from sqlalchemy import insert
+from models import Company, Sector
+import jobs
+
+SECTOR_ID = 9601
+
+
+@pytest.fixture(scope="module")
+def company(engine):
+    # Something for the backtest to score, so it reaches its first progress report
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Jobs"}])
+        conn.execute(insert(Company), [{"id": SECTOR_ID, "sector_id": SECTOR_ID, "symbol": "JOBS", "company_name": "Jobs"}])
+
+
+@pytest.mark.parametrize("handler", [jobs._seed_sectors, jobs._rebuild_rollups, jobs._backtest])
+def test_handler_stops_on_cancel(company, handler):
+    ctx = jobs.JobContext(job_id=0)
+    ctx.cancelled.set()
+    with pytest.raises(jobs.JobCancelled):
+        handler(ctx)
@@ -0,0 +1,61 @@
+"""/signals/latest follows inserts, late backfills, edits and deletes of each company's newest bar."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from models import Company, Sector
+
+SECTOR_ID = 10401
+COMPANY_IDS = (10401, 10402)
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Latest", "description": "Snapshot"}])
+        conn.execute(insert(Company), [{
+            "id": company_id, "sector_id": SECTOR_ID, "symbol": f"LS{company_id}", "company_name": f"LS {company_id}",
+            "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+        } for company_id in COMPANY_IDS])
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _bar(company_id: int, day: int, signal: str) -> dict:
+    return {
+        "company_id": company_id, "date": f"2024-03-{day:02d}T00:00:00", "close_price": 100 + day,
+        "predicted_close": 101 + day, "signal": signal, "confidence_score": 0.5,
+    }
+
+
+def _post(client, company_id: int, day: int, signal: str) -> int:
+    response = client.post("/analyses/", json=_bar(company_id, day, signal))
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _latest(client, **params) -> dict:
+    response = client.get("/signals/latest", params={"sector_id": SECTOR_ID, **params})
+    assert response.status_code == 200, response.text
+    return {row["company_id"]: (row["date"][:10], row["signal"]) for row in response.json()}
+
+
+def test_snapshot_follows_writes(client):
+    _post(client, COMPANY_IDS[0], 1, "BUY")
+    newest = _post(client, COMPANY_IDS[0], 3, "SELL")
+    _post(client, COMPANY_IDS[1], 2, "HOLD")
+    # A backfilled older bar does not replace the newest one
+    _post(client, COMPANY_IDS[0], 2, "STRONG_BUY")
+    assert _latest(client) == {COMPANY_IDS[0]: ("2024-03-03", "SELL"), COMPANY_IDS[1]: ("2024-03-02", "HOLD")}
+    assert _latest(client, signal="HOLD") == {COMPANY_IDS[1]: ("2024-03-02", "HOLD")}
+
+    assert client.put(f"/analyses/{newest}", json=_bar(COMPANY_IDS[0], 3, "STRONG_SELL")).status_code == 200
+    assert _latest(client)[COMPANY_IDS[0]] == ("2024-03-03", "STRONG_SELL")
+
+    # Deleting the newest bar falls back to the one before it
+    assert client.delete(f"/analyses/{newest}").status_code == 204
+    assert _latest(client)[COMPANY_IDS[0]] == ("2024-03-02", "STRONG_BUY")
+
+    row = client.get("/signals/latest", params={"sector_id": SECTOR_ID, "signal": "STRONG_BUY"}).json()[0]
+    assert (row["symbol"], row["close_price"], row["predicted_close"]) == (f"LS{COMPANY_IDS[0]}", 102, 103)
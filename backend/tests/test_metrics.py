@@ -0,0 +1,35 @@
+"""Each request adds to its route's counters and histograms in /metrics."""
+import re
+from fastapi.testclient import TestClient
+from responsecache import response_cache
+
+ROUTE = 'method="GET",route="/sectors/stats"'
+
+
+def _samples(client) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    samples = {}
+    for line in response.text.splitlines():
+        match = re.fullmatch(r"(\w+)\{(.*)\} (\S+)", line)
+        if match:
+            samples[(match[1], match[2])] = float(match[3])
+    return samples
+
+
+def test_request_increments_counters_and_statement_histogram(engine):
+    import main
+
+    with TestClient(main.app) as client:
+        before = _samples(client)
+        # A cached response would run no statements
+        response_cache.invalidate("sectors")
+        assert client.get("/sectors/stats").status_code == 200
+        after = _samples(client)
+
+    total = ("http_requests_total", f'{ROUTE},status="200"')
+    assert after[total] == before.get(total, 0) + 1
+    count = ("http_request_db_statements_count", ROUTE)
+    assert after[count] == before.get(count, 0) + 1
+    statements = ("http_request_db_statements_sum", ROUTE)
+    assert after[statements] >= before.get(statements, 0) + 1
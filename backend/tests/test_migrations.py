@@ -0,0 +1,90 @@
+"""Upgrading a database from before schema_version, including rows the unique indexes reject."""
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, insert, inspect, select, text
+from models import Analysis, Base, Company, LatestAnalysis, Sector, User, UserCompanyAccess
+import migrations
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    # Current tables without the unique indexes later migrations own, and no recorded version
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'legacy.db')}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in migrations.OWNED_INDEXES:
+            conn.execute(text(f"DROP INDEX {name}"))
+        conn.execute(insert(Sector), [{"id": 1, "name": "Legacy"}])
+        conn.execute(insert(Company), [
+            {"id": 1, "sector_id": 1, "symbol": "OLD", "company_name": "Old Inc."},
+            {"id": 2, "sector_id": 1, "symbol": "NEW", "company_name": "New Inc."},
+        ])
+    yield engine
+    engine.dispose()
+
+
+def _indexes(engine, table: str) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_fresh_upgrade_records_every_version(legacy):
+    assert migrations.upgrade(legacy) == [number for number, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(legacy) == migrations.LATEST_VERSION
+    # A current database applies nothing
+    assert migrations.upgrade(legacy) == []
+    assert "ux_companies_symbol" in _indexes(legacy, "companies")
+
+
+def test_startup_without_migrating_refuses_an_old_schema(legacy, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    monkeypatch.setattr(main, "engine", legacy)
+    with pytest.raises(RuntimeError, match="run `python migrations.py`"):
+        main.check_schema()
+    migrations.upgrade(legacy)
+    main.check_schema()
+
+
+def test_duplicate_symbols_are_reported(legacy):
+    with legacy.begin() as conn:
+        conn.execute(insert(Company), [{"id": 3, "sector_id": 1, "symbol": "OLD", "company_name": "Old again"}])
+    with pytest.raises(RuntimeError, match="duplicated symbols: OLD"):
+        migrations.upgrade(legacy)
+    # The baseline went through; only the symbol migration is left to rerun once the data is fixed
+    assert migrations.current_version(legacy) == 1
+
+
+def test_duplicate_grants_keep_the_oldest(legacy):
+    granted_at = datetime(2024, 1, 1)
+    with legacy.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "username": "member", "email": "m@example.com", "hashed_password": "-"}])
+        conn.execute(insert(UserCompanyAccess), [
+            {"id": i, "user_id": 1, "company_id": company_id, "granted_by": 1, "granted_at": granted_at}
+            for i, company_id in ((1, 1), (2, 1), (3, 2), (4, 1))
+        ])
+    migrations.upgrade(legacy)
+    with legacy.connect() as conn:
+        kept = conn.execute(select(UserCompanyAccess.id).order_by(UserCompanyAccess.id)).scalars().all()
+    assert kept == [1, 3]
+    assert "ux_user_company_access" in _indexes(legacy, "user_company_access")
+
+
+def test_duplicate_bars_keep_the_newest(legacy):
+    bar = {"company_id": 1, "signal": "HOLD", "confidence_score": 50, "predicted_close": 1}
+    with legacy.begin() as conn:
+        conn.execute(insert(Analysis), [
+            {**bar, "id": 1, "date": datetime(2024, 1, 1), "close_price": 1},
+            {**bar, "id": 2, "date": datetime(2024, 1, 2), "close_price": 2},
+            {**bar, "id": 3, "date": datetime(2024, 1, 2), "close_price": 3},
+            {**bar, "id": 4, "date": datetime(2024, 1, 1), "close_price": 4},
+        ])
+    migrations.upgrade(legacy)
+    with legacy.connect() as conn:
+        kept = conn.execute(select(Analysis.id).order_by(Analysis.id)).scalars().all()
+        latest = conn.execute(select(LatestAnalysis.analysis_id).where(LatestAnalysis.company_id == 1)).scalar()
+    assert kept == [3, 4]
+    assert latest == 3
+    assert "ux_analyses_company_date" in _indexes(legacy, "analyses")
+
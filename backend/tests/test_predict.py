@@ -0,0 +1,83 @@
+"""Walk-forward predictions never see the future, and incremental runs only rewrite new bars."""
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from models import Analysis, Company, LatestAnalysis, PredictionState, Sector
+import predict
+import rollups
+
+SECTOR_ID = COMPANY_ID = 10501
+START = datetime(2023, 1, 1)
+
+
+def _prices(n: int, seed: int = 3) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = close * np.exp(rng.normal(0, 0.003, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.004, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, n)))
+    volume = rng.integers(1000, 5000, n).astype(float)
+    return np.stack([open_, high, low, close, volume])
+
+
+def test_predictions_only_use_earlier_bars():
+    prices = _prices(300)
+    valid, predicted, z, _ = predict.fit_predict(prices)
+    assert valid.sum() > 100
+    # Cutting the history short changes nothing that was predicted before the cut
+    cut = 230
+    short_valid, short_predicted, short_z, _ = predict.fit_predict(prices[:, :cut])
+    np.testing.assert_array_equal(short_valid, valid[:cut])
+    np.testing.assert_allclose(short_predicted[:, short_valid], predicted[:, :cut][:, short_valid])
+    np.testing.assert_allclose(short_z[short_valid], z[:cut][short_valid])
+    # Too little history to train on leaves the first bars alone
+    assert not valid[:predict.LAGS + predict.MIN_TRAIN].any()
+
+
+def _insert_bars(engine, prices: np.ndarray, first: int):
+    with engine.begin() as conn:
+        conn.execute(insert(Analysis), [{
+            "company_id": COMPANY_ID, "date": START + timedelta(days=first + i),
+            "open_price": prices[0, i], "high_price": prices[1, i], "low_price": prices[2, i],
+            "close_price": prices[3, i], "volume": int(prices[4, i]),
+            "predicted_close": 0, "signal": "HOLD", "confidence_score": 0, "created_at": START,
+        } for i in range(prices.shape[1])])
+    with Session(bind=engine) as db:
+        rollups.refresh_latest(db, [COMPANY_ID])
+        db.commit()
+
+
+@pytest.fixture(scope="module")
+def company(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Predict", "description": "Models"}])
+        conn.execute(insert(Company), [{
+            "id": COMPANY_ID, "sector_id": SECTOR_ID, "symbol": "PRED", "company_name": "Pred Inc.",
+            "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+        }])
+    return engine
+
+
+def test_incremental_runs_rewrite_only_new_bars(company):
+    prices = _prices(205)
+    _insert_bars(company, prices[:, :200], 0)
+    first = predict.run_predictions(sector_id=SECTOR_ID, workers=1)
+    assert (first["companies"], first["fitted"]) == (1, 1) and first["bars_written"] > 100
+
+    assert predict.run_predictions(sector_id=SECTOR_ID, workers=1)["companies"] == 0
+
+    _insert_bars(company, prices[:, 200:], 200)
+    assert predict.run_predictions(sector_id=SECTOR_ID, workers=1)["bars_written"] == 5
+    assert predict.run_predictions(full=True, sector_id=SECTOR_ID, workers=1)["bars_written"] == first["bars_written"] + 5
+
+    with Session(bind=company) as db:
+        newest = db.execute(
+            select(Analysis.id, Analysis.signal).where(Analysis.company_id == COMPANY_ID).order_by(Analysis.date.desc())
+        ).first()
+        latest = db.get(LatestAnalysis, COMPANY_ID)
+        assert (latest.analysis_id, latest.signal) == tuple(newest)
+        assert db.get(PredictionState, COMPANY_ID).bars == 205
+        assert db.execute(select(func.count()).select_from(Analysis).where(
+            Analysis.company_id == COMPANY_ID, Analysis.predicted_close > 0)).scalar() == first["bars_written"] + 5
@@ -0,0 +1,59 @@
+"""A rebuild racing with a write must not leave the pre-write bars on disk."""
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from models import Analysis, Company, Sector
+import pricestore
+
+COMPANY_ID = 9101
+
+
+@pytest.fixture(scope="module")
+def company(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": COMPANY_ID, "name": "Store"}])
+        conn.execute(insert(Company), [{
+            "id": COMPANY_ID, "sector_id": COMPANY_ID, "symbol": "STOR", "company_name": "Store Inc.",
+        }])
+    return COMPANY_ID
+
+
+def _add_bar(engine, day: int):
+    with engine.begin() as conn:
+        conn.execute(insert(Analysis), [{
+            "company_id": COMPANY_ID, "date": datetime(2024, 1, day), "close_price": day,
+            "predicted_close": day, "signal": "HOLD", "confidence_score": 50,
+        }])
+
+
+def test_write_during_build_discards_stale_file(engine, company, monkeypatch):
+    _add_bar(engine, 1)
+    pricestore.invalidate(company)
+    original = pricestore.query
+
+    def query_then_write(db, company_id, tier="raw"):
+        # The rebuild has read its snapshot; a writer commits and invalidates before it installs the file
+        data = original(db, company_id, tier)
+        _add_bar(engine, 2)
+        pricestore.invalidate(company_id)
+        return data
+
+    monkeypatch.setattr(pricestore, "query", query_then_write)
+    with Session(engine) as db:
+        assert pricestore.load(db, company).shape[1] == 1
+    monkeypatch.setattr(pricestore, "query", original)
+
+    assert not os.path.exists(pricestore._path(company))
+    with Session(engine) as db:
+        assert pricestore.load(db, company).shape[1] == 2
+    assert os.path.exists(pricestore._path(company))
+
+
+def test_unchanged_generation_keeps_file(engine, company):
+    pricestore.invalidate(company)
+    with Session(engine) as db:
+        built = pricestore.load(db, company)
+        assert pricestore.load(db, company).shape == built.shape
+    assert os.path.exists(pricestore._path(company))
@@ -0,0 +1,79 @@
+"""Authenticated users come from the principal cache until their token_version changes."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, update
+from models import User
+from principals import PrincipalCache, principal_cache
+from routers.auth import create_access_token
+
+ADMIN_ID, TARGET_ID = 10101, 10102
+
+
+def _headers(username: str, version: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username, 'ver': version})}"}
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": ADMIN_ID, "username": "pc-admin", "email": "pc-admin@example.com", "hashed_password": "-", "role": "admin"},
+            {"id": TARGET_ID, "username": "pc-target", "email": "pc-target@example.com", "hashed_password": "-", "role": "admin"},
+        ])
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def user_queries():
+    from database import read_engine
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement and "WHERE users.username" in statement:
+            captured.append(statement)
+
+    event.listen(read_engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(read_engine, "before_cursor_execute", capture)
+
+
+def test_repeat_requests_skip_the_user_lookup(client, user_queries):
+    principal_cache.invalidate("pc-admin")
+    for _ in range(3):
+        assert client.get("/api/v1/users", headers=_headers("pc-admin", 0)).status_code == 200
+    assert len(user_queries) == 1
+
+
+def test_role_change_revokes_cached_tokens(client):
+    old = _headers("pc-target", 0)
+    assert client.get("/api/v1/users", headers=old).status_code == 200
+    assert principal_cache.get("pc-target", 0) is not None
+
+    response = client.patch(f"/api/v1/users/{TARGET_ID}/role", json={"role": "member"}, headers=_headers("pc-admin", 0))
+    assert response.status_code == 200, response.text
+    assert principal_cache.get("pc-target", 0) is None
+    assert client.get("/api/v1/users", headers=old).status_code == 401
+    # A token for the new version authenticates, as the member it now is
+    assert client.get("/api/v1/users", headers=_headers("pc-target", 1)).status_code == 403
+
+
+def test_other_workers_catch_up_after_the_ttl(client, engine, monkeypatch):
+    import principals
+
+    now = [1000.0]
+    monkeypatch.setattr(principals.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(principals, "principal_cache", PrincipalCache(ttl=60))
+    monkeypatch.setattr("routers.auth.principal_cache", principals.principal_cache)
+    headers = _headers("pc-admin", 0)
+    assert client.get("/api/v1/users", headers=headers).status_code == 200
+
+    # Bumped by another worker, which can only drop its own cache entry
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id == ADMIN_ID).values(token_version=User.token_version + 1))
+    assert client.get("/api/v1/users", headers=headers).status_code == 200
+    now[0] += 61
+    assert client.get("/api/v1/users", headers=headers).status_code == 401
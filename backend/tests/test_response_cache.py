@@ -0,0 +1,62 @@
+"""Cached reads answer a matching If-None-Match with 304, without the database, until a write."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+from models import Company, Sector
+
+SECTOR_ID = COMPANY_ID = 10301
+COMPANY = {
+    "sector_id": SECTOR_ID, "symbol": "ETAG", "company_name": "ETag Inc.",
+    "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+}
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "ETags", "description": "Revalidation"}])
+        conn.execute(insert(Company), [{"id": COMPANY_ID, **COMPANY}])
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def statements():
+    from database import read_engine
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    event.listen(read_engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(read_engine, "before_cursor_execute", capture)
+
+
+@pytest.mark.parametrize("path", [f"/companies/{COMPANY_ID}", f"/sectors/{SECTOR_ID}", "/companies/?symbols=ETAG"])
+def test_matching_etag_is_not_modified(client, statements, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    statements.clear()
+    for header in (etag, f'"other", {etag}', "*"):
+        revalidated = client.get(path, headers={"If-None-Match": header})
+        assert revalidated.status_code == 304 and revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+    assert statements == []
+    assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_write_changes_the_etag(client):
+    path = f"/companies/{COMPANY_ID}"
+    etag = client.get(path).headers["etag"]
+    assert client.put(path, json={**COMPANY, "pe_ratio": 20}).status_code == 200
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["pe_ratio"] == 20
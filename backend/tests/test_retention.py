@@ -0,0 +1,50 @@
+"""Deleting a company removes its raw bars and rolled tiers, not just the company row."""
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from models import Analysis, AnalysisWeekly, Company, LatestAnalysis, Sector
+import retention
+
+SECTOR_ID = 9701
+COMPANY_ID = 9701
+
+
+def _count(db, model) -> int:
+    return db.execute(select(func.count()).select_from(model).where(model.company_id == COMPANY_ID)).scalar()
+
+
+def test_delete_company_removes_bars_and_tiers(engine, monkeypatch):
+    import main
+
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Retention", "description": "Tiers"}])
+        conn.execute(insert(Company), [{
+            "id": COMPANY_ID, "sector_id": SECTOR_ID, "symbol": "RET", "company_name": "Ret Inc.",
+            "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+        }])
+        conn.execute(insert(Analysis), [{
+            "company_id": COMPANY_ID, "date": start + timedelta(days=day), "signal": "HOLD", "confidence_score": 50,
+            **dict.fromkeys(("open_price", "high_price", "low_price", "close_price", "predicted_open",
+                             "predicted_high", "predicted_low", "predicted_close"), 10.0 + day),
+            "volume": 1000, "created_at": start,
+        } for day in range(21)])
+
+    # Roll the first two weeks of this company only; the database is shared with other tests
+    raw_cutoffs = retention._raw_cutoffs
+    monkeypatch.setattr(retention, "_raw_cutoffs", lambda db, cutoff: {
+        company_id: value for company_id, value in raw_cutoffs(db, cutoff).items() if company_id == COMPANY_ID
+    })
+    with Session(bind=engine) as db:
+        assert retention.roll_raw(db, datetime(2024, 1, 15))["bars_rolled"] == 14
+        assert _count(db, AnalysisWeekly) == 2
+        assert _count(db, Analysis) == 7
+
+    with TestClient(main.app) as client:
+        assert client.delete(f"/companies/{COMPANY_ID}").status_code == 200
+        assert client.get(f"/companies/{COMPANY_ID}/history").status_code == 404
+
+    with Session(bind=engine) as db:
+        assert [_count(db, model) for model in (Analysis, AnalysisWeekly, LatestAnalysis)] == [0, 0, 0]
+        assert db.execute(select(func.count()).select_from(Analysis).where(Analysis.company_id.is_(None))).scalar() == 0
@@ -0,0 +1,73 @@
+"""Sector reads issue a fixed number of statements, however many companies or bars the sector has."""
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+from models import Analysis, Company, Sector
+from responsecache import response_cache
+
+SECTOR_ID = 9301
+COMPANY_IDS = (9301, 9302, 9303)
+BARS = 30
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    import main
+
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Queries", "description": "Statement counts"}])
+        conn.execute(insert(Company), [{
+            "id": company_id, "sector_id": SECTOR_ID, "symbol": f"Q{company_id}", "company_name": f"Q{company_id} Inc.",
+            "market_cap": 1e9, "pe_ratio": 10, "revenue": 1e8,
+        } for company_id in COMPANY_IDS])
+        conn.execute(insert(Analysis), [{
+            "company_id": company_id, "date": start + timedelta(days=day), "signal": "HOLD", "confidence_score": 50,
+            **dict.fromkeys(("open_price", "high_price", "low_price", "close_price", "predicted_open",
+                             "predicted_high", "predicted_low", "predicted_close"), float(day)),
+            "volume": 1000, "created_at": start,
+        } for company_id in COMPANY_IDS for day in range(BARS)])
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def statements(client):
+    from database import read_engine
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    # Responses cached by an earlier request would hide the statements
+    response_cache.invalidate("sectors", f"sector:{SECTOR_ID}", "companies")
+    event.listen(read_engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(read_engine, "before_cursor_execute", capture)
+
+
+@pytest.mark.parametrize("path, expected", [
+    (f"/sectors/{SECTOR_ID}", 1),
+    (f"/sectors/{SECTOR_ID}?include=companies", 2),
+    (f"/sectors/{SECTOR_ID}?include=analyses", 3),
+    (f"/sectors/{SECTOR_ID}/companies/{COMPANY_IDS[0]}", 1),
+    (f"/sectors/{SECTOR_ID}/companies/{COMPANY_IDS[0]}/analyses", 1),
+])
+def test_statement_count(client, statements, path, expected):
+    response = client.get(path)
+    assert response.status_code == 200, response.text
+    assert len(statements) == expected, statements
+
+
+def test_analyses_window_per_company(client):
+    response = client.get(f"/sectors/{SECTOR_ID}?include=analyses&analyses_limit=5")
+    assert response.status_code == 200, response.text
+    companies = response.json()["companies"]
+    assert sorted(company["id"] for company in companies) == list(COMPANY_IDS)
+    newest = (datetime(2024, 1, 1) + timedelta(days=BARS - 1)).isoformat()
+    for company in companies:
+        dates = sorted(analysis["date"] for analysis in company["analyses"])
+        assert len(dates) == 5
+        assert dates[-1] == newest
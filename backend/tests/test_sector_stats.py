@@ -0,0 +1,124 @@
+"""sector_stats kept by deltas must match a full recompute, and skip writes that change nothing."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+from models import Sector, SectorStats
+import rollups
+
+SECTOR_IDS = (9201, 9202)
+COLUMNS = [c.name for c in SectorStats.__table__.columns if c.name != "updated_at"]
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": sid, "name": f"Stats {sid}"} for sid in SECTOR_IDS])
+    with Session(bind=engine) as db:
+        rollups.refresh_sectors(db, SECTOR_IDS)
+        db.commit()
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _stored(engine) -> dict:
+    with Session(bind=engine) as db:
+        rows = db.execute(select(SectorStats).where(SectorStats.sector_id.in_(SECTOR_IDS))).scalars()
+        return {row.sector_id: {name: getattr(row, name) for name in COLUMNS} for row in rows}
+
+
+def _recomputed(engine) -> dict:
+    # Rebuild in a transaction that is rolled back so the stored rows stay as the deltas left them
+    with Session(bind=engine) as db:
+        rollups.refresh_sectors(db, SECTOR_IDS)
+        rows = db.execute(select(SectorStats).where(SectorStats.sector_id.in_(SECTOR_IDS))).scalars()
+        recomputed = {row.sector_id: {name: getattr(row, name) for name in COLUMNS} for row in rows}
+        db.rollback()
+    return recomputed
+
+
+def _assert_matches(engine):
+    stored, recomputed = _stored(engine), _recomputed(engine)
+    for sector_id in SECTOR_IDS:
+        for name in COLUMNS:
+            assert stored[sector_id][name] == pytest.approx(recomputed[sector_id][name]), (sector_id, name)
+
+
+def _company(client, symbol: str, sector_id: int, market_cap: float, pe_ratio: float) -> int:
+    response = client.post("/companies/", json={
+        "sector_id": sector_id, "symbol": symbol, "company_name": f"{symbol} Inc.",
+        "market_cap": market_cap, "pe_ratio": pe_ratio, "revenue": 1e8,
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _update(client, company_id: int, symbol: str, sector_id: int, market_cap: float, pe_ratio: float):
+    response = client.put(f"/companies/{company_id}", json={
+        "sector_id": sector_id, "symbol": symbol, "company_name": f"{symbol} Inc.",
+        "market_cap": market_cap, "pe_ratio": pe_ratio, "revenue": 1e8,
+    })
+    assert response.status_code == 200, response.text
+
+
+def _bar(client, company_id: int, day: int, signal: str) -> int:
+    response = client.post("/analyses/", json={
+        "company_id": company_id, "date": f"2024-01-{day:02d}T00:00:00", "close_price": 10 + day,
+        "predicted_close": 11 + day, "signal": signal, "confidence_score": 50,
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def test_company_and_analysis_writes_match_full_recompute(engine, client):
+    first = _company(client, "STA", SECTOR_IDS[0], 1e9, 10)
+    second = _company(client, "STB", SECTOR_IDS[0], 3e9, 30)
+    third = _company(client, "STC", SECTOR_IDS[1], 2e9, 20)
+    _assert_matches(engine)
+
+    # Fundamentals snapshots: one changed company, one new one
+    response = client.put("/companies/batch", json=[
+        {"symbol": "STA", "profit_margin": 0.1, "dividend_yield": 0.02},
+        {"symbol": "STE", "sector_id": SECTOR_IDS[1], "company_name": "STE Inc.", "market_cap": 4e9, "pe_ratio": 25},
+    ])
+    assert response.status_code == 200, response.text
+    assert response.json()["inserted"] == 1
+    _assert_matches(engine)
+
+    _bar(client, first, 1, "BUY")
+    _bar(client, second, 1, "SELL")
+    older = _bar(client, first, 2, "HOLD")
+    _bar(client, first, 3, "STRONG_BUY")
+    _assert_matches(engine)
+
+    _update(client, first, "STA", SECTOR_IDS[0], 2e9, 15)
+    _update(client, second, "STB", SECTOR_IDS[1], 3e9, 30)
+    _assert_matches(engine)
+
+    assert client.delete(f"/analyses/{older}").status_code == 204
+    assert client.delete(f"/companies/{third}").status_code == 200
+    _assert_matches(engine)
+    assert _stored(engine)[SECTOR_IDS[0]]["strong_buy_count"] == 1
+
+
+def test_analysis_write_without_signal_change_leaves_stats_alone(engine, client):
+    company_id = _company(client, "STD", SECTOR_IDS[1], 5e8, 12)
+    _bar(client, company_id, 10, "HOLD")
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        # An older bar, then a newer one with the same signal
+        _bar(client, company_id, 9, "BUY")
+        _bar(client, company_id, 11, "HOLD")
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert any("INSERT INTO analyses" in s for s in statements)
+    assert not [s for s in statements if "sector_stats" in s]
+    _assert_matches(engine)
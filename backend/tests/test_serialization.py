@@ -0,0 +1,51 @@
+"""Pages encoded from column tuples with orjson match what the response models would serialize."""
+from datetime import date, datetime
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from models import Analysis, Company, Sector
+import schemas
+
+SECTOR_ID = 10701
+COMPANY_IDS = (10701, 10702)
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(insert(Sector), [{"id": SECTOR_ID, "name": "Serialization", "description": "orjson"}])
+        conn.execute(insert(Company), [
+            {"id": COMPANY_IDS[0], "sector_id": SECTOR_ID, "symbol": "SER1", "company_name": "Ser One",
+             "market_cap": 2800000000000.25, "pe_ratio": 28.5, "revenue": 383300000000, "eps": 6.15,
+             "next_earnings_date": date(2024, 1, 25)},
+            {"id": COMPANY_IDS[1], "sector_id": SECTOR_ID, "symbol": "SER2", "company_name": "Ser Two \u00e9\"",
+             "market_cap": 1.1, "pe_ratio": 0.01, "revenue": 0, "eps": None, "next_earnings_date": None},
+        ])
+        conn.execute(insert(Analysis), [{
+            "company_id": COMPANY_IDS[0], "date": datetime(2024, 2, day, 9, 30), "open_price": 10.01 * day,
+            "close_price": 10.05 * day, "high_price": 11.5, "low_price": 9.99, "volume": 123456789,
+            "predicted_open": 10.02, "predicted_high": 11.49, "predicted_low": 9.5, "predicted_close": 10.1, "signal": "STRONG_BUY", "confidence_score": 0.87, "created_at": datetime(2024, 2, 1),
+        } for day in (1, 2, 3)])
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _expected(engine, model, schema, *filters) -> list:
+    with Session(bind=engine) as db:
+        rows = db.execute(select(model).where(*filters).order_by(model.id)).scalars()
+        return [schema.model_validate(row).model_dump(mode="json") for row in rows]
+
+
+def test_company_page_matches_response_model(client, engine):
+    response = client.get("/companies/", params={"sector_id": SECTOR_ID})
+    assert response.status_code == 200
+    assert response.json() == _expected(engine, Company, schemas.Company, Company.sector_id == SECTOR_ID)
+
+
+def test_analysis_page_matches_response_model(client, engine):
+    response = client.get("/analyses/", params={"company_id": COMPANY_IDS[0]})
+    assert response.status_code == 200
+    assert response.json() == _expected(engine, Analysis, schemas.Analysis, Analysis.company_id == COMPANY_IDS[0])
@@ -0,0 +1,66 @@
+"""Storage profile: WAL and a read-only reader engine, and the batched single writer."""
+import threading
+import pytest
+from sqlalchemy import event, exc, insert, select, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, WriteQueue
+from models import Sector
+
+SECTOR_IDS = list(range(10001, 10006))
+
+
+def test_pragmas(engine):
+    from database import read_engine
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    with read_engine.connect() as conn:
+        with pytest.raises(exc.OperationalError):
+            conn.execute(insert(Sector), [{"id": 10000, "name": "Read only"}])
+
+
+def _insert(sector_id: int, name: str):
+    def job(db):
+        db.execute(insert(Sector), [{"id": sector_id, "name": name}])
+        return sector_id
+    return job
+
+
+def _run_held(queue: WriteQueue, jobs: list) -> list:
+    # A first job holds the writer thread so the others queue up and run as one batch
+    release = threading.Event()
+    queue.submit(lambda db: release.wait(5))
+    futures = [queue.submit(job) for job in jobs]
+    release.set()
+    return futures
+
+
+@pytest.fixture
+def commits(engine):
+    committed = []
+
+    def count(conn):
+        committed.append(1)
+
+    event.listen(engine, "commit", count)
+    yield committed
+    event.remove(engine, "commit", count)
+
+
+def test_queued_jobs_commit_together(engine, commits):
+    futures = _run_held(WriteQueue(SessionLocal, max_batch=10), [_insert(sid, f"Batch {sid}") for sid in SECTOR_IDS[:3]])
+    assert [future.result(5) for future in futures] == SECTOR_IDS[:3]
+    assert len(commits) == 1
+
+
+def test_failing_job_does_not_sink_its_batch(engine, commits):
+    jobs = [_insert(SECTOR_IDS[3], "Kept"), _insert(SECTOR_IDS[0], "Duplicate"), _insert(SECTOR_IDS[4], "Kept")]
+    futures = _run_held(WriteQueue(SessionLocal, max_batch=10), jobs)
+    assert futures[0].result(5) == SECTOR_IDS[3] and futures[2].result(5) == SECTOR_IDS[4]
+    with pytest.raises(exc.IntegrityError):
+        futures[1].result(5)
+    # The batch was rolled back and each job retried in its own transaction
+    assert len(commits) == 2
+    with Session(bind=engine) as db:
+        stored = db.execute(select(Sector.id).where(Sector.id.in_(SECTOR_IDS)).order_by(Sector.id)).scalars().all()
+    assert stored == SECTOR_IDS
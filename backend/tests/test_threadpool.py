@@ -0,0 +1,33 @@
+"""Routes and dependencies holding a sync Session run in the threadpool, never on the event loop."""
+import inspect
+from fastapi import APIRouter
+from fastapi.routing import APIRoute
+from database import get_db, get_read_db
+
+# Async on purpose; every database call inside goes through run_in_threadpool
+OFFLOADING = {"bulk_create_analyses", "register", "login"}
+
+
+def _blocking(dependant, found: list):
+    for dependency in dependant.dependencies:
+        if dependency.call in (get_db, get_read_db):
+            if inspect.iscoroutinefunction(dependant.call) and dependant.call.__name__ not in OFFLOADING:
+                found.append(dependant.call.__qualname__)
+        else:
+            _blocking(dependency, found)
+    return found
+
+
+def test_session_users_are_plain_functions():
+    import main
+
+    routers = [value for name, value in vars(main).items() if name.endswith("_router") and isinstance(value, APIRouter)]
+    routes = [route for router in routers for route in router.routes if isinstance(route, APIRoute)]
+    checked = [route for route in routes if any(
+        d.call in (get_db, get_read_db) for d in route.dependant.dependencies
+    )]
+    assert len(checked) > 20
+    found = []
+    for route in routes:
+        _blocking(route.dependant, found)
+    assert found == []